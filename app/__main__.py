@@ -0,0 +1,11 @@
+#
+# this is the app/__main__.py file
+#
+# ... lets CStris run with "python -m app"
+#
+
+from app.cstris import main
+
+# the CPU opponent's process pool starts its workers by importing this module again, so only run from here
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#
+# this is the app/assets.py file
+#
+# ... finds the game's sounds relative to the package (not the current directory) and loads them once:
+# ... Assets.start opens the music and decodes the sound effects in a background thread, so they can load
+# ... while the player is still in the text menu and start_game does not stall on them
+#
+
+
+import os
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOUNDS = os.path.join(ROOT, "sounds")
+
+MUSIC = "music.mp3"
+EFFECTS = ("clear.wav",)
+
+
+def asset_path(name):
+    """
+    Returns the full path of a file in the sounds folder.
+    Params: name (file name, e.g. "clear.wav")
+    """
+    return os.path.join(SOUNDS, name)
+
+
+class Assets:
+    """
+    This class loads the music and sound effects, in the background or on first use, and keeps them.
+    Member Variables: music (file name), effects (file names of the sound effects to decode), sounds
+        (file name -> decoded pygame.mixer.Sound), thread (background loader), error (what went wrong
+        loading in the background, raised again by wait), lock (one decode of each sound at a time)
+    Member Functions: __init__, start (loads in a background thread), wait, sound (returns a decoded sound),
+        play_music
+    """
+
+    def __init__(self, music=MUSIC, effects=EFFECTS):
+        self.music = music
+        self.effects = effects
+        self.sounds = {}
+        self.thread = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts loading everything in a daemon thread and returns right away.
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._load_all, name="cstris-assets", daemon=True)
+            self.thread.start()
+        return self
+
+    def _load_all(self):
+        try:
+            import pygame
+
+            pygame.mixer.init()
+            pygame.mixer.music.load(asset_path(self.music))
+            for name in self.effects:
+                self.sound(name)
+        except Exception as err:
+            self.error = err
+
+    def wait(self, timeout=None):
+        """
+        Waits for the background loading to finish (loading everything now if it was never started).
+        Params: timeout (seconds; None waits as long as it takes)
+        """
+        self.start().thread.join(timeout)
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def sound(self, name):
+        """
+        Returns a sound effect as a pygame.mixer.Sound, decoding the file only the first time.
+        Params: name (file name in the sounds folder)
+        """
+        with self.lock:
+            if name not in self.sounds:
+                import pygame
+
+                self.sounds[name] = pygame.mixer.Sound(asset_path(name))
+            return self.sounds[name]
+
+    def play_music(self):
+        """
+        Starts the music, looping forever, once it has loaded.
+        """
+        import pygame
+
+        self.wait()
+        pygame.mixer.music.play(-1)
@@ -0,0 +1,147 @@
+#
+# this is the app/bitboard.py file
+#
+# ... an alternative playfield for the Tetris class that stores each row as an integer bitmask
+# ... (bit j set means column j is filled), with the block colors kept in a parallel bytearray
+#
+
+
+def shape_rows(image):
+    """
+    Converts a figure image (cell numbers 0-15 on a 4x4 grid) into a tuple of (dy, bits) pairs,
+    one per occupied row of the figure, where bit dx of bits is set for every filled column.
+    Params: image (list of cell numbers, as returned by Figure.image())
+    """
+    rows = {}
+    for p in image:
+        dy, dx = divmod(p, 4)
+        rows[dy] = rows.get(dy, 0) | (1 << dx)
+    return tuple(sorted(rows.items()))
+
+
+class BitboardField:
+    """
+    This class holds the playfield as one integer bitmask per row plus a compact color store.
+    Member Variables: height, width, full (bitmask of a complete row), rows (row bitmasks),
+        colors (height * width color indices, row by row), tops (row of the highest block in each
+        column, height if it is empty; updated in place by lock, clear_lines and load)
+    Member Functions: __init__ (initializes an empty field), __getitem__ (returns a row of colors so
+        field[i][j] works like the list field), collides, lock, clear_lines, load, find_tops
+    """
+
+    __slots__ = ("height", "width", "full", "rows", "colors", "tops", "_views")
+
+    def __init__(self, height, width):
+        """
+        Initializes an empty field.
+        Params: self, height, width
+        """
+        self.height = height
+        self.width = width
+        self.full = (1 << width) - 1
+        self.rows = [0] * height
+        self.colors = bytearray(height * width)
+        self.tops = [height] * width
+
+        # one read-only-by-convention view per row; rows never resize, so the views stay valid
+        view = memoryview(self.colors)
+        self._views = [view[i * width:(i + 1) * width] for i in range(height)]
+
+    def __getitem__(self, i):
+        return self._views[i]
+
+    def __len__(self):
+        return self.height
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def collides(self, shape, x, y):
+        """
+        Returns whether a figure shape placed at (x, y) leaves the field or overlaps a filled block.
+        Params: shape (tuple of (dy, bits) pairs from shape_rows), x, y
+        """
+        rows = self.rows
+        for dy, bits in shape:
+            i = y + dy
+            if i > self.height - 1:
+                return True
+            if x >= 0:
+                bits <<= x
+                if bits > self.full:
+                    return True
+            else:
+                if bits & ((1 << -x) - 1):
+                    return True
+                bits >>= -x
+            if rows[i] & bits:
+                return True
+        return False
+
+    def lock(self, shape, x, y, color):
+        """
+        Writes a figure shape into the field at (x, y) with the given color.
+        Params: shape (tuple of (dy, bits) pairs from shape_rows), x, y, color
+        """
+        rows = self.rows
+        colors = self.colors
+        tops = self.tops
+        for dy, bits in shape:
+            i = y + dy
+            bits = bits << x if x >= 0 else bits >> -x
+            rows[i] |= bits
+            base = i * self.width
+            while bits:
+                low = bits & -bits
+                j = low.bit_length() - 1
+                colors[base + j] = color
+                if i < tops[j]:
+                    tops[j] = i
+                bits ^= low
+
+    def clear_lines(self):
+        """
+        Deletes completed lines and returns how many were deleted.
+        Follows the same rules as Tetris.break_lines: row 0 is never checked, and rows 1 through i - 1
+        move down one row when row i is cleared.
+        """
+        lines = 0
+        full = self.full
+        rows = self.rows
+        colors = self.colors
+        width = self.width
+        for i in range(1, self.height):
+            if rows[i] == full:
+                lines += 1
+                rows[2:i + 1] = rows[1:i]
+                colors[2 * width:(i + 1) * width] = colors[width:i * width]
+        if lines:
+            self.find_tops()
+        return lines
+
+    def load(self, colors):
+        """
+        Replaces the whole field with the given block colors, e.g. from a saved copy of colors.
+        Params: colors (height * width color indices, row by row)
+        """
+        width = self.width
+        self.colors[:] = colors
+        self.rows = [sum(1 << j for j in range(width) if colors[i * width + j]) for i in range(self.height)]
+        self.find_tops()
+
+    def find_tops(self):
+        """
+        Recomputes tops from the rows, top row first, stopping once every column has a block.
+        """
+        tops = self.tops
+        tops[:] = [self.height] * self.width
+        seen = 0
+        for i, bits in enumerate(self.rows):
+            new = bits & ~seen
+            while new:
+                low = new & -new
+                tops[low.bit_length() - 1] = i
+                new ^= low
+            seen |= bits
+            if seen == self.full:
+                break
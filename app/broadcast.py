@@ -0,0 +1,236 @@
+#
+# this is the app/broadcast.py file
+#
+# ... tournament invites: every entrant in a CSV gets their own challenge code, and the entrants are
+# ... sent in batches of up to 1000 SendGrid personalizations per request (each with its own
+# ... substitutions), posted concurrently over one pooled session at a limited rate. A CSV report
+# ... records each entrant's code and whether their batch was accepted.
+#
+# usage: python -m app.broadcast entrants.csv --gamemode 2 --time 95.5 --tournament "Weekly 42"
+#
+
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app import codes
+from app.engine import gamemodes
+from app.outbox import SENDGRID_API_URL, BACKOFF, MAX_BACKOFF, post_mail
+
+# SendGrid accepts at most 1000 personalizations in one mail/send request
+BATCH_SIZE = 1000
+WORKERS = 8
+# requests per second, well under SendGrid's mail/send limit
+RATE = 10.0
+MAX_ATTEMPTS = 5
+
+REPORT_FIELDS = ["email", "name", "code", "batch", "status", "attempts", "error"]
+
+HTML_CONTENT = """
+    <h3> -name-, you're entered in the {tournament} Cstris tournament! </h3>
+    <ol>
+        Challenge Code: -code-
+    </ol>
+    <ol>
+        Paste the above code into your Cstris and clear {lines} lines in under {final_time:.2f} seconds.
+    </ol>
+    <ol>
+        (Don't have Cstris? Get it here: https://github.com/connorkeyes/cstris)
+    </ol>
+    """
+
+
+class RateLimiter:
+    """
+    This class spaces out calls from any number of threads to at most rate per second (with bursts of up to burst).
+    Member Variables: interval (seconds per call), burst, next_time (when the next call may go), lock
+    Member Functions: __init__, wait (blocks until the caller may go)
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        Params: rate (calls per second), burst (calls that may go at once after a quiet spell)
+        """
+        self.interval = 1 / rate
+        self.burst = burst
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        Blocks until the caller may make its call.
+        """
+        with self.lock:
+            now = time.monotonic()
+            # unused slots build up to burst calls
+            start = max(self.next_time, now - (self.burst - 1) * self.interval)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def read_entrants(path):
+    """
+    Reads entrants from a CSV with an "email" column and an optional "name" column (the part of the email
+    before the @ is used when there is no name), skipping blank and repeated addresses.
+    Params: path
+    Returns: a list of (email, name)
+    """
+    entrants = []
+    seen = set()
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            email = (row.get("email") or "").strip()
+            if not email or email.lower() in seen:
+                continue
+            seen.add(email.lower())
+            name = (row.get("name") or "").strip() or email.split("@")[0]
+            entrants.append((email, name))
+    return entrants
+
+
+def entry_codes(entrants, tournament, final_time, gamemode, key=None):
+    """
+    Returns a challenge code for each entrant: the challenger in each code is the tournament and the
+    entrant's entry number, so every entrant's code is different and can be traced back to them.
+    Params: entrants (list of (email, name)), tournament (name), final_time (time to beat, in seconds),
+        gamemode, key (bytes; signs the codes, see codes.encode)
+    """
+    return [codes.encode(f"{tournament} #{number}", final_time, gamemode, key)
+            for number in range(1, len(entrants) + 1)]
+
+
+def batch_payload(sender, subject, html_content, batch):
+    """
+    Returns a SendGrid v3 mail/send request body with one personalization (and one email) per entrant;
+    -name- and -code- in the subject and content are replaced with each entrant's own.
+    Params: sender (email address), subject, html_content, batch (list of (email, name, code))
+    """
+    return {
+        "personalizations": [{"to": [{"email": email, "name": name}],
+                              "substitutions": {"-name-": name, "-code-": code}}
+                             for email, name, code in batch],
+        "from": {"email": sender},
+        "subject": subject,
+        "content": [{"type": "text/html", "value": html_content}],
+    }
+
+
+class Broadcast:
+    """
+    This class sends a tournament's invites in batches, several at a time, over one pooled session.
+    Member Variables: api_url, session (requests.Session with a connection pool the size of workers),
+        sender, batch_size, workers, limiter (RateLimiter), backoff, max_attempts
+    Member Functions: __init__, send (sends every batch and returns the report rows), close
+    """
+
+    def __init__(self, api_url=None, api_key=None, sender=None, batch_size=BATCH_SIZE, workers=WORKERS, rate=RATE,
+                 backoff=BACKOFF, max_attempts=MAX_ATTEMPTS):
+        """
+        Params: api_url (defaults to the SENDGRID_API_URL env var, then the real API), api_key (defaults to
+            the SENDGRID_API_KEY env var), sender (defaults to the SENDER_ADDRESS env var), batch_size
+            (at most 1000), workers (requests in flight at once), rate (requests per second), backoff
+            (seconds before retrying a batch, doubling each time), max_attempts
+        """
+        if not 1 <= batch_size <= BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {BATCH_SIZE}")
+        self.api_url = (api_url or os.getenv("SENDGRID_API_URL", default=SENDGRID_API_URL)).rstrip("/")
+        api_key = api_key or os.getenv("SENDGRID_API_KEY", default="OOPS, please set env var called 'SENDGRID_API_KEY'")
+        self.sender = sender or os.getenv("SENDER_ADDRESS", default="OOPS, please set env var called 'SENDER_ADDRESS'")
+        self.batch_size = batch_size
+        self.workers = workers
+        self.limiter = RateLimiter(rate, burst=workers)
+        self.backoff = backoff
+        self.max_attempts = max_attempts
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = "Bearer " + api_key
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _send_batch(self, body):
+        """
+        Posts one batch, retrying network errors, 429 and 5xx responses with backoff.
+        Returns: (error, attempts); error is None if SendGrid accepted the batch
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            self.limiter.wait()
+            error, retry = post_mail(self.session, self.api_url, body)
+            if error is None or not retry or attempt == self.max_attempts:
+                return error, attempt
+            time.sleep(min(MAX_BACKOFF, self.backoff * 2 ** (attempt - 1)))
+
+    def send(self, entrants, entry_codes, subject, html_content):
+        """
+        Sends every entrant their invite and returns one report row (a dict with REPORT_FIELDS) per entrant.
+        Params: entrants (list of (email, name)), entry_codes (one code per entrant), subject, html_content
+            (may use -name- and -code-)
+        """
+        rows = [(email, name, code) for (email, name), code in zip(entrants, entry_codes)]
+        batches = [rows[i:i + self.batch_size] for i in range(0, len(rows), self.batch_size)]
+        bodies = [json.dumps(batch_payload(self.sender, subject, html_content, batch)) for batch in batches]
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="cstris-broadcast") as pool:
+            results = list(pool.map(self._send_batch, bodies))
+
+        report = []
+        for number, (batch, (error, attempts)) in enumerate(zip(batches, results)):
+            for email, name, code in batch:
+                report.append({"email": email, "name": name, "code": code, "batch": number,
+                               "status": "sent" if error is None else "failed", "attempts": attempts,
+                               "error": error or ""})
+        return report
+
+    def close(self):
+        self.session.close()
+
+
+def write_report(path, report):
+    """
+    Writes the delivery report as a CSV.
+    Params: path, report (rows from Broadcast.send)
+    """
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(report)
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Send every entrant in a CSV their own tournament challenge code.")
+    parser.add_argument("entrants", help="CSV with an email column and an optional name column")
+    parser.add_argument("--gamemode", type=int, choices=[1, 2, 3], required=True)
+    parser.add_argument("--time", type=float, required=True, help="time to beat, in seconds")
+    parser.add_argument("--tournament", default="Cstris")
+    parser.add_argument("--report", default="broadcast-report.csv")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--rate", type=float, default=RATE, help="requests per second")
+    args = parser.parse_args()
+
+    entrants = read_entrants(args.entrants)
+    key = os.getenv("CSTRIS_CODE_KEY")
+    start = time.perf_counter()
+    entries = entry_codes(entrants, args.tournament, args.time, args.gamemode, key.encode("utf-8") if key else None)
+    html_content = HTML_CONTENT.format(tournament=args.tournament, lines=gamemodes[args.gamemode - 1],
+                                       final_time=args.time)
+    broadcast = Broadcast(workers=args.workers, rate=args.rate)
+    try:
+        report = broadcast.send(entrants, entries, f"You're in the {args.tournament} Cstris tournament!", html_content)
+    finally:
+        broadcast.close()
+    write_report(args.report, report)
+    sent = sum(row["status"] == "sent" for row in report)
+    print(f"sent {sent} of {len(report)} invites in {time.perf_counter() - start:.2f}s (report: {args.report})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#
+# this is the app/codes.py file
+#
+# ... challenge codes: a small versioned binary record (gamemode, time in centiseconds, name and a
+# ... checksum) written as "CS" + unpadded base32, so codes survive email and typos are caught.
+# ... decode_bulk validates and decodes many codes at once with NumPy, and the original
+# ... name + digits + time + digits + gamemode codes still decode. A code can also name the run it
+# ... was set in (the piece seed and a digest of the input log of its replay file, see app/verify.py).
+#
+# layout (big-endian):
+#   version (1 byte): 1 = CRC32 checksum, 2 = HMAC-SHA256 checksum (first 8 bytes) with a shared key,
+#       3 and 4 = the same with a run
+#   gamemode (1 byte), centiseconds (4 bytes), name length (1 byte), name (UTF-8),
+#   run (versions 3 and 4): seed (8 bytes), input digest (8 bytes), then the checksum (4 or 8 bytes)
+#
+
+
+import base64
+import hashlib
+import hmac
+import struct
+import zlib
+
+import numpy as np
+
+PREFIX = "CS"
+CRC32 = 1
+HMAC = 2
+RUN_CRC32 = 3
+RUN_HMAC = 4
+CHECKSUM_SIZE = {CRC32: 4, HMAC: 8, RUN_CRC32: 4, RUN_HMAC: 8}
+HEADER = struct.Struct(">BBIB")
+RUN = struct.Struct(">Q8s")
+
+# digits around the time in the original code format
+LEGACY_PADDING = 25
+
+
+class InvalidCodeError(ValueError):
+    """
+    Raised when a challenge code is corrupted, tampered with or not a challenge code at all.
+    """
+
+
+def _checksum(version, data, key):
+    if version in (CRC32, RUN_CRC32):
+        if key is not None:
+            raise InvalidCodeError("this code is not signed; only signed codes are accepted with a key")
+        return struct.pack(">I", zlib.crc32(data))
+    if key is None:
+        raise InvalidCodeError("this code is signed; a key is needed to check it")
+    return hmac.new(key, data, hashlib.sha256).digest()[:CHECKSUM_SIZE[HMAC]]
+
+
+def encode(name, final_time, gamemode, key=None, run=None):
+    """
+    Returns a challenge code for a time.
+    Params: name, final_time (seconds), gamemode (1, 2 or 3), key (bytes; signs the code with HMAC
+        instead of a CRC, so only holders of the key can make valid codes), run ((seed, digest) of the
+        replay the time was set in, see replay.Replay.digest; the code then only verifies with that replay)
+    """
+    name_bytes = name.encode("utf-8")
+    if len(name_bytes) > 255:
+        raise ValueError("name is too long for a challenge code")
+    if run is None:
+        version = CRC32 if key is None else HMAC
+    else:
+        version = RUN_CRC32 if key is None else RUN_HMAC
+    data = HEADER.pack(version, gamemode, round(final_time * 100), len(name_bytes)) + name_bytes
+    if run is not None:
+        data += RUN.pack(*run)
+    data += _checksum(version, data, key)
+    return PREFIX + base64.b32encode(data).decode("ascii").rstrip("=")
+
+
+def decode(code, key=None):
+    """
+    Checks and decodes a challenge code; original-format codes are decoded with decode_legacy.
+    With a key only HMAC-signed codes are accepted, since anyone can make a CRC32 or original-format code.
+    Params: code, key (bytes; needed for HMAC-signed codes)
+    Returns: (gamemode, name, final_time)
+    """
+    code = code.strip()
+    try:
+        return _decode(code, key)[:3]
+    except InvalidCodeError:
+        if key is not None:
+            raise
+        return decode_legacy(code)
+
+
+def decode_run(code, key=None):
+    """
+    Checks and decodes a challenge code along with the run it names (with a key, only signed codes).
+    Params: code, key (bytes; needed for HMAC-signed codes)
+    Returns: (gamemode, name, final_time, run); run is (seed, digest), or None if the code names no run
+    """
+    return _decode(code.strip(), key)
+
+
+def _decode(code, key):
+    if not code.upper().startswith(PREFIX):
+        raise InvalidCodeError("not a challenge code")
+    body = code[len(PREFIX):].upper()
+    try:
+        data = base64.b32decode(body + "=" * (-len(body) % 8))
+    except ValueError:
+        raise InvalidCodeError("not a challenge code")
+    if len(data) < HEADER.size or data[0] not in CHECKSUM_SIZE:
+        raise InvalidCodeError("not a challenge code")
+    version, gamemode, centiseconds, name_length = HEADER.unpack_from(data)
+    end = HEADER.size + name_length
+    run = None
+    if version in (RUN_CRC32, RUN_HMAC):
+        if len(data) >= end + RUN.size:
+            run = RUN.unpack_from(data, end)
+        end += RUN.size
+    if len(data) != end + CHECKSUM_SIZE[version]:
+        raise InvalidCodeError("challenge code has the wrong length")
+    if not hmac.compare_digest(data[end:], _checksum(version, data[:end], key)):
+        raise InvalidCodeError("challenge code checksum does not match")
+    if gamemode not in (1, 2, 3):
+        raise InvalidCodeError("challenge code has an unknown gamemode")
+    try:
+        return gamemode, data[HEADER.size:HEADER.size + name_length].decode("utf-8"), centiseconds / 100, run
+    except UnicodeDecodeError:
+        raise InvalidCodeError("challenge code name is not UTF-8")
+
+
+def decode_legacy(code):
+    """
+    Decodes an original-format code: name, 25 random digits, time, 25 random digits, gamemode.
+    The name ends at its first digit, so names with digits in them do not decode correctly.
+    Params: code
+    Returns: (gamemode, name, final_time)
+    """
+    challenger = ""
+    for char in code:
+        if char.isdigit() == False:
+            challenger += char
+        else:
+            break
+
+    num_digits = len(code) - len(challenger) - 2 * LEGACY_PADDING - 1
+    time_start = len(challenger) + LEGACY_PADDING
+    time_end = time_start + num_digits
+    final_time = code[time_start:time_end]
+    padding = code[len(challenger):time_start] + code[time_end:-1]
+
+    if num_digits < 1 or not padding.isdigit() or code[-1] not in "123":
+        raise InvalidCodeError("not a challenge code")
+    try:
+        return int(code[-1]), challenger, float(final_time)
+    except ValueError:
+        raise InvalidCodeError("not a challenge code")
+
+
+# base32 letter -> 5-bit value (255 for anything that is not base32)
+_BASE32 = np.full(256, 255, dtype=np.uint8)
+for _value, _char in enumerate(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"):
+    _BASE32[_char] = _value
+    _BASE32[bytes([_char]).lower()[0]] = _value
+
+# CRC32 lookup table, the same polynomial as zlib.crc32
+_CRC_TABLE = np.zeros(256, dtype=np.uint32)
+for _byte in range(256):
+    _crc = _byte
+    for _bit in range(8):
+        _crc = (_crc >> 1) ^ 0xEDB88320 if _crc & 1 else _crc >> 1
+    _CRC_TABLE[_byte] = _crc
+
+
+def _decode_group(chars):
+    """
+    Decodes a group of same-length CRC32 codes (prefix removed) given as an (N, L) uint8 array of letters.
+    Returns: valid, gamemode, centiseconds, names (arrays of length N)
+    """
+    count, length = chars.shape
+    values = _BASE32[chars]
+    valid = (values != 255).all(axis=1)
+    values = np.where(values == 255, 0, values).astype(np.uint64)
+
+    # 8 letters -> 40 bits -> 5 bytes
+    values = np.pad(values, ((0, 0), (0, -length % 8)))
+    groups = values.reshape(count, -1, 8)
+    bits = np.zeros(groups.shape[:2], dtype=np.uint64)
+    for k in range(8):
+        bits |= groups[:, :, k] << np.uint64(35 - 5 * k)
+    data = np.stack([(bits >> np.uint64(shift)) & np.uint64(0xFF) for shift in (32, 24, 16, 8, 0)], axis=2)
+    data = data.reshape(count, -1)[:, :length * 5 // 8].astype(np.uint8)
+
+    size = data.shape[1]
+    name_length = size - HEADER.size - CHECKSUM_SIZE[CRC32]
+    if name_length < 0:
+        return np.zeros(count, dtype=bool), None, None, None
+    end = HEADER.size + name_length
+
+    crc = np.full(count, 0xFFFFFFFF, dtype=np.uint32)
+    for position in range(end):
+        crc = _CRC_TABLE[(crc ^ data[:, position]) & 0xFF] ^ (crc >> np.uint32(8))
+    crc ^= np.uint32(0xFFFFFFFF)
+    stored = data[:, end:].astype(np.uint32)
+    stored = (stored[:, 0] << 24) | (stored[:, 1] << 16) | (stored[:, 2] << 8) | stored[:, 3]
+
+    gamemode = data[:, 1]
+    header = data[:, 2:6].astype(np.uint32)
+    centiseconds = (header[:, 0] << 24) | (header[:, 1] << 16) | (header[:, 2] << 8) | header[:, 3]
+    valid &= (data[:, 0] == CRC32) & (data[:, 6] == name_length) & (crc == stored)
+    valid &= (gamemode >= 1) & (gamemode <= 3)
+    if name_length:
+        names = np.ascontiguousarray(data[:, HEADER.size:end]).view(f"S{name_length}").ravel()
+    else:
+        names = np.zeros(count, dtype="S1")
+    return valid, gamemode, centiseconds, names
+
+
+def decode_bulk(codes, key=None):
+    """
+    Checks and decodes many challenge codes in one pass. CRC32 codes of the same length are decoded
+    together with NumPy; signed and original-format codes are decoded one at a time.
+    Params: codes (iterable of codes, e.g. the lines of an open file), key (bytes; for HMAC-signed codes,
+        then only those are valid)
+    Returns: dict of arrays, one entry per code: valid, gamemode, name, time (seconds), code (the code itself,
+        stripped)
+    """
+    codes = [code.strip() for code in codes]
+    count = len(codes)
+    valid = np.zeros(count, dtype=bool)
+    gamemode = np.zeros(count, dtype=np.uint8)
+    time = np.zeros(count, dtype=np.float64)
+    name = np.empty(count, dtype=object)
+
+    groups = {}
+    others = []
+    for index, code in enumerate(codes):
+        # with a key no CRC32 code is valid, so every code goes through decode
+        if key is None and code[:len(PREFIX)].upper() == PREFIX and code.isascii():
+            groups.setdefault(len(code), []).append(index)
+        else:
+            others.append(index)
+
+    for length, indexes in groups.items():
+        indexes = np.array(indexes)
+        chars = np.frombuffer("".join(codes[i] for i in indexes).encode("ascii"), dtype=np.uint8)
+        chars = chars.reshape(len(indexes), length)[:, len(PREFIX):]
+        if chars.shape[1] == 0:
+            others.extend(indexes.tolist())
+            continue
+        group_valid, group_gamemode, centiseconds, names = _decode_group(chars)
+        if group_gamemode is None:
+            others.extend(indexes.tolist())
+            continue
+        good = indexes[group_valid]
+        valid[good] = True
+        gamemode[good] = group_gamemode[group_valid]
+        time[good] = centiseconds[group_valid] / 100
+        name[good] = np.char.decode(names[group_valid], "utf-8", "replace")
+        # anything else might be a signed code or an original-format code that starts with CS
+        others.extend(indexes[~group_valid].tolist())
+
+    for index in others:
+        try:
+            gamemode[index], name[index], time[index] = decode(codes[index], key)
+        except InvalidCodeError:
+            continue
+        valid[index] = True
+
+    code = np.empty(count, dtype=object)
+    code[:] = codes
+    return {"valid": valid, "gamemode": gamemode, "name": name, "time": time, "code": code}
+
+
+def decode_file(path, key=None):
+    """
+    Decodes a file with one challenge code per line (see decode_bulk).
+    Params: path, key
+    """
+    with open(path) as file:
+        return decode_bulk((line for line in file if line.strip()), key)
@@ -0,0 +1,361 @@
+#
+# this is the app/cpu.py file
+#
+# ... a CPU opponent: for every new piece it tries every (rotation, x) placement the piece can reach,
+# ... scores the field each one leaves with a heuristic (aggregate height, holes, bumpiness and lines
+# ... cleared), and plays the best one one key at a time. Scores are cached by field (a transposition
+# ... cache), since many placements leave the same field. Harder opponents also look ahead one piece on
+# ... the most promising placements; that search runs in a process pool under a time budget, and the
+# ... plain best placement is played if it is not back in time, so the game loop never waits on it.
+#
+# usage: python -m app.cpu --difficulty hard --games 4
+#
+
+
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from app.engine import Figure
+from app.headless import FPS, HeadlessGame
+
+# difficulty -> (search depth in pieces, seconds the lookahead may take, ticks between key presses)
+DIFFICULTIES = {
+    "easy": (1, 0.0, 6),
+    "medium": (1, 0.0, 3),
+    "hard": (2, 0.2, 1),
+}
+
+# heuristic weights (Yiyuan Lee's tuned weights for these four features)
+HEIGHT_WEIGHT = -0.510066
+LINES_WEIGHT = 0.760666
+HOLES_WEIGHT = -0.35663
+BUMPINESS_WEIGHT = -0.184483
+
+# value of topping out and of clearing the last line
+LOSS = -1e9
+WIN = 1e9
+
+# placements whose next piece is looked at when searching deeper than one piece
+BEAM = 6
+
+# transposition cache entries kept before it is cleared
+CACHE_SIZE = 200000
+
+# bytes.translate table that turns block colors into 1s, so fields that only differ in color share cache entries
+OCCUPIED = bytes([0] + [1] * 255)
+
+
+class Evaluator:
+    """
+    This class places pieces on a scratch copy of a game and scores the fields they leave.
+    Member Variables: scratch (game used to try placements, restored from a snapshot for each one), cache
+        (transposition cache: filled blocks -> heuristic score, and (filled blocks, depth) -> lookahead
+        value), hits, misses
+    Member Functions: __init__, placements (reachable (rotation, x) of a piece), place (drops a piece on
+        the scratch game), key (which blocks are filled, for the cache), score (heuristic score of the
+        scratch game's field), candidates (every placement, best first), search (best placement, looking
+        ahead depth - 1 pieces), lookahead (mean value of the next piece)
+    """
+
+    def __init__(self, game):
+        """
+        Initializes an evaluator for games the size and kind of the given one.
+        Params: game (Tetris)
+        """
+        self.scratch = game.fork(rng=False)
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _set_figure(self, figure_type, rotation, x, y):
+        scratch = self.scratch
+        figure = scratch.figure
+        if figure is None:
+            figure = scratch.figure = Figure.__new__(Figure)
+        figure.type = figure_type
+        figure.color = figure_type + 1
+        figure.rotation = rotation
+        figure.x = x
+        figure.y = y
+
+    def placements(self, snapshot, figure_type):
+        """
+        Returns the (rotation, x) placements a new piece can reach: each rotation it can turn to where it
+        spawns, then every x it can slide to from there.
+        Params: snapshot (game snapshot, from snapshot(rng=False)), figure_type
+        """
+        scratch = self.scratch
+        scratch.restore(snapshot)
+        spawn = scratch.width // 2 - 2
+        found = []
+        for rotation in range(len(Figure.figures[figure_type])):
+            self._set_figure(figure_type, rotation, spawn, 0)
+            if scratch.intersects():
+                continue
+            figure = scratch.figure
+            found.append((rotation, spawn))
+            for dx in (-1, 1):
+                figure.x = spawn + dx
+                while not scratch.intersects():
+                    found.append((rotation, figure.x))
+                    figure.x += dx
+        return found
+
+    def place(self, snapshot, figure_type, rotation, x):
+        """
+        Restores the scratch game from a snapshot, hard drops a piece there and returns the lines it cleared.
+        Params: snapshot, figure_type, rotation, x
+        """
+        scratch = self.scratch
+        scratch.restore(snapshot)
+        self._set_figure(figure_type, rotation, x, 0)
+        lines_left = scratch.lines_left
+        scratch.go_space()
+        return lines_left - scratch.lines_left
+
+    def key(self):
+        """
+        Returns the filled blocks of the scratch game's field, from its highest block down, as bytes.
+        """
+        scratch = self.scratch
+        field = scratch.field
+        return b"".join(bytes(field[i]) for i in range(min(scratch.tops), scratch.height)).translate(OCCUPIED)
+
+    def score(self):
+        """
+        Returns the heuristic score of the scratch game's field (without the lines cleared), from the cache
+        when the same field was scored before.
+        """
+        scratch = self.scratch
+        key = self.key()
+        score = self.cache.get(key)
+        if score is not None:
+            self.hits += 1
+            return score
+        self.misses += 1
+        height = scratch.height
+        tops = scratch.tops
+        heights = [height - top for top in tops]
+        aggregate = sum(heights)
+        bumpiness = sum(abs(heights[j] - heights[j + 1]) for j in range(len(heights) - 1))
+
+        # every cell from a column's top down is a block or a hole
+        field = scratch.field
+        width = scratch.width
+        blocks = sum(width - bytes(field[i]).count(0) for i in range(min(tops), height))
+        holes = aggregate - blocks
+
+        score = HEIGHT_WEIGHT * aggregate + HOLES_WEIGHT * holes + BUMPINESS_WEIGHT * bumpiness
+        if len(self.cache) >= CACHE_SIZE:
+            self.cache.clear()
+        self.cache[key] = score
+        return score
+
+    def candidates(self, snapshot, figure_type, keep=False):
+        """
+        Returns every placement of a piece as (value, rotation, x, snapshot after), best first, where value
+        is the heuristic score of the field it leaves plus the lines it clears.
+        Params: snapshot, figure_type, keep (include the snapshot after each placement, for searching deeper;
+            None otherwise)
+        """
+        scratch = self.scratch
+        found = []
+        for rotation, x in self.placements(snapshot, figure_type):
+            lines = self.place(snapshot, figure_type, rotation, x)
+            if scratch.lines_left <= 0:
+                value = WIN
+            elif scratch.state == "gameover":
+                value = LOSS
+            else:
+                value = LINES_WEIGHT * lines + self.score()
+            found.append((value, rotation, x, scratch.snapshot(False) if keep else None))
+        found.sort(key=lambda candidate: candidate[0], reverse=True)
+        return found
+
+    def search(self, snapshot, figure_type, depth):
+        """
+        Returns (value, rotation, x) of the best placement of a piece, where for depth > 1 a placement's
+        value also counts the mean value of the best placement of each possible next piece.
+        Params: snapshot, figure_type, depth (pieces to look at, this one included)
+        """
+        found = self.candidates(snapshot, figure_type, depth > 1)
+        if not found:
+            return (LOSS, 0, 0)
+        if depth == 1:
+            return found[0][:3]
+        best = None
+        for value, rotation, x, after in found[:BEAM]:
+            if value not in (WIN, LOSS):
+                value += self.lookahead(after, depth - 1)
+            if best is None or value > best[0]:
+                best = (value, rotation, x)
+        return best
+
+    def lookahead(self, snapshot, depth):
+        """
+        Returns the mean value of the best placement of each possible next piece.
+        Params: snapshot, depth
+        """
+        self.scratch.restore(snapshot)
+        key = (self.key(), depth)
+        value = self.cache.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = sum(self.search(snapshot, figure_type, depth)[0]
+                    for figure_type in range(len(Figure.figures))) / len(Figure.figures)
+        self.cache[key] = value
+        return value
+
+
+# one evaluator per worker process and kind of game, so each keeps its own transposition cache
+_evaluators = {}
+
+
+def _lookahead(job):
+    tetris, height, width, snapshot, depth = job
+    evaluator = _evaluators.get((tetris, height, width))
+    if evaluator is None:
+        evaluator = _evaluators[(tetris, height, width)] = Evaluator(tetris(height, width, 1))
+    return evaluator.lookahead(snapshot, depth)
+
+
+def start_pool(processes=None):
+    """
+    Returns a process pool for CpuPolicy lookahead. Its workers are started fresh (not forked), so it is
+    safe to start after pygame and the background threads are running.
+    Params: processes (defaults to the CPU count)
+    """
+    pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+    # start the workers now, not on the first piece
+    wait([pool.submit(time.sleep, 0) for worker in range(processes or multiprocessing.cpu_count())])
+    return pool
+
+
+class CpuPolicy:
+    """
+    HeadlessGame input policy that plays like a CPU opponent.
+    Member Variables: depth, budget (seconds the lookahead may take), every (ticks between key presses),
+        pool (process pool for the lookahead; None searches in this process, which can take a while),
+        realtime (whether the game keeps going while the lookahead runs, as in start_game; otherwise the
+        policy waits for it, up to the budget),
+        evaluator, piece (game.pieces the current plan is for), plan (keys still to press), pending
+        (lookahead still running: futures, candidates and deadline)
+    Member Functions: __init__, __call__ (the policy), think (plans a new piece), collect (picks the
+        placement once the lookahead is back or out of time), keys (keys that play a placement)
+    """
+
+    def __init__(self, difficulty="medium", pool=None, realtime=True):
+        """
+        Initializes an opponent.
+        Params: difficulty (a key of DIFFICULTIES), pool (from start_pool), realtime
+        """
+        self.depth, self.budget, self.every = DIFFICULTIES[difficulty]
+        self.pool = pool
+        self.realtime = realtime
+        self.evaluator = None
+        self.piece = 0
+        self.plan = []
+        self.pending = None
+
+    def __call__(self, game, tick):
+        if game.figure is None or game.state != "start":
+            return ()
+        if self.evaluator is None:
+            self.evaluator = Evaluator(game)
+        if game.pieces != self.piece:
+            self.piece = game.pieces
+            self.think(game)
+        if self.pending is not None and not self.collect(game):
+            return ()
+        if not self.plan or tick % self.every:
+            return ()
+        return (self.plan.pop(0),)
+
+    def think(self, game):
+        """
+        Plans the current piece: the best placement right away, or starts the lookahead for harder opponents.
+        Params: game
+        """
+        evaluator = self.evaluator
+        snapshot = game.snapshot(False)
+        figure_type = game.figure.type
+        if self.depth == 1 or self.pool is None:
+            value, rotation, x = evaluator.search(snapshot, figure_type, self.depth)
+            self.plan = self.keys(game, rotation, x)
+            self.pending = None
+            return
+        found = evaluator.candidates(snapshot, figure_type, keep=True)[:BEAM]
+        if not found:
+            self.plan = ["drop"]
+            return
+        jobs = [(type(game), game.height, game.width, after, self.depth - 1) for value, rotation, x, after in found]
+        futures = [self.pool.submit(_lookahead, job) for job in jobs]
+        self.pending = (futures, found, time.perf_counter() + self.budget)
+        self.plan = []
+
+    def collect(self, game):
+        """
+        Picks the placement once every lookahead is back, or plays the best placement without lookahead
+        once the budget has run out. Returns whether the plan is ready.
+        Params: game
+        """
+        futures, found, deadline = self.pending
+        if not self.realtime:
+            wait(futures, max(0, deadline - time.perf_counter()))
+        if all(future.done() for future in futures):
+            best = None
+            for (value, rotation, x, after), future in zip(found, futures):
+                if value not in (WIN, LOSS):
+                    value += future.result()
+                if best is None or value > best[0]:
+                    best = (value, rotation, x)
+        elif time.perf_counter() >= deadline:
+            for future in futures:
+                future.cancel()
+            best = found[0][:3]
+        else:
+            return False
+        self.pending = None
+        self.plan = self.keys(game, best[1], best[2])
+        return True
+
+    def keys(self, game, rotation, x):
+        """
+        Returns the keys (ACTIONS) that turn and move the current figure to a placement and drop it.
+        Params: game, rotation, x
+        """
+        figure = game.figure
+        turns = (rotation - figure.rotation) % len(Figure.figures[figure.type])
+        keys = []
+        if turns == 1:
+            keys.append("rotate_left")
+        elif turns == 2:
+            keys.append("rotate_180")
+        elif turns == 3:
+            keys.append("rotate_right")
+        keys.extend(["left" if x < figure.x else "right"] * abs(x - figure.x))
+        keys.append("drop")
+        return keys
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch the CPU opponent play headless games.")
+    parser.add_argument("--difficulty", choices=sorted(DIFFICULTIES), default="medium")
+    parser.add_argument("--gamemode", type=int, choices=[1, 2, 3], default=3)
+    parser.add_argument("--games", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+    pool = start_pool(args.processes) if DIFFICULTIES[args.difficulty][0] > 1 else None
+    for seed in range(args.games):
+        start = time.perf_counter()
+        policy = CpuPolicy(args.difficulty, pool, realtime=False)
+        result = HeadlessGame(args.gamemode, seed, policy).run(FPS * 3600)
+        print(f"seed {seed}: {result['lines']} lines in {result['time']}s of game time, {result['pieces']} pieces, "
+              f"{time.perf_counter() - start:.2f}s to play, cache hits {policy.evaluator.hits} of "
+              f"{policy.evaluator.hits + policy.evaluator.misses}")
+    if pool is not None:
+        pool.shutdown()
@@ -1,407 +1,344 @@
 # references:
-# https://realpython.com/python3-object-oriented-programming/ used to learn about python OOP
 # https://levelup.gitconnected.com/writing-tetris-in-python-2a16bddb5318 used and modified this example for core tetris app (IMPORTANT)
-# https://www.educative.io/edpresso/how-to-generate-a-random-string-in-python used for help with generating code
 
 
-import pygame
-import random
+# pygame (in start_game and app.assets), requests (in app.outbox) and numpy (in app.codes) are imported where they are used,
+# so the menu comes up without waiting for them and the module can be imported by tests and tools
+
 import time
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 import os
-from dotenv import load_dotenv
-import string
-
-load_dotenv()
-
-# initialize set of colors that associate with each piece
-colors = [
-    (0, 0, 0), # placeholder; colors[0] not used
-    (0, 255, 255), # Aqua (line piece)
-    (255, 69, 0), # Red (z piece)
-    (0, 205, 102), # Green (s piece)
-    (58, 95, 205), # Royal Blue (reverse L piece)
-    (255, 128, 0), # Orange (L piece)
-    (255, 131, 250), # Purple (T piece)
-    (255, 255, 0), # Yellow (square piece)
-]
-
-
-class Figure:
-    """
-    This class holds all of the figures or "tetris shapes" that the game will randomly choose.
-    Member Variable: Figures (shape of every figure on a 4x4 grid)
-    Member Functions: __init__ (initialize a figure), image (return image of chosen figure),
-        rotation functions (rotate a figure)
-    """
+import random
+import sys
+import tempfile
 
-    # init x and y to zero
-    x = 0
-    y = 0
-
-    figures = [
-        [[1, 5, 9, 13], [4, 5, 6, 7]], # line piece
-        [[4, 5, 9, 10], [2, 6, 5, 9]], # z piece
-        [[6, 7, 9, 10], [1, 5, 6, 10]], # s piece
-        [[1, 2, 5, 9], [0, 4, 5, 6], [1, 5, 9, 8], [4, 5, 6, 10]], # reverse L piece
-        [[1, 2, 6, 10], [5, 6, 7, 9], [2, 6, 10, 11], [3, 5, 6, 7]], # L piece
-        [[1, 4, 5, 6], [1, 4, 5, 9], [4, 5, 6, 9], [1, 5, 6, 9]], # T piece
-        [[1, 2, 5, 6]], # square piece
-    ]
-
-    def __init__(self, x, y):
-        """
-        Initializes a figure.
-        Params: self, x, y
-        """
-
-        # init x and y
-        self.x = x
-        self.y = y
-
-        # choose a random int between 0 and length of figures list - 1
-        self.type = random.randint(0, len(self.figures) - 1)
-
-        # set color to same int as type to make color the same for the same figure
-        self.color = self.type + 1
-
-        # init rotation to 0
-        self.rotation = 0
-
-    def image(self):
-        """
-        Returns the proper rotation of the chosen type of figure.
-        Params: self
-        """
-        return self.figures[self.type][self.rotation]
-
-    def rotateLeft(self):
-        """
-        Rotates the figure left 90 degrees by finding the modulus of the rotation int and
-        the amount of rotation figures that exist for the respective type of figure.
-        """
-        self.rotation = (self.rotation + 1) % len(self.figures[self.type])
-    
-    def rotateRight(self):
-        """
-        Rotates the figure right 90 degrees by finding the modulus of the rotation int - 1 and
-        the amount of rotation figures that exist for the respective type of figure.
-        """
-
-        # if rotation = 0, use last rotation figure on the figure list; else, subtract 1 from rotation
-        # (avoids error by disallowing rotation from becoming negative)
-        if self.rotation == 0:
-            self.rotation = len(self.figures[self.type]) - 1
-        else:
-            self.rotation = (self.rotation - 1) % len(self.figures[self.type])
+# running as "python app/cstris.py" puts app/ (not the repository root) on the path
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-    def rotate180(self):
-        """
-        Rotates the figure 180 degrees by finding the modulus of the rotation int + 2 and
-        the amount of rotation figures that exist for the respective type of figure.
-        """
-        self.rotation = (self.rotation + 2) % len(self.figures[self.type])
+from app.engine import colors, gamemodes, Figure, Tetris, BitboardTetris, HEIGHT, WIDTH, new_game
+from app.profiler import FrameProfiler, NoProfiler
+from app.loop import SIM_FPS, RENDER_FPS, POLL_INTERVAL, DAS, ARR, FixedTimestep, AutoShift
+from app.replay import Recorder, NoRecorder, Replay
 
 
-class Tetris:
+def window_mode(window):
     """
-    This class holds all the variables of the tetris game.
-    Member Variable: Figures (shape of every figure on a 4x4 grid)
-    Member Functions: __init__ (initializes the game), new_figure (creates new figure)
+    Reads a CSTRIS_WINDOW setting: "fullscreen", "resizable" or a starting size like "1920x1080" (case and
+    surrounding spaces don't matter). Anything else prints a message and gives the standard window.
+    Params: window
+    Returns: "fullscreen", "resizable", a (width, height) tuple, or None for the standard window
     """
-    level = 2
-    score = 0
-    state = "start"
-    field = []
-    height = 0
-    width = 0
-    x = 100
-    y = 60
-    zoom = 20
-    figure = None
-    lines_left = 0
-    start_time = 0
-    timer = 0
-    final_time = 0
-
-    def __init__(self, height, width, lines_left):
-        self.height = height
-        self.width = width
-        self.field = []
-        self.score = 0
-        self.lines_left = lines_left
-        self.start_time = time.time()
-        self.timer = 0
-        self.final_time = 0
-        self.state = "start"
-        for i in range(height):
-            new_line = []
-            for j in range(width):
-                new_line.append(0)
-            self.field.append(new_line)
-
-    def new_figure(self):
-        """
-        Creates new figure object at x=3, y=0
-        Params: self
-        """
-        self.figure = Figure(3, 0)
-
-    def intersects(self):
-        """
-        Returns whether or not a newly created figure is outside the bounds of the game.
-        If a newly created figure is intersecting, game over.
-        Params: self
-        """
-        intersection = False
-
-        # loop through every block in the 4x4 matrix, i*4+j covers every number from 0-15
-        for i in range(4):
-            for j in range(4):
-                if i * 4 + j in self.figure.image():
-                    if i + self.figure.y > self.height - 1 or \
-                            j + self.figure.x > self.width - 1 or \
-                            j + self.figure.x < 0 or \
-                            self.field[i + self.figure.y][j + self.figure.x] > 0:
-                        intersection = True
-        return intersection
-
-    def break_lines(self):
-        """
-        Deletes completed lines (given that every block in a line has a value.)
-        """
-        lines = 0
-        for i in range(1, self.height):
-            zeros = 0
-            for j in range(self.width):
-                if self.field[i][j] == 0:
-                    zeros += 1
-            if zeros == 0:
-                lines += 1
-                for i1 in range(i, 1, -1):
-                    for j in range(self.width):
-                        self.field[i1][j] = self.field[i1 - 1][j]
-        self.lines_left -= lines
-        if self.lines_left <= 0:
-            self.state = "gameover"
-
-    def go_space(self):
-        """
-        Places figure at the bottom of the grid.
-        """
-        while not self.intersects():
-            self.figure.y += 1
-        self.figure.y -= 1
-        self.freeze()
-
-    def go_down(self):
-        """
-        Moves figure down in increments of one y value.
-        """
-        self.figure.y += 1
-        if self.intersects():
-            self.figure.y -= 1
-            self.freeze()
-
-    def freeze(self):
-        """
-        Freezes figure in place so it cannot be moved anymore; "game over" if figure is outside boundaries.
-        """
-        for i in range(4):
-            for j in range(4):
-                if i * 4 + j in self.figure.image():
-                    self.field[i + self.figure.y][j + self.figure.x] = self.figure.color
-        self.break_lines()
-        self.new_figure()
-        if self.intersects():
-            self.state = "gameover"
-
-    def go_side(self, dx):
-        """
-        Moves figure to the left or to the right by 1 x unit.
-        """
-        old_x = self.figure.x
-        self.figure.x += dx
-        if self.intersects():
-            self.figure.x = old_x
-
-    def rotate(self, direction):
-        """
-        Rotates the figure left, right, or 180 degrees.
-        Params: Direction (passed into through user input key)
-        """
-        old_rotation = self.figure.rotation
-        if direction == "left":
-            self.figure.rotateLeft()
-        elif direction == "right":
-            self.figure.rotateRight()
-        elif direction == "180":
-            self.figure.rotate180()
-        
-        if self.intersects():
-            self.figure.rotation = old_rotation
-
-def start_game(gamemode, challenger, challenger_time, challenge_mode):
+    mode = window.strip().lower()
+    if mode in ("", "fullscreen", "resizable"):
+        return mode or None
+    width, x, height = mode.partition("x")
+    if width.strip().isdecimal() and height.strip().isdecimal() and int(width) > 0 and int(height) > 0:
+        return int(width), int(height)
+    print(f"CSTRIS_WINDOW should be fullscreen, resizable or a size like 1920x1080, not {window!r}; "
+          "using the standard window.")
+    return None
+
+
+def start_game(gamemode, challenger, challenger_time, challenge_mode, profile=None, record=None, results=None,
+               player="", assets=None, height=None, width=None, lines=None, opponent=None):
     """
     Starts a game of CStris.
     Params: gamemode (10 lines, 20 lines, or 40 lines), challenger (name), challenger_time 
-    (what time they got), and challenge mode (used to determine if user is being challenged or not)
+    (what time they got), and challenge mode (used to determine if user is being challenged or not),
+    profile (file to write frame timings to, .csv or JSON lines; defaults to the CSTRIS_PROFILE env var,
+    and no profiling when neither is set), record (file to record a replay of the game to, see app/replay.py;
+    defaults to a new file in the CSTRIS_REPLAY_DIR directory, and no recording when neither is set),
+    results (Results store to record the run in when the game ends, unless it was restarted), player (name the run is recorded under),
+    assets (Assets with the music and sound effects, ideally started while the menu was up; loaded here if not given),
+    height, width and lines (board size and lines to clear, for marathon and stress games; default to the
+    CSTRIS_HEIGHT, CSTRIS_WIDTH and CSTRIS_LINES env vars, then the standard 20 by 10 board and the gamemode's
+    lines. Runs on other boards are not recorded or added to results, since their times are not comparable),
+    opponent (difficulty of a CPU opponent to race, see app/cpu.py; it plays the same pieces on a small board
+    next to yours, and None plays alone)
     """
 
-    gamemodes = [10, 20, 40]
-
-    # Initialize the game engine and music engine
-    pygame.init()
-    pygame.mixer.init()
+    import pygame
+    from app.render import BLACK, SIZE, Renderer, ScaledRenderer
+    from app.assets import Assets
 
-    # load music and sound effect to play when lines are cleared
-    rootDir = os.path.dirname(os.path.abspath("top_level_file.txt"))
-    music = os.path.join(rootDir + "/sounds/music.mp3")
-    sound_effect = os.path.join(rootDir + "/sounds/clear.wav")
+    # Initialize only the parts of the game engine we use (display, fonts and music)
+    pygame.display.init()
+    pygame.font.init()
 
+    # music and the sound effect to play when lines are cleared, already loaded if assets was started earlier
+    if assets is None:
+        assets = Assets()
+    assets.wait()
+    clear_sound = assets.sound("clear.wav")
 
     # Initialize counter to stop the loop when the game ends
     stop_loop_count = 0
 
-    # Define some colors
-    BLACK = (0, 0, 0)
-    WHITE = (255, 255, 255)
-    GRAY = (128, 128, 128)
-
-    size = (400, 500)
-    screen = pygame.display.set_mode(size)
+    # a game restarted with escape keeps its clock running, so its time is not recorded
+    reset = False
+
+    # the standard 400 by 500 window, or (CSTRIS_WINDOW) a resizable or fullscreen one the game is scaled to fit
+    window = window_mode(os.getenv("CSTRIS_WINDOW", default=""))
+    if window == "fullscreen":
+        screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+    elif window:
+        screen = pygame.display.set_mode(SIZE if window == "resizable" else window, pygame.RESIZABLE)
+    else:
+        screen = pygame.display.set_mode(SIZE)
     pygame.display.set_caption("Cstris")
+    board_renderer = ScaledRenderer if window else Renderer
 
     # Loop until the user clicks the close button or the game ends.
     done = False
-    clock = pygame.time.Clock()
-    fps = 25
-    game = Tetris(20, 10, gamemodes[gamemode - 1])
+    fps = SIM_FPS
+    render_fps = int(os.getenv("CSTRIS_RENDER_FPS", default=RENDER_FPS))
+    shift = AutoShift(float(os.getenv("CSTRIS_DAS", default=DAS * 1000)) / 1000,
+                      float(os.getenv("CSTRIS_ARR", default=ARR * 1000)) / 1000)
+    height = height or int(os.getenv("CSTRIS_HEIGHT", default=HEIGHT))
+    width = width or int(os.getenv("CSTRIS_WIDTH", default=WIDTH))
+    lines = lines or int(os.getenv("CSTRIS_LINES", default=gamemodes[gamemode - 1]))
+    standard = (height, width, lines) == (HEIGHT, WIDTH, gamemodes[gamemode - 1])
+    if not standard:
+        results = None
+        record = False
+    game = new_game(height, width, lines)
+    seed = random.randrange(2 ** 63)
+    game.rng = random.Random(seed)
+
+    # a bigger board is shown through a standard sized viewport that follows the figure
+    renderer = board_renderer(screen, game, ghost=os.getenv("CSTRIS_GHOST", default="1") != "0", rows=HEIGHT, cols=WIDTH)
+
+    # the CPU opponent plays the same pieces in a HeadlessGame stepped with ours, drawn small to the right
+    cpu = None
+    cpu_renderer = None
+    cpu_time = None
+    pool = None
+    if opponent:
+        from app.cpu import DIFFICULTIES, CpuPolicy, start_pool
+        from app.headless import HeadlessGame
+
+        if DIFFICULTIES[opponent][0] > 1:
+            pool = start_pool(2)
+        cpu = HeadlessGame(gamemode, seed, CpuPolicy(opponent, pool), height=height, width=width, lines=lines)
+        cpu.game.x = 310
+        cpu.game.zoom = 8
+        cpu_renderer = board_renderer(screen, cpu.game, ghost=False, rows=HEIGHT, cols=WIDTH, clear=False)
+
+    # frame-time profiling, only when asked for
+    if profile is None:
+        profile = os.getenv("CSTRIS_PROFILE")
+    if profile:
+        profiler = FrameProfiler(render_fps or fps)
+        profiler.instrument(game)
+    else:
+        profiler = NoProfiler()
+    overlay = []
+
+    # replay recording, only when asked for
+    if record is None and os.getenv("CSTRIS_REPLAY_DIR"):
+        record = os.path.join(os.getenv("CSTRIS_REPLAY_DIR"),
+                              time.strftime("%Y%m%d-%H%M%S-") + str(gamemodes[gamemode - 1]) + ".replay")
+    if record:
+        recorder = Recorder(record, gamemode, seed, game.height, game.width)
+    else:
+        recorder = NoRecorder()
+    next_overlay = 0
     counter = 0
 
     # play music
-    pygame.mixer.music.load(music)
-    pygame.mixer.music.play(-1)
+    assets.play_music()
+    lines_left = game.lines_left
 
     pressing_down = False
 
-    start_time = time.time()
-    final_time = time.time()
+    start_time = time.perf_counter()
+    final_time = time.perf_counter()
+
+    # the game runs at fps ticks per second whatever the frame rate; input is polled every
+    # POLL_INTERVAL seconds and a frame is drawn every 1 / render_fps seconds (or every poll if 0)
+    stepper = FixedTimestep(1 / fps, start_time)
+    frame_start = start_time
+    next_frame = start_time
+    slept = 0
 
     while not done:
+        now = time.perf_counter()
         if game.figure is None:
             game.new_figure()
-        counter += 0.5
-        if counter > 100000:
-            counter = 0
-
-        if fps != 0:
-            if counter % (fps // game.level // 2) == 0 or pressing_down:
-                if game.state == "start":
-                    game.go_down()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                done = True
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    game.rotate("right")
-                if event.key == pygame.K_z:
-                    game.rotate("left")
-                if event.key == pygame.K_a:
-                    game.rotate("180")
-                if event.key == pygame.K_DOWN:
-                    pressing_down = True
-                if event.key == pygame.K_LEFT:
-                    game.go_side(-1)
-                if event.key == pygame.K_RIGHT:
-                    game.go_side(1)
-                if event.key == pygame.K_SPACE:
-                    game.go_space()
-                if event.key == pygame.K_ESCAPE:
-                    game.__init__(20, 10, 1)
-
-        if event.type == pygame.KEYUP:
-                if event.key == pygame.K_DOWN:
-                    pressing_down = False
-                if event.key == pygame.K_LEFT:
-                    pressing_left = False
-                if event.key == pygame.K_RIGHT:
-                    pressing_right = False
-
-        screen.fill(WHITE)
-
-        for i in range(game.height):
-            for j in range(game.width):
-                pygame.draw.rect(screen, GRAY, [game.x + game.zoom * j, game.y + game.zoom * i, game.zoom, game.zoom], 1)
-                if game.field[i][j] > 0:
-                    pygame.draw.rect(screen, colors[game.field[i][j]],
-                                    [game.x + game.zoom * j + 1, game.y + game.zoom * i + 1, game.zoom - 2, game.zoom - 1])
-
-        if game.figure is not None:
-            for i in range(4):
-                for j in range(4):
-                    p = i * 4 + j
-                    if p in game.figure.image():
-                        pygame.draw.rect(screen, colors[game.figure.color],
-                                        [game.x + game.zoom * (j + game.figure.x) + 1,
-                                        game.y + game.zoom * (i + game.figure.y) + 1,
-                                        game.zoom - 2, game.zoom - 2])
-
-        game.timer = round(time.time() - start_time, 2)
-
-        font = pygame.font.SysFont('Calibri', 25, True, False)
-        font1 = pygame.font.SysFont('Calibri', 65, True, False)
-        lines_left_cap = font.render("Lines Left: ", True, BLACK)
-        lines_left_num = font.render(str(game.lines_left), 25, colors[2])
-        timer_cap = font.render("Time: " + str(game.timer) + "s", True, BLACK)
-        text_game_over = font1.render("Game Over!", True, BLACK)
-        text_final_time = font1.render("Time: " + str(round(final_time, 2)), True, colors[2])
-        text_you_win = font1.render("You Win!", True, colors[3])
-        text_you_lose = font1.render("You Lose!", True, colors[2])
-        text_challenger_time = font.render(challenger + " Time: " + str(challenger_time), True, BLACK)
-
-        screen.blit(lines_left_cap, [130, 15])
-        screen.blit(lines_left_num, [260, 15])
+
+        with profiler.phase("events"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    done = True
+                if event.type == pygame.VIDEORESIZE and window:
+                    screen = pygame.display.get_surface()
+                    renderer.resize(screen)
+                    if cpu_renderer is not None:
+                        cpu_renderer.resize(screen)
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_UP:
+                        game.rotate("right")
+                        recorder.input(stepper.ticks, "rotate_right")
+                    if event.key == pygame.K_z:
+                        game.rotate("left")
+                        recorder.input(stepper.ticks, "rotate_left")
+                    if event.key == pygame.K_a:
+                        game.rotate("180")
+                        recorder.input(stepper.ticks, "rotate_180")
+                    if event.key == pygame.K_DOWN:
+                        pressing_down = True
+                        recorder.input(stepper.ticks, "down")
+                    if event.key == pygame.K_LEFT:
+                        game.go_side(-1)
+                        recorder.input(stepper.ticks, "left")
+                        shift.press(-1, now)
+                    if event.key == pygame.K_RIGHT:
+                        game.go_side(1)
+                        recorder.input(stepper.ticks, "right")
+                        shift.press(1, now)
+                    if event.key == pygame.K_SPACE:
+                        game.go_space()
+                        recorder.input(stepper.ticks, "drop")
+                    if event.key == pygame.K_ESCAPE:
+                        game.__init__(game.height, game.width, 1)
+                        reset = True
+                        recorder.input(stepper.ticks, "reset")
+                if event.type == pygame.KEYUP:
+                    if event.key == pygame.K_DOWN:
+                        pressing_down = False
+                        recorder.input(stepper.ticks, "release_down")
+                    if event.key == pygame.K_LEFT:
+                        shift.release(-1, now)
+                    if event.key == pygame.K_RIGHT:
+                        shift.release(1, now)
+
+            # auto repeat for held side moves; stop at the first move that is blocked
+            direction, moves = shift.moves(now, game.width)
+            for move in range(moves):
+                old_x = game.figure.x
+                game.go_side(direction)
+                recorder.input(stepper.ticks, "left" if direction < 0 else "right")
+                if game.figure.x == old_x:
+                    break
+
+        with profiler.phase("gravity"):
+            due = stepper.advance(now)
+            for tick in range(stepper.ticks - due + 1, stepper.ticks + 1):
+                counter += 0.5
+                if counter > 100000:
+                    counter = 0
+                if counter % (fps // game.level // 2) == 0 or pressing_down:
+                    if game.state == "start":
+                        game.go_down()
+                recorder.tick(tick, game, counter, pressing_down)
+                if cpu is not None and cpu.game.state == "start" and game.state == "start":
+                    cpu.step()
+                    if cpu.game.lines_left <= 0:
+                        cpu_time = cpu.tick / fps
+
+        if game.lines_left < lines_left:
+            clear_sound.play()
+        lines_left = game.lines_left
+
+        if now < next_frame:
+            # nothing to draw yet: wait for the next poll, tick or frame, whichever comes first
+            wait = min(now + POLL_INTERVAL, stepper.next_time(), next_frame) - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+                slept += wait
+            continue
+        next_frame = max(next_frame + 1 / render_fps, now) if render_fps else now
+
+        game.timer = round(now - start_time, 2)
+
+        # HUD text for this frame; the renderer only redraws the slots whose text changed
+        texts = {
+            "lines_left_cap": ("Lines Left: ", (130, 15), 25, BLACK),
+            "lines_left_num": (str(game.lines_left), (260, 15), 25, colors[2]),
+            "timer": None,
+            "result": None,
+            "final_time": None,
+            "challenger_time": None,
+        }
         if game.state == "start":
-            screen.blit(timer_cap, [130, 470])
+            texts["timer"] = ("Time: " + str(game.timer) + "s", (130, 470), 25, BLACK)
+
+        if cpu is not None:
+            if cpu_time is not None:
+                texts["cpu"] = ("CPU: " + str(round(cpu_time, 2)) + "s", (310, 225), 18, BLACK)
+            elif cpu.game.state == "gameover":
+                texts["cpu"] = ("CPU: out", (310, 225), 18, BLACK)
+            else:
+                texts["cpu"] = ("CPU: " + str(cpu.game.lines_left) + " left", (310, 225), 18, BLACK)
 
         if challenge_mode == False:
             if game.state == "gameover":
                 stop_loop_count += 1
                 if stop_loop_count == 1:
-                    final_time = time.time() - start_time
+                    final_time = time.perf_counter() - start_time
                     pygame.mixer.music.stop()
-                screen.blit(text_game_over, [20, 200])
-                screen.blit(text_final_time, [25, 265])
+                    recorder.finish(stepper.ticks, final_time)
+                    if results is not None and not reset:
+                        results.add_run(player, gamemode, final_time, lines - game.lines_left,
+                                        game.pieces)
+                if cpu is None:
+                    texts["result"] = ("Game Over!", (20, 200), 65, BLACK)
+                elif game.lines_left <= 0 and (cpu_time is None or final_time <= cpu_time):
+                    texts["result"] = ("You Win!", (20, 200), 65, colors[3])
+                else:
+                    texts["result"] = ("You Lose!", (20, 200), 65, colors[2])
+                texts["final_time"] = ("Time: " + str(round(final_time, 2)), (25, 265), 65, colors[2])
         else:
             if game.state == "gameover":
                 stop_loop_count += 1
                 if stop_loop_count == 1:
-                    final_time = time.time() - start_time
+                    final_time = time.perf_counter() - start_time
                     pygame.mixer.music.stop()
+                    recorder.finish(stepper.ticks, final_time)
+                    if results is not None and not reset:
+                        results.add_run(player, gamemode, final_time, lines - game.lines_left,
+                                        game.pieces)
                 if final_time <= float(challenger_time):
-                    screen.blit(text_you_win, [20, 200])
-                    screen.blit(text_final_time, [20, 265])
-                    screen.blit(text_challenger_time, [20, 330])
+                    texts["result"] = ("You Win!", (20, 200), 65, colors[3])
                 else:
-                    screen.blit(text_you_lose, [20, 200])
-                    screen.blit(text_final_time, [20, 265])
-                    screen.blit(text_challenger_time, [20, 330])
-
-        pygame.display.flip()
-        clock.tick(fps)
+                    texts["result"] = ("You Lose!", (20, 200), 65, colors[2])
+                texts["final_time"] = ("Time: " + str(round(final_time, 2)), (20, 265), 65, colors[2])
+                texts["challenger_time"] = (challenger + " Time: " + str(challenger_time), (20, 330), 25, BLACK)
+
+        # profiler overlay, refreshed once a second so the cached text is reused in between
+        if profiler.enabled:
+            if now >= next_overlay:
+                overlay = profiler.overlay()
+                next_overlay = now + 1
+            for line_num, line in enumerate(overlay):
+                texts["profile_" + str(line_num)] = (line, (2, 60 + 14 * line_num), 12, BLACK)
+
+        with profiler.phase("draw"):
+            renderer.draw(game, texts)
+            if cpu_renderer is not None:
+                cpu_renderer.draw(cpu.game, {})
+        with profiler.phase("flip"):
+            renderer.flip()
+            if cpu_renderer is not None:
+                cpu_renderer.flip()
+        frame_end = time.perf_counter()
+        profiler.end_frame(round((frame_end - frame_start) * 1000, 3), round((frame_end - frame_start - slept) * 1000, 3))
+        frame_start = frame_end
+        slept = 0
 
         # pygame.quit()
-    
+
+    recorder.close(stepper.ticks)
+    profiler.export(profile)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
     return final_time
 
 def display_menu():
     """
     Displays the menu for the user to use.
     """
-    choices = [1,2,3,4,5]
+    choices = [1,2,3,4,5,6]
     choice = 0
     while choice not in choices or choice == 4:
         print("***********************************")
@@ -409,6 +346,7 @@ def display_menu():
         print("Play Solo - 1")
         print("Send Challenge - 2")
         print("Receive Challenge - 3")
+        print("Play Against the CPU - 6")
         print("Instructions - 4")
         print("Exit - 5")
         choice = int(input("***********************************\n"))
@@ -445,29 +383,60 @@ def display_gamemodes():
             continue
         return choice
 
-def generate_code(name, final_time, gamemode):
+def display_difficulties():
+    """
+    Displays the CPU opponent's difficulties and returns the chosen one.
+    """
+    difficulties = ["easy", "medium", "hard"]
+    choice = 0
+    while choice not in [1,2,3]:
+        print("***********************************")
+        print("Easy - 1")
+        print("Medium - 2")
+        print("Hard - 3")
+        choice = int(input("***********************************\n"))
+        if choice not in [1,2,3]:
+            print("Please select a valid choice.\n")
+            continue
+        return difficulties[choice - 1]
+
+def generate_code(name, final_time, gamemode, run=None):
     """
-    Generates a (sort of) encrypted code that stores the Challenger's name, time, and gamemode.
-    Generated when user sends a challenge.
-    Params: name (username), final time(how long user took to complete CStris), gamemode
+    Generates a checksummed code that stores the Challenger's name, time, and gamemode (see app/codes.py).
+    Generated when user sends a challenge. If the CSTRIS_CODE_KEY env var is set, the code is signed with it.
+    Params: name (username), final time(how long user took to complete CStris), gamemode, run (replay file of
+    the game; the code then names its seed and inputs, so app/verify.py can check the time against it)
     """
-    nums = string.digits
-    code = ''.join(random.choice(nums) for i in range(50))
-    final_time_str = str(round(final_time, 2))
-    code = name + code[:25] + final_time_str + code[25:] + str(gamemode)                
-    return code
+    from app import codes
+
+    if run is not None:
+        replay = Replay(run)
+        run = (replay.seed, replay.digest())
+        replay.close()
+    return codes.encode(name, final_time, gamemode, code_key(), run)
 
 
-def send_challenge(username, email, final_time, gamemode):
+def code_key():
     """
-    Sends challenge email to email of user's choice. Includes generated code.
-    Params: username, email(that user sends to), final time, gamemode
+    Returns the key that signs challenge codes (the CSTRIS_CODE_KEY env var), or None for plain checksums.
     """
-    SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY", default="OOPS, please set env var called 'SENDGRID_API_KEY'")
+    key = os.getenv("CSTRIS_CODE_KEY")
+    return key.encode("utf-8") if key else None
+
+
+def send_challenge(username, email, final_time, gamemode, outbox, run=None):
+    """
+    Queues a challenge email to email of user's choice. Includes generated code.
+    The email is sent by the outbox's background thread, so this returns right away.
+    Params: username, email(that user sends to), final time, gamemode, outbox (Outbox that sends it),
+    run (replay file of the game; it is attached and the code names it, so the time can be verified)
+    Returns: the outbox message id, for outbox.status
+    """
+    from app.outbox import mail_payload
+
     SENDER_ADDRESS = os.getenv("SENDER_ADDRESS", default="OOPS, please set env var called 'SENDER_ADDRESS'")
-    client = SendGridAPIClient(SENDGRID_API_KEY)
     subject = username + " has challenged you to Cstris!"
-    code = generate_code(username, final_time, gamemode)
+    code = generate_code(username, final_time, gamemode, run)
     html_content = f"""
     <h3> You've been challenged to Cstris by {username}! </h3>
     <ol>
@@ -481,64 +450,115 @@ def send_challenge(username, email, final_time, gamemode):
     </ol>
     """
 
-    message = Mail(from_email=SENDER_ADDRESS, to_emails=email, subject=subject, html_content=html_content)
-
-    try:
-        response = client.send(message)
-        print("Your challenge has been sent. May you conquer all your enemies.")
+    attachments = None
+    if run is not None:
+        filename = os.path.basename(run)
+        html_content += f"""
+    <ol>
+        {username}'s run is attached. To check it, save it and run: python -m app.verify {filename}
+    </ol>
+    """
+        with open(run, "rb") as file:
+            attachments = {filename: file.read()}
 
-    except:
-        print("Unfortunately, something went wrong. Your challenge could not be sent.")
-        print("Double check that the email is valid if you want to send a challenge!")
+    message_id = outbox.enqueue(email, mail_payload(SENDER_ADDRESS, email, subject, html_content, attachments))
+    print("Your challenge is on its way. May you conquer all your enemies.")
+    return message_id
 
 def accept_challenge(code):
     """
-    De-encrypts code and returns relevant data for challenge: (gamemode, challenger,
-    and final time)
-    Params: encrypted code
+    Checks and decodes a code (new or original format) and returns relevant data for challenge:
+    [gamemode, challenger, final time]. Raises codes.InvalidCodeError if the code is not valid.
+    Params: code
     """
-    challenger = ""
-    for char in code:
-        if char.isdigit() == False:
-            challenger += char
+    from app import codes
+
+    return list(codes.decode(code, code_key()))
+
+def main():
+    """
+    Runs CStris from the command line: asks for the player's name, then shows the menu.
+    """
+    from dotenv import load_dotenv
+    from app.outbox import Outbox
+    from app.codes import InvalidCodeError
+    from app.results import Results, CHALLENGE
+    from app.assets import Assets
+
+    load_dotenv()
+
+    # send anything left in the outbox from last time while the player is in the menu
+    outbox = Outbox().start()
+    results = Results()
+
+    # load the music and sound effects while the player is in the menu
+    assets = Assets().start()
+
+    print("***********************************")
+    print("              CSTRIS               ")
+    print("***********************************")
+    name = input("Please enter your name: ")
+    print("***********************************")
+    print("Welcome to Cstris, " + name + "!")
+    choice = display_menu()
+    if choice == 1:
+        print("Please select gamemode: ")
+        gamemode = display_gamemodes()
+        print("Starting game...")
+        final_time = start_game(gamemode, '', 0, False, results=results, player=name, assets=assets)
+        print(str(round(final_time,2)) + " seconds! Nice job!")
+        best = results.personal_best(name, gamemode)
+        if best is not None:
+            print(f"Your best: {round(best, 2)} seconds (faster than "
+                  f"{round(100 - results.percentile(gamemode, best))}% of runs here)")
+    elif choice == 2:
+        email = input("Please enter the email address to send a challenge to: ")
+        print("Please select gamemode: ")
+        gamemode = display_gamemodes()
+        print("Starting game...")
+        # the game is always recorded, so the run can go with the challenge
+        run = os.path.join(os.getenv("CSTRIS_REPLAY_DIR") or tempfile.gettempdir(),
+                           time.strftime("%Y%m%d-%H%M%S-") + str(gamemodes[gamemode - 1]) + "-challenge.replay")
+        final_time = start_game(gamemode, '', 0, False, record=run, results=results, player=name, assets=assets)
+        message_id = send_challenge(name, email, final_time, gamemode, outbox, run if os.path.exists(run) else None)
+    elif choice == 3:
+        code = input("Please copy and paste the code you received in your email...\n")
+        try:
+            challenge_info = accept_challenge(code)
+        except InvalidCodeError:
+            print("That code is not valid. Double check that you copied all of it!")
+        else:
+            results.add_run(challenge_info[1], challenge_info[0], challenge_info[2], gamemodes[challenge_info[0] - 1],
+                            source=CHALLENGE, code=code.strip())
+            final_time = start_game(challenge_info[0], challenge_info[1], challenge_info[2], True, results=results,
+                                    player=name, assets=assets)
+    elif choice == 6:
+        print("Please select gamemode: ")
+        gamemode = display_gamemodes()
+        print("Please select the CPU's difficulty: ")
+        difficulty = display_difficulties()
+        print("Starting game...")
+        final_time = start_game(gamemode, '', 0, False, results=results, player=name, assets=assets,
+                                opponent=difficulty)
+        print(str(round(final_time,2)) + " seconds! Nice job!")
+    # choice 4 covered in display_menu(); did to keep instructions within menu display loop
+    else:
+        print("Exiting...")
+
+    # give a new challenge a few seconds to go out; if it is still pending it is sent next time
+    if choice == 2:
+        outbox.flush(timeout=5)
+        status = outbox.status(message_id)["status"]
+        if status == "sent":
+            print("Your challenge has been sent.")
+        elif status == "pending":
+            print("Your challenge will be sent the next time you open Cstris.")
         else:
-            break
-    
-    num_digits = len(code) - len(challenger) - 51
-    time_start = len(challenger) + 25
-    time_end = time_start + num_digits
-    final_time = code[time_start:time_end]
-
-    gamemode = code[len(code) - 1]
-
-    return [gamemode, challenger, final_time]
-
-print("***********************************")
-print("              CSTRIS               ")
-print("***********************************")
-name = input("Please enter your name: ")
-print("***********************************")
-print("Welcome to Cstris, " + name + "!")
-choice = display_menu()
-if choice == 1:
-    print("Please select gamemode: ")
-    gamemode = display_gamemodes()
-    print("Starting game...")
-    final_time = start_game(gamemode, '', 0, False)
-    print(str(round(final_time,2)) + " seconds! Nice job!")
-elif choice == 2:
-    email = input("Please enter the email address to send a challenge to: ")
-    print("Please select gamemode: ")
-    gamemode = display_gamemodes()
-    print("Starting game...")
-    final_time = start_game(gamemode, '', 0, False)
-    send_challenge(name, email, final_time, gamemode)
-elif choice == 3:
-    code = input("Please copy and paste the code you received in your email...\n")
-    challenge_info = []
-    challenge_info = accept_challenge(code)
-    final_time = start_game(int(challenge_info[0]), challenge_info[1], float(challenge_info[2]), True)
-# choice 4 covered in display_menu(); did to keep instructions within menu display loop
-else:
-    print("Exiting...")
-    exit()
+            print("Unfortunately, something went wrong. Your challenge could not be sent.")
+            print("Double check that the email is valid if you want to send a challenge!")
+    outbox.stop()
+    results.close()
+
+
+if __name__ == "__main__":
+    main()
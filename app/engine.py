@@ -0,0 +1,542 @@
+#
+# this is the app/engine.py file
+#
+# ... the game rules (Figure and Tetris), kept free of pygame so the game can be simulated headless
+#
+# references:
+# https://realpython.com/python3-object-oriented-programming/ used to learn about python OOP
+# https://levelup.gitconnected.com/writing-tetris-in-python-2a16bddb5318 used and modified this example for core tetris app (IMPORTANT)
+
+
+import random
+import struct
+import time
+from array import array
+
+from app.bitboard import BitboardField, shape_rows
+from app.sparse import SparseField
+
+# number of lines to clear in each gamemode (gamemode 1 is gamemodes[0], and so on)
+gamemodes = [10, 20, 40]
+
+# the standard board; boards with more cells than SPARSE_CELLS are played on a SparseField
+HEIGHT = 20
+WIDTH = 10
+SPARSE_CELLS = 4096
+
+# game states, and the header of a snapshot: lines_left, score, pieces, state, figure type (NO_FIGURE if
+# there is none), rotation, x, y and the size of the random state that follows the field
+STATES = ("start", "gameover")
+SNAPSHOT = struct.Struct("<iiIBBBiiH")
+NO_FIGURE = 255
+
+# initialize set of colors that associate with each piece
+colors = [
+    (0, 0, 0), # placeholder; colors[0] not used
+    (0, 255, 255), # Aqua (line piece)
+    (255, 69, 0), # Red (z piece)
+    (0, 205, 102), # Green (s piece)
+    (58, 95, 205), # Royal Blue (reverse L piece)
+    (255, 128, 0), # Orange (L piece)
+    (255, 131, 250), # Purple (T piece)
+    (255, 255, 0), # Yellow (square piece)
+]
+
+
+class Figure:
+    """
+    This class holds all of the figures or "tetris shapes" that the game will randomly choose.
+    Member Variable: Figures (shape of every figure on a 4x4 grid), offsets ((dx, dy) of every block),
+        boxes (bounding box (min dx, min dy, max dx, max dy)) and extents ((dx, top dy, bottom dy) of
+        every column), all indexed [type][rotation]; pool (released figures waiting to be reused)
+    Member Functions: __init__ (initialize a figure), spawn (reuse a released figure or make a new one),
+        release (return a figure to the pool), image (return image of chosen figure),
+        cells (return block offsets of chosen figure), rotation functions (rotate a figure)
+    """
+
+    __slots__ = ("x", "y", "type", "color", "rotation")
+
+    figures = [
+        [[1, 5, 9, 13], [4, 5, 6, 7]], # line piece
+        [[4, 5, 9, 10], [2, 6, 5, 9]], # z piece
+        [[6, 7, 9, 10], [1, 5, 6, 10]], # s piece
+        [[1, 2, 5, 9], [0, 4, 5, 6], [1, 5, 9, 8], [4, 5, 6, 10]], # reverse L piece
+        [[1, 2, 6, 10], [5, 6, 7, 9], [2, 6, 10, 11], [3, 5, 6, 7]], # L piece
+        [[1, 4, 5, 6], [1, 4, 5, 9], [4, 5, 6, 9], [1, 5, 6, 9]], # T piece
+        [[1, 2, 5, 6]], # square piece
+    ]
+
+    # cell p of the 4x4 grid is column p % 4 of row p // 4
+    offsets = [[tuple((p % 4, p // 4) for p in image) for image in rotations] for rotations in figures]
+    boxes = [[(min(dx for dx, dy in cells), min(dy for dx, dy in cells),
+               max(dx for dx, dy in cells), max(dy for dx, dy in cells))
+              for cells in rotations] for rotations in offsets]
+    extents = [[tuple((column, min(dy for dx, dy in cells if dx == column), max(dy for dx, dy in cells if dx == column))
+                      for column in sorted(set(dx for dx, dy in cells)))
+                for cells in rotations] for rotations in offsets]
+
+    pool = []
+
+    def __init__(self, x, y, rng=random):
+        """
+        Initializes a figure.
+        Params: self, x, y, rng (random.Random or the random module; picks the type)
+        """
+
+        # init x and y
+        self.x = x
+        self.y = y
+
+        # choose a random int between 0 and length of figures list - 1
+        self.type = rng.randint(0, len(self.figures) - 1)
+
+        # set color to same int as type to make color the same for the same figure
+        self.color = self.type + 1
+
+        # init rotation to 0
+        self.rotation = 0
+
+    @classmethod
+    def spawn(cls, x, y, rng=random):
+        """
+        Returns a figure at (x, y), reusing a released figure from the pool when there is one.
+        Params: cls, x, y, rng (random.Random or the random module; picks the type)
+        """
+        if cls.pool:
+            figure = cls.pool.pop()
+            figure.__init__(x, y, rng)
+            return figure
+        return cls(x, y, rng)
+
+    def release(self):
+        """
+        Returns the figure to the pool; it must not be used again after this.
+        Params: self
+        """
+        self.pool.append(self)
+
+    def image(self):
+        """
+        Returns the proper rotation of the chosen type of figure.
+        Params: self
+        """
+        return self.figures[self.type][self.rotation]
+
+    def cells(self):
+        """
+        Returns the (dx, dy) offsets of the 4 blocks of the chosen figure in its current rotation.
+        Params: self
+        """
+        return self.offsets[self.type][self.rotation]
+
+    def rotateLeft(self):
+        """
+        Rotates the figure left 90 degrees by finding the modulus of the rotation int and
+        the amount of rotation figures that exist for the respective type of figure.
+        """
+        self.rotation = (self.rotation + 1) % len(self.figures[self.type])
+    
+    def rotateRight(self):
+        """
+        Rotates the figure right 90 degrees by finding the modulus of the rotation int - 1 and
+        the amount of rotation figures that exist for the respective type of figure.
+        """
+
+        # if rotation = 0, use last rotation figure on the figure list; else, subtract 1 from rotation
+        # (avoids error by disallowing rotation from becoming negative)
+        if self.rotation == 0:
+            self.rotation = len(self.figures[self.type]) - 1
+        else:
+            self.rotation = (self.rotation - 1) % len(self.figures[self.type])
+
+    def rotate180(self):
+        """
+        Rotates the figure 180 degrees by finding the modulus of the rotation int + 2 and
+        the amount of rotation figures that exist for the respective type of figure.
+        """
+        self.rotation = (self.rotation + 2) % len(self.figures[self.type])
+
+
+class Tetris:
+    """
+    This class holds all the variables of the tetris game.
+    Member Variable: Figures (shape of every figure on a 4x4 grid), tops (row of the highest block in
+        each column, or height if the column is empty; kept up to date by freeze and break_lines)
+    Member Functions: __init__ (initializes the game), new_figure (creates new figure),
+        column_tops (finds tops from the field), landing_row and drop_row (where a figure lands),
+        snapshot, restore and fork (save, load and copy the whole game)
+    """
+    level = 2
+    score = 0
+    state = "start"
+    field = []
+    height = 0
+    width = 0
+    x = 100
+    y = 60
+    zoom = 20
+    figure = None
+    lines_left = 0
+    pieces = 0
+    rng = random
+    start_time = 0
+    timer = 0
+    final_time = 0
+
+    def __init__(self, height, width, lines_left):
+        self.height = height
+        self.width = width
+        self.field = []
+        self.score = 0
+        self.lines_left = lines_left
+        self.pieces = 0
+        self.start_time = time.time()
+        self.timer = 0
+        self.final_time = 0
+        self.state = "start"
+        self.field = self.create_field(height, width)
+        self.tops = self.column_tops()
+
+    def create_field(self, height, width):
+        """
+        Returns an empty field: a list of height rows, each a list of width zeros.
+        Params: self, height, width
+        """
+        field = []
+        for i in range(height):
+            new_line = []
+            for j in range(width):
+                new_line.append(0)
+            field.append(new_line)
+        return field
+
+    def column_tops(self):
+        """
+        Returns the row of the highest block in each column (height for an empty column), from the field.
+        Params: self
+        """
+        tops = [self.height] * self.width
+        for i in range(self.height - 1, -1, -1):
+            row = self.field[i]
+            for j in range(self.width):
+                if row[j] > 0:
+                    tops[j] = i
+        return tops
+
+    def landing_row(self, figure_type, rotation, x, y):
+        """
+        Returns the row a figure dropped from (x, y) lands in, using only the column tops, or None when the
+        tops cannot tell: the figure is (partly) outside the field, or under or inside the blocks of a column.
+        Params: self, figure_type, rotation, x, y
+        """
+        tops = self.tops
+        landing = self.height
+        for column, top, bottom in Figure.extents[figure_type][rotation]:
+            j = x + column
+            if j < 0 or j >= self.width or y + bottom >= tops[j]:
+                return None
+            landing = min(landing, tops[j] - 1 - bottom)
+        return landing
+
+    def drop_row(self):
+        """
+        Returns the row the figure lands in if it is dropped now (its y after go_space, before it freezes).
+        Params: self
+        """
+        figure = self.figure
+        landing = self.landing_row(figure.type, figure.rotation, figure.x, figure.y)
+        if landing is not None:
+            return landing
+
+        # under an overhang (or already stuck): step down one row at a time like go_space used to
+        y = figure.y
+        while not self.intersects():
+            figure.y += 1
+        landing = figure.y - 1
+        figure.y = y
+        return landing
+
+    def snapshot(self, rng=True):
+        """
+        Returns the state of the game (field, figure, score, lines_left and, optionally, the state of
+        the piece stream) as bytes, for restore or fork.
+        Params: self, rng (include the random state; leave it out when the next pieces do not matter,
+            e.g. in a search, to make the snapshot small and restore fast)
+        """
+        figure = self.figure
+        if figure is None:
+            placement = (NO_FIGURE, 0, 0, 0)
+        else:
+            placement = (figure.type, figure.rotation, figure.x, figure.y)
+        random_state = array("I", self.rng.getstate()[1]).tobytes() if rng else b""
+        return SNAPSHOT.pack(self.lines_left, self.score, self.pieces, STATES.index(self.state), *placement,
+                             len(random_state)) + self.pack_field() + random_state
+
+    def restore(self, snapshot):
+        """
+        Puts the game back in the state of a snapshot taken from a game of the same size.
+        Params: self, snapshot (from snapshot)
+        """
+        (self.lines_left, self.score, self.pieces, state, figure_type, rotation, x, y,
+         random_size) = SNAPSHOT.unpack_from(snapshot)
+        self.state = STATES[state]
+        if figure_type == NO_FIGURE:
+            self.figure = None
+        else:
+            figure = self.figure
+            if figure is None:
+                figure = self.figure = Figure.__new__(Figure)
+            figure.type = figure_type
+            figure.color = figure_type + 1
+            figure.rotation = rotation
+            figure.x = x
+            figure.y = y
+        view = memoryview(snapshot)
+        end = self.unpack_field(view, SNAPSHOT.size)
+        if random_size:
+            self.rng.setstate((3, tuple(view[end:end + random_size].cast("I")), None))
+
+    def fork(self, rng=True):
+        """
+        Returns a new game in the same state as this one, with its own piece stream.
+        Params: self, rng (copy the random state, so the fork gets the same pieces; otherwise it gets a fresh one)
+        """
+        game = type(self).__new__(type(self))
+        game.height = self.height
+        game.width = self.width
+        game.field = game.create_field(self.height, self.width)
+        game.tops = game.column_tops()
+        if rng:
+            game.rng = random.Random(0)
+            game.rng.setstate(self.rng.getstate())
+        else:
+            game.rng = random.Random()
+        game.restore(self.snapshot(False))
+        return game
+
+    def pack_field(self):
+        """
+        Returns the field and column tops as bytes, for snapshot.
+        Params: self
+        """
+        return bytes(cell for row in self.field for cell in row) + array("i", self.tops).tobytes()
+
+    def unpack_field(self, view, offset):
+        """
+        Loads the field and column tops from a snapshot and returns the offset just past them.
+        Params: self, view (memoryview of the snapshot), offset (where the field starts)
+        """
+        width = self.width
+        for row in self.field:
+            row[:] = view[offset:offset + width]
+            offset += width
+        self.tops[:] = view[offset:offset + 4 * width].cast("i")
+        return offset + 4 * width
+
+    def new_figure(self):
+        """
+        Creates new figure object in the middle of the top row (x=3, y=0 on a 10 wide field),
+        handing the old one back to the figure pool
+        Params: self
+        """
+        if self.figure is not None:
+            self.figure.release()
+        self.figure = Figure.spawn(self.width // 2 - 2, 0, self.rng)
+        self.pieces += 1
+
+    def intersects(self):
+        """
+        Returns whether or not a newly created figure is outside the bounds of the game.
+        If a newly created figure is intersecting, game over.
+        Params: self
+        """
+        figure = self.figure
+
+        # loop through the 4 blocks of the figure
+        for j, i in figure.cells():
+            if i + figure.y > self.height - 1 or \
+                    j + figure.x > self.width - 1 or \
+                    j + figure.x < 0 or \
+                    self.field[i + figure.y][j + figure.x] > 0:
+                return True
+        return False
+
+    def break_lines(self):
+        """
+        Deletes completed lines (given that every block in a line has a value.)
+        """
+        lines = 0
+        for i in range(1, self.height):
+            zeros = 0
+            for j in range(self.width):
+                if self.field[i][j] == 0:
+                    zeros += 1
+            if zeros == 0:
+                lines += 1
+                for i1 in range(i, 1, -1):
+                    for j in range(self.width):
+                        self.field[i1][j] = self.field[i1 - 1][j]
+        if lines:
+            self.tops = self.column_tops()
+        self.lines_left -= lines
+        if self.lines_left <= 0:
+            self.state = "gameover"
+
+    def go_space(self):
+        """
+        Places figure at the bottom of the grid.
+        """
+        self.figure.y = self.drop_row()
+        self.freeze()
+
+    def go_down(self):
+        """
+        Moves figure down in increments of one y value.
+        """
+        self.figure.y += 1
+        if self.intersects():
+            self.figure.y -= 1
+            self.freeze()
+
+    def freeze(self):
+        """
+        Freezes figure in place so it cannot be moved anymore; "game over" if figure is outside boundaries.
+        """
+        figure = self.figure
+        for j, i in figure.cells():
+            self.field[i + figure.y][j + figure.x] = figure.color
+        tops = self.tops
+        for column, top, bottom in Figure.extents[figure.type][figure.rotation]:
+            tops[figure.x + column] = min(tops[figure.x + column], figure.y + top)
+        self.break_lines()
+        self.new_figure()
+        if self.intersects():
+            self.state = "gameover"
+
+    def go_side(self, dx):
+        """
+        Moves figure to the left or to the right by 1 x unit.
+        """
+        old_x = self.figure.x
+        self.figure.x += dx
+        if self.intersects():
+            self.figure.x = old_x
+
+    def rotate(self, direction):
+        """
+        Rotates the figure left, right, or 180 degrees.
+        Params: Direction (passed into through user input key)
+        """
+        old_rotation = self.figure.rotation
+        if direction == "left":
+            self.figure.rotateLeft()
+        elif direction == "right":
+            self.figure.rotateRight()
+        elif direction == "180":
+            self.figure.rotate180()
+        
+        if self.intersects():
+            self.figure.rotation = old_rotation
+
+
+class BitboardTetris(Tetris):
+    """
+    Tetris game whose field is a BitboardField, so intersects, freeze and break_lines are a few
+    bitwise ops per row instead of a walk over every cell.
+    game.field[i][j] still returns the color of each block, so the renderer works unchanged.
+    The field keeps the column tops itself (tops is the field's list).
+    Member Variable: shapes (row bitmasks of every figure rotation, indexed [type][rotation])
+    """
+
+    shapes = [[shape_rows(image) for image in rotations] for rotations in Figure.figures]
+
+    def create_field(self, height, width):
+        return BitboardField(height, width)
+
+    def column_tops(self):
+        return self.field.tops
+
+    def pack_field(self):
+        field = self.field
+        # row bitmasks fit an array of 64-bit ints up to 64 columns; wider rows take as many bytes as they need
+        if self.width <= 64:
+            rows = array("Q", field.rows).tobytes()
+        else:
+            size = (self.width + 7) // 8
+            rows = b"".join(bits.to_bytes(size, "little") for bits in field.rows)
+        return rows + array("i", field.tops).tobytes() + field.colors
+
+    def unpack_field(self, view, offset):
+        field = self.field
+        if self.width <= 64:
+            end = offset + 8 * self.height
+            field.rows[:] = view[offset:end].cast("Q")
+        else:
+            size = (self.width + 7) // 8
+            end = offset + size * self.height
+            field.rows[:] = [int.from_bytes(view[start:start + size], "little") for start in range(offset, end, size)]
+        offset, end = end, end + 4 * self.width
+        field.tops[:] = view[offset:end].cast("i")
+        offset, end = end, end + self.height * self.width
+        field.colors[:] = view[offset:end]
+        return end
+
+    def intersects(self):
+        figure = self.figure
+        return self.field.collides(self.shapes[figure.type][figure.rotation], figure.x, figure.y)
+
+    def break_lines(self):
+        self.lines_left -= self.field.clear_lines()
+        if self.lines_left <= 0:
+            self.state = "gameover"
+
+    def freeze(self):
+        figure = self.figure
+        self.field.lock(self.shapes[figure.type][figure.rotation], figure.x, figure.y, figure.color)
+        self.break_lines()
+        self.new_figure()
+        if self.intersects():
+            self.state = "gameover"
+
+
+class SparseTetris(BitboardTetris):
+    """
+    Tetris game for very large boards: the field is a SparseField, which stores only the occupied rows,
+    so memory and the cost of every move grow with the height of the stack instead of the size of the board.
+    Snapshots hold only the occupied rows too.
+    """
+
+    def create_field(self, height, width):
+        return SparseField(height, width)
+
+    def pack_field(self):
+        field = self.field
+        size = (self.width + 7) // 8
+        return (array("I", [len(field.bits)]).tobytes()
+                + b"".join(bits.to_bytes(size, "little") for bits in field.bits)
+                + b"".join(field.cells) + array("i", field.tops).tobytes())
+
+    def unpack_field(self, view, offset):
+        field = self.field
+        width = self.width
+        size = (width + 7) // 8
+        count = view[offset:offset + 4].cast("I")[0]
+        offset += 4
+        field.bits[:] = [int.from_bytes(view[offset + k * size:offset + (k + 1) * size], "little")
+                         for k in range(count)]
+        offset += count * size
+        field.cells[:] = [bytearray(view[offset + k * width:offset + (k + 1) * width]) for k in range(count)]
+        offset += count * width
+        field.tops[:] = view[offset:offset + 4 * width].cast("i")
+        return offset + 4 * width
+
+
+def new_game(height=HEIGHT, width=WIDTH, lines_left=gamemodes[0]):
+    """
+    Returns a new game on a board of any size: a BitboardTetris, or a SparseTetris for boards with more
+    than SPARSE_CELLS cells.
+    Params: height, width, lines_left (lines to clear)
+    """
+    if height * width > SPARSE_CELLS:
+        return SparseTetris(height, width, lines_left)
+    return BitboardTetris(height, width, lines_left)
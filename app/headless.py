@@ -0,0 +1,251 @@
+#
+# this is the app/headless.py file
+#
+# ... runs games of CStris without pygame: each game gets a seeded piece stream and an input policy,
+# ... and is stepped one frame (tick) at a time with the same gravity as start_game.
+# ... run_batch spreads many games across a multiprocessing pool and reports stats per gamemode.
+#
+# usage: python -m app.headless --games 1000 --processes 4
+#
+
+
+import argparse
+import multiprocessing
+import random
+import time
+
+from app.engine import gamemodes, new_game, HEIGHT, WIDTH
+
+# start_game runs at 25 frames per second; one tick here is one of those frames
+FPS = 25
+
+# every input a policy can return, and what start_game does when the matching key is pressed
+ACTIONS = (
+    "rotate_right", # up arrow
+    "rotate_left", # 'Z' key
+    "rotate_180", # 'A' key
+    "left", # left arrow
+    "right", # right arrow
+    "drop", # space bar
+    "down", # down arrow pressed (fast fall until released)
+    "release_down", # down arrow released
+    "reset", # escape key (starts over with 1 line to clear)
+)
+
+
+def apply_action(game, action):
+    """
+    Applies one input to a Tetris game, the same way start_game handles the matching key.
+    "down" and "release_down" only change the fast fall flag, so they are handled by the caller.
+    Params: game (Tetris), action (one of ACTIONS)
+    """
+    if action == "rotate_right":
+        game.rotate("right")
+    elif action == "rotate_left":
+        game.rotate("left")
+    elif action == "rotate_180":
+        game.rotate("180")
+    elif action == "left":
+        game.go_side(-1)
+    elif action == "right":
+        game.go_side(1)
+    elif action == "drop":
+        game.go_space()
+    elif action == "reset":
+        game.__init__(game.height, game.width, 1)
+
+
+class ScriptedPolicy:
+    """
+    Input policy that plays back a fixed script.
+    Member Variable: script (dict of tick -> list of actions, or a list with one list of actions per tick)
+    """
+
+    def __init__(self, script):
+        self.script = script
+
+    def __call__(self, game, tick):
+        if isinstance(self.script, dict):
+            return self.script.get(tick, ())
+        if tick < len(self.script):
+            return self.script[tick]
+        return ()
+
+
+class RandomPolicy:
+    """
+    Input policy that presses a random key on some ticks; useful for load tests.
+    Member Variables: rng (seeded random.Random), rate (chance of pressing a key on a given tick)
+    """
+
+    def __init__(self, seed, rate=0.25):
+        self.rng = random.Random(seed)
+        self.rate = rate
+
+    def __call__(self, game, tick):
+        if self.rng.random() < self.rate:
+            return (self.rng.choice(ACTIONS[:6]),)
+        return ()
+
+
+class HeadlessGame:
+    """
+    This class steps a Tetris game without pygame or a wall clock.
+    Member Variables: game (the Tetris being played), gamemode, lines (lines to clear), seed (seeds the piece stream),
+        policy (called as policy(game, tick) and returns the actions for that tick), tick, pressing_down
+    Member Functions: __init__, step (advances one tick), run (steps until game over), result
+    """
+
+    def __init__(self, gamemode, seed, policy, tetris=None, height=HEIGHT, width=WIDTH, lines=None):
+        """
+        Initializes a game with its first figure in place.
+        Params: gamemode (1, 2 or 3), seed, policy, tetris (Tetris class to play with; defaults to
+            engine.new_game's choice for the board size), height, width, lines (lines to clear; defaults
+            to the gamemode's)
+        """
+        self.gamemode = gamemode
+        self.seed = seed
+        self.policy = policy
+        self.lines = gamemodes[gamemode - 1] if lines is None else lines
+        if tetris is None:
+            self.game = new_game(height, width, self.lines)
+        else:
+            self.game = tetris(height, width, self.lines)
+        self.game.rng = random.Random(seed)
+        self.game.new_figure()
+        self.tick = 0
+        self.counter = 0
+        self.pressing_down = False
+
+    def step(self):
+        """
+        Advances the game by one tick: the policy's inputs first, then gravity, like a tick of start_game.
+        """
+        game = self.game
+        for action in self.policy(game, self.tick):
+            if action == "down":
+                self.pressing_down = True
+            elif action == "release_down":
+                self.pressing_down = False
+            elif game.state == "start":
+                apply_action(game, action)
+
+        self.counter += 0.5
+        if self.counter > 100000:
+            self.counter = 0
+        if self.counter % (FPS // game.level // 2) == 0 or self.pressing_down:
+            if game.state == "start":
+                game.go_down()
+        self.tick += 1
+
+    def run(self, max_ticks=FPS * 600):
+        """
+        Steps the game until it is over or max_ticks have passed, then returns the result.
+        Params: max_ticks
+        """
+        while self.game.state == "start" and self.tick < max_ticks:
+            self.step()
+        return self.result()
+
+    def result(self):
+        """
+        Returns a dict describing the game so far: gamemode, seed, cleared (whether every line was cleared),
+        lines, pieces, ticks and time (in seconds of game time).
+        """
+        game = self.game
+        return {
+            "gamemode": self.gamemode,
+            "seed": self.seed,
+            "cleared": game.lines_left <= 0,
+            "lines": self.lines - game.lines_left,
+            "pieces": game.pieces,
+            "ticks": self.tick,
+            "time": round(self.tick / FPS, 2),
+        }
+
+
+def run_game(gamemode, seed, policy=None, max_ticks=FPS * 600):
+    """
+    Plays one headless game and returns its result dict (see HeadlessGame.result).
+    Params: gamemode, seed, policy (defaults to RandomPolicy(seed)), max_ticks
+    """
+    if policy is None:
+        policy = RandomPolicy(seed)
+    return HeadlessGame(gamemode, seed, policy).run(max_ticks)
+
+
+def _play(job):
+    gamemode, seed, policy_factory, max_ticks = job
+    return run_game(gamemode, seed, policy_factory(seed), max_ticks)
+
+
+def summarize(results, elapsed):
+    """
+    Aggregates game results into a report: total games, games per second and per-gamemode stats.
+    Params: results (list of result dicts), elapsed (wall-clock seconds the games took)
+    """
+    report = {
+        "games": len(results),
+        "seconds": round(elapsed, 3),
+        "games_per_sec": round(len(results) / elapsed, 1) if elapsed > 0 else 0.0,
+        "gamemodes": {},
+    }
+    for gamemode in sorted(set(result["gamemode"] for result in results)):
+        played = [result for result in results if result["gamemode"] == gamemode]
+        times = [result["time"] for result in played if result["cleared"]]
+        report["gamemodes"][gamemodes[gamemode - 1]] = {
+            "games": len(played),
+            "cleared": len(times),
+            "best_time": min(times) if times else None,
+            "mean_time": round(sum(times) / len(times), 2) if times else None,
+            "mean_lines": round(sum(result["lines"] for result in played) / len(played), 2),
+            "mean_pieces": round(sum(result["pieces"] for result in played) / len(played), 2),
+        }
+    return report
+
+
+def run_batch(games, modes=(1, 2, 3), seed=0, policy_factory=RandomPolicy, processes=None, max_ticks=FPS * 600):
+    """
+    Plays the given number of headless games across a multiprocessing pool, cycling through the given gamemodes,
+    and returns (results, report).
+    Params: games (how many to play), modes (gamemodes to cycle through), seed (seed of the first game;
+        game k uses seed + k), policy_factory (picklable callable taking a seed and returning a policy),
+        processes (pool size; defaults to the CPU count, 1 plays in this process), max_ticks
+    """
+    jobs = [(modes[k % len(modes)], seed + k, policy_factory, max_ticks) for k in range(games)]
+    start = time.perf_counter()
+    if processes == 1:
+        results = [_play(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            chunksize = max(1, games // ((processes or multiprocessing.cpu_count()) * 8))
+            results = list(pool.imap_unordered(_play, jobs, chunksize))
+    return results, summarize(results, time.perf_counter() - start)
+
+
+def print_report(report):
+    """
+    Prints a batch report.
+    Params: report (from summarize or run_batch)
+    """
+    print("***********************************")
+    print(f"{report['games']} games in {report['seconds']}s ({report['games_per_sec']} games/sec)")
+    for lines, stats in report["gamemodes"].items():
+        print("***********************************")
+        print(f"{lines} Lines: {stats['games']} games, {stats['cleared']} cleared")
+        if stats["cleared"]:
+            print(f"  best time: {stats['best_time']}s, mean time: {stats['mean_time']}s")
+        print(f"  mean lines: {stats['mean_lines']}, mean pieces: {stats['mean_pieces']}")
+    print("***********************************")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play headless games of CStris and report stats.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--gamemodes", type=int, nargs="+", default=[1, 2, 3], choices=[1, 2, 3])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--max-ticks", type=int, default=FPS * 600)
+    args = parser.parse_args()
+    results, report = run_batch(args.games, args.gamemodes, args.seed, processes=args.processes, max_ticks=args.max_ticks)
+    print_report(report)
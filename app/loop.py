@@ -0,0 +1,110 @@
+#
+# this is the app/loop.py file
+#
+# ... timing helpers for the start_game loop, which runs the game on a fixed timestep (so it plays the
+# ... same at any frame rate), polls input much faster than it renders, and auto-repeats side moves
+# ... while an arrow key is held (DAS: delay before repeating, ARR: time between repeats)
+#
+
+
+# simulation ticks per second; gravity and fast fall are counted in these ticks
+SIM_FPS = 25
+
+# default frames drawn per second (0 draws as often as the loop runs)
+RENDER_FPS = 60
+
+# seconds between input polls
+POLL_INTERVAL = 0.001
+
+# default delayed auto shift and auto repeat rate, in seconds (an ARR of 0 moves straight to the wall)
+DAS = 0.17
+ARR = 0.05
+
+
+class FixedTimestep:
+    """
+    This class counts how many fixed-length simulation ticks are due at a given time.
+    Member Variables: step (seconds per tick), start, ticks (ticks handed out so far), max_steps
+    Member Functions: __init__, advance (returns the number of ticks due), next_time (when the next tick is due)
+    """
+
+    def __init__(self, step, now, max_steps=SIM_FPS):
+        """
+        Initializes the timestep with its first tick due one step after now.
+        Params: step, now (time.perf_counter()), max_steps (most ticks run at once; after a longer stall
+            the rest of the stall is skipped instead of fast-forwarding the game)
+        """
+        self.step = step
+        self.start = now
+        self.ticks = 0
+        self.max_steps = max_steps
+
+    def next_time(self):
+        """
+        Returns when the next tick is due.
+        """
+        return self.start + (self.ticks + 1) * self.step
+
+    def advance(self, now):
+        """
+        Returns the number of ticks that are due at now and marks them as run.
+        Params: now
+        """
+        due = int((now - self.start) / self.step) - self.ticks
+        if due <= 0:
+            return 0
+        if due > self.max_steps:
+            # drop the stalled time: carry on as if the last of these ticks was due just now
+            self.start = now - (self.ticks + self.max_steps) * self.step
+            due = self.max_steps
+        self.ticks += due
+        return due
+
+
+class AutoShift:
+    """
+    This class auto-repeats side moves while the left or right arrow key is held.
+    The most recently pressed direction wins while both are held.
+    Member Variables: das, arr (seconds), held (directions held, most recent last), next_move (when the next
+        repeat is due)
+    Member Functions: __init__, press, release, moves (returns the direction and number of repeats due)
+    """
+
+    def __init__(self, das=DAS, arr=ARR):
+        self.das = das
+        self.arr = arr
+        self.held = []
+        self.next_move = 0
+
+    def press(self, direction, now):
+        """
+        Starts charging the auto shift for a direction; the caller makes the first move itself.
+        Params: direction (-1 for left, 1 for right), now
+        """
+        if direction in self.held:
+            return
+        self.held.append(direction)
+        self.next_move = now + self.das
+
+    def release(self, direction, now):
+        """
+        Stops repeating a direction; if the other direction is still held it charges again from now.
+        Params: direction, now
+        """
+        if direction in self.held:
+            self.held.remove(direction)
+            self.next_move = now + self.das
+
+    def moves(self, now, limit):
+        """
+        Returns (direction, number of moves due at now), with at most limit moves.
+        Params: now, limit (e.g. the field width; moves past a wall do nothing anyway)
+        """
+        if not self.held or now < self.next_move:
+            return 0, 0
+        if self.arr <= 0:
+            self.next_move = now
+            return self.held[-1], limit
+        count = 1 + int((now - self.next_move) / self.arr)
+        self.next_move += count * self.arr
+        return self.held[-1], min(count, limit)
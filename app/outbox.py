@@ -0,0 +1,250 @@
+#
+# this is the app/outbox.py file
+#
+# ... a durable outbox for challenge emails: messages are written to a local SQLite queue right away,
+# ... and a background thread sends them to the SendGrid v3 API over one pooled HTTP session,
+# ... retrying failures with exponential backoff, so the game never waits on the network.
+# ... requests is imported the first time a message is sent, so starting the outbox adds nothing to start-up
+#
+
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SENDGRID_API_URL = "https://api.sendgrid.com"
+
+# retry schedule: BACKOFF seconds after the first failure, doubling up to MAX_BACKOFF, at most MAX_ATTEMPTS tries
+BACKOFF = 2.0
+MAX_BACKOFF = 300.0
+MAX_ATTEMPTS = 8
+
+# a message being sent is leased to one process for this many seconds; if that process dies before it
+# finishes, the message goes back to pending once the lease runs out
+LEASE = 60.0
+
+# seconds stop waits for a send in progress before leaving the thread behind
+STOP_TIMEOUT = 15.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    recipient TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    sent_at REAL,
+    lease REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt);
+"""
+
+
+def mail_payload(sender, recipients, subject, html_content, attachments=None):
+    """
+    Returns the SendGrid v3 mail/send request body for one email to one or more recipients.
+    Params: sender (email address), recipients (email address or list of them), subject, html_content,
+        attachments (dict of file name -> bytes)
+    """
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    payload = {
+        "personalizations": [{"to": [{"email": recipient} for recipient in recipients]}],
+        "from": {"email": sender},
+        "subject": subject,
+        "content": [{"type": "text/html", "value": html_content}],
+    }
+    if attachments:
+        payload["attachments"] = [{"content": base64.b64encode(content).decode("ascii"), "filename": filename,
+                                   "type": "application/octet-stream"}
+                                  for filename, content in attachments.items()]
+    return payload
+
+
+def post_mail(session, api_url, body):
+    """
+    Posts one mail/send request body and returns (error, retry): error is None on success, and retry says
+    whether the failure is worth trying again (network errors, 429 and 5xx responses).
+    Params: session (requests.Session with the Authorization header), api_url, body (JSON string)
+    """
+    import requests
+
+    try:
+        response = session.post(api_url + "/v3/mail/send", data=body, timeout=10,
+                                 headers={"Content-Type": "application/json"})
+    except requests.RequestException as err:
+        return str(err), True
+    if response.status_code < 300:
+        return None, False
+    retry = response.status_code == 429 or response.status_code >= 500
+    return f"HTTP {response.status_code}: {response.text[:200]}", retry
+
+
+class Outbox:
+    """
+    This class queues emails in a SQLite file and sends them from a background thread.
+    Member Variables: path (SQLite file), api_url, api_key, session (pooled requests.Session, made when
+        the first message is sent), backoff, max_backoff, max_attempts
+    Member Functions: __init__, enqueue, status, counts, start (starts the sender thread),
+        send_due (sends every message that is due, once), flush (waits for the queue to empty), stop
+    """
+
+    def __init__(self, path=None, api_url=None, api_key=None, backoff=BACKOFF, max_backoff=MAX_BACKOFF,
+                 max_attempts=MAX_ATTEMPTS):
+        """
+        Opens (or creates) the queue.
+        Params: path (defaults to the CSTRIS_OUTBOX env var, then outbox.sqlite3 in the repository root),
+            api_url (defaults to the SENDGRID_API_URL env var, then the real API), api_key (defaults to the
+            SENDGRID_API_KEY env var), backoff, max_backoff, max_attempts
+        """
+        self.path = path or os.getenv("CSTRIS_OUTBOX", default=os.path.join(ROOT, "outbox.sqlite3"))
+        self.api_url = (api_url or os.getenv("SENDGRID_API_URL", default=SENDGRID_API_URL)).rstrip("/")
+        self.api_key = api_key or os.getenv("SENDGRID_API_KEY", default="OOPS, please set env var called 'SENDGRID_API_KEY'")
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.session = None
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        with closing(self._connect()) as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def enqueue(self, recipient, payload):
+        """
+        Writes a message to the queue and returns its id; it is sent as soon as the sender thread gets to it.
+        Params: recipient (for status reports), payload (SendGrid v3 request body, see mail_payload)
+        """
+        now = time.time()
+        with closing(self._connect()) as db, db:
+            cursor = db.execute("INSERT INTO outbox (created, recipient, payload, next_attempt) VALUES (?, ?, ?, ?)",
+                                (now, recipient, json.dumps(payload), now))
+        self.wake.set()
+        return cursor.lastrowid
+
+    def status(self, message_id):
+        """
+        Returns a dict with the status ('pending', 'sent' or 'failed'), attempts and last_error of a message.
+        Params: message_id (from enqueue)
+        """
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT status, attempts, last_error FROM outbox WHERE id = ?", (message_id,)).fetchone()
+        if row is None:
+            return None
+        # a message another process is sending still counts as pending until it comes back
+        status = "pending" if row[0] == "sending" else row[0]
+        return {"status": status, "attempts": row[1], "last_error": row[2]}
+
+    def counts(self):
+        """
+        Returns how many messages are pending, sent and failed.
+        """
+        counts = {"pending": 0, "sent": 0, "failed": 0}
+        with closing(self._connect()) as db:
+            for status, count in db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"):
+                counts["pending" if status == "sending" else status] += count
+        return counts
+
+    def send_due(self):
+        """
+        Tries once to send every pending message that is due, and returns when the next one will be due
+        (or None if nothing is pending). Each message is leased before it is posted, so outboxes in several
+        processes sharing one file never send the same message twice.
+        """
+        with closing(self._connect()) as db:
+            with db:
+                db.execute("UPDATE outbox SET status = 'pending', lease = NULL WHERE status = 'sending' AND lease < ?",
+                           (time.time(),))
+            due = db.execute("SELECT id, payload, attempts FROM outbox WHERE status = 'pending' AND next_attempt <= ? "
+                             "ORDER BY next_attempt", (time.time(),)).fetchall()
+            for message_id, payload, attempts in due:
+                if self.stopping.is_set():
+                    break
+                with db:
+                    claimed = db.execute("UPDATE outbox SET status = 'sending', lease = ? "
+                                         "WHERE id = ? AND status = 'pending'",
+                                         (time.time() + LEASE, message_id)).rowcount
+                if not claimed:
+                    continue
+                error, retry = self._post(payload)
+                attempts += 1
+                with db:
+                    if error is None:
+                        db.execute("UPDATE outbox SET status = 'sent', attempts = ?, sent_at = ?, last_error = NULL, "
+                                   "lease = NULL WHERE id = ?", (attempts, time.time(), message_id))
+                    elif retry and attempts < self.max_attempts:
+                        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+                        db.execute("UPDATE outbox SET status = 'pending', attempts = ?, next_attempt = ?, "
+                                   "last_error = ?, lease = NULL WHERE id = ?",
+                                   (attempts, time.time() + delay, error, message_id))
+                    else:
+                        db.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, lease = NULL "
+                                   "WHERE id = ?", (attempts, error, message_id))
+            # messages leased elsewhere are looked at again when their lease runs out
+            row = db.execute("SELECT MIN(CASE status WHEN 'pending' THEN next_attempt ELSE lease END) FROM outbox "
+                             "WHERE status IN ('pending', 'sending')").fetchone()
+        return row[0]
+
+    def _post(self, payload):
+        """
+        Sends one request body and returns (error, retry), see post_mail.
+        """
+        if self.session is None:
+            import requests
+
+            self.session = requests.Session()
+            self.session.headers["Authorization"] = "Bearer " + self.api_key
+        return post_mail(self.session, self.api_url, payload)
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wake.clear()
+            next_attempt = self.send_due()
+            timeout = None if next_attempt is None else max(0, next_attempt - time.time())
+            self.wake.wait(timeout)
+
+    def start(self):
+        """
+        Starts the background sender thread (a daemon, so it never keeps the program open).
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="cstris-outbox", daemon=True)
+            self.thread.start()
+        return self
+
+    def flush(self, timeout):
+        """
+        Waits up to timeout seconds for every pending message to be sent or to fail, and returns the counts.
+        Params: timeout
+        """
+        deadline = time.time() + timeout
+        while self.counts()["pending"] and time.time() < deadline:
+            self.wake.set()
+            time.sleep(0.05)
+        return self.counts()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """
+        Stops the sender thread; pending messages stay queued for next time. Waits at most timeout seconds for
+        a send in progress (a message it is still sending goes back to pending once its lease runs out).
+        Params: timeout
+        """
+        self.stopping.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        if self.session is not None:
+            self.session.close()
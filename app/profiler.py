@@ -0,0 +1,182 @@
+#
+# this is the app/profiler.py file
+#
+# ... opt-in frame-time instrumentation for start_game: times every phase of a frame (and the Tetris
+# ... methods on the hot path), keeps rolling p50/p95/p99 for an on-screen overlay, counts frames that
+# ... missed the frame budget, and writes every frame to a JSON-lines or CSV file at game end
+#
+
+
+import csv
+import json
+import time
+from collections import deque
+
+# phases of a start_game frame, then the Tetris methods timed inside them
+PHASES = ["events", "gravity", "draw", "flip", "intersects", "break_lines"]
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile (nearest rank) of some values, or 0 when there are none.
+    Params: values, p (0-100)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class _Phase:
+    """
+    Context manager that adds the time spent inside it to one phase of the current frame.
+    """
+
+    __slots__ = ("current", "name", "start")
+
+    def __init__(self, current, name):
+        self.current = current
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.current[self.name] += time.perf_counter() - self.start
+
+
+class FrameProfiler:
+    """
+    This class collects frame timings for one game.
+    Member Variables: fps, budget (ms per frame at fps), window (rolling ms of each phase over the last
+        frames), frames (every finished frame, for the export), dropped (frames missed against the budget)
+    Member Functions: __init__, phase (times a block of code), instrument (times Tetris methods),
+        end_frame, stats, overlay (HUD lines), export (writes the frames to a file)
+    """
+
+    enabled = True
+
+    def __init__(self, fps, window=250):
+        """
+        Initializes an empty profile.
+        Params: fps (the target frame rate), window (frames kept for the rolling percentiles)
+        """
+        self.fps = fps
+        self.budget = 1000 / fps
+        self.window = {name: deque(maxlen=window) for name in PHASES + ["work", "tick"]}
+        self.frames = []
+        self.dropped = 0
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.phases = {name: _Phase(self.current, name) for name in PHASES}
+
+    def phase(self, name):
+        """
+        Returns a context manager that times the code inside it as part of a phase of this frame.
+        Params: name (one of PHASES)
+        """
+        return self.phases[name]
+
+    def instrument(self, game, names=("intersects", "break_lines")):
+        """
+        Times Tetris methods by shadowing them on one game with timed versions.
+        Params: game, names (methods to time; each is also the name of its phase)
+        """
+        for name in names:
+            method = getattr(game, name)
+            setattr(game, name, self._timed(method, name))
+
+    def _timed(self, method, name):
+        current = self.current
+
+        def timed(*args):
+            start = time.perf_counter()
+            result = method(*args)
+            current[name] += time.perf_counter() - start
+            return result
+        return timed
+
+    def end_frame(self, tick_ms, work_ms):
+        """
+        Records the finished frame and starts the next one.
+        Params: tick_ms (ms since the previous frame, including time spent waiting),
+            work_ms (ms of that frame not spent waiting)
+        """
+        record = {name: round(seconds * 1000, 3) for name, seconds in self.current.items()}
+        record["work"] = work_ms
+        record["tick"] = tick_ms
+        missed = max(0, round(tick_ms / self.budget) - 1)
+        record["dropped"] = missed
+        self.dropped += missed
+        self.frames.append(record)
+        for name, window in self.window.items():
+            window.append(record[name])
+        for name in self.current:
+            self.current[name] = 0.0
+
+    def stats(self):
+        """
+        Returns the rolling p50, p95 and p99 (in ms) of every phase, keyed by phase name.
+        """
+        return {name: {p: percentile(values, p) for p in (50, 95, 99)} for name, values in self.window.items()}
+
+    def overlay(self):
+        """
+        Returns the lines of text for the on-screen overlay.
+        """
+        lines = ["ms p50/p95/p99"]
+        for name, stats in self.stats().items():
+            lines.append(f"{name[:6]} {stats[50]:.1f}/{stats[95]:.1f}/{stats[99]:.1f}")
+        lines.append(f"dropped {self.dropped}")
+        return lines
+
+    def export(self, path):
+        """
+        Writes every frame to a file: CSV if the path ends in .csv, otherwise JSON lines followed by
+        one summary line.
+        Params: path
+        """
+        columns = PHASES + ["work", "tick", "dropped"]
+        with open(path, "w", newline="") as file:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(file, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.frames)
+            else:
+                for record in self.frames:
+                    file.write(json.dumps(record) + "\n")
+                summary = {"frames": len(self.frames), "dropped": self.dropped, "fps": self.fps, "stats": self.stats()}
+                file.write(json.dumps({"summary": summary}) + "\n")
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NoProfiler:
+    """
+    Stand-in for FrameProfiler when profiling is off; every method does nothing.
+    """
+
+    enabled = False
+    _phase = _NoPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def instrument(self, game, names=()):
+        pass
+
+    def end_frame(self, tick_ms, work_ms):
+        pass
+
+    def overlay(self):
+        return []
+
+    def export(self, path):
+        pass
@@ -0,0 +1,424 @@
+#
+# this is the app/render.py file
+#
+# ... draws a Tetris game for start_game, redrawing only what changed since the last frame:
+# ... the empty grid is drawn once onto a background surface, blocks are pre-rendered tiles,
+# ... fonts and text surfaces are cached, and only the changed rectangles are sent to the display.
+# ... On a board bigger than the screen only a viewport of it is drawn, scrolling to follow the figure.
+# ... ScaledRenderer draws the same layout at any window size: the board's color indices are written
+# ... into a one-pixel-per-cell surface with surfarray and scaled up with one blit, so a frame costs
+# ... about the same few calls at 720p as at 4K.
+#
+
+
+from functools import lru_cache
+
+import numpy as np
+import pygame
+
+from app.engine import colors, Figure
+
+# Define some colors
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+GRAY = (128, 128, 128)
+
+# a cell covered by the figure shows field value + FIGURE * figure color in Renderer.shown,
+# and an empty cell under the ghost piece shows GHOST + figure color
+FIGURE = len(colors)
+GHOST = FIGURE * FIGURE
+
+# the viewport scrolls when the figure comes this close (in cells) to its edge
+MARGIN = 4
+
+# the window size the layout (game.x, game.y, game.zoom and HUD positions) is given in
+SIZE = (400, 500)
+
+# ScaledRenderer's palette: field colors (empty cells white), the figure at FIGURE + color and the ghost
+# piece at GHOST_INDEX + color, as a pale tint of the figure's color
+GHOST_INDEX = 2 * FIGURE
+PALETTE = [WHITE] + colors[1:] + [WHITE] + colors[1:] + \
+    [WHITE] + [tuple(255 - (255 - c) * 2 // 5 for c in color) for color in colors[1:]]
+PALETTE += [BLACK] * (256 - len(PALETTE))
+
+
+@lru_cache(maxsize=None)
+def get_font(size, name="Calibri", bold=True, italic=False):
+    """
+    Returns a pygame font, looking it up only the first time (SysFont lookups are slow).
+    Params: size, name, bold, italic
+    """
+    return pygame.font.SysFont(name, size, bold, italic)
+
+
+@lru_cache(maxsize=256)
+def render_text(text, size=25, color=BLACK):
+    """
+    Returns a surface with the text rendered on it, rendering each (text, size, color) only once.
+    Params: text, size (font size), color
+    """
+    return get_font(size).render(text, True, color)
+
+
+class Renderer:
+    """
+    This class draws a Tetris game onto the screen, one frame at a time, redrawing only what changed.
+    Member Variables: screen, background (white screen with the empty grid), tiles, figure_tiles and
+        ghost_tiles (a block of every color), ghost (whether to show where the figure will land),
+        shown (what each cell showed last frame), slots (text shown last frame in each HUD slot, with
+        its rect), dirty (rects changed this frame), height and width (rows and columns drawn), top and
+        left (board row and column in the top left corner of the viewport)
+    Member Functions: __init__, invalidate (redraw everything next frame), scroll (move the viewport to
+        the figure and where it lands), draw (draw one frame), flip (update the changed parts of the display)
+    """
+
+    def __init__(self, screen, game, ghost=True, rows=None, cols=None, clear=True):
+        """
+        Pre-draws the background and block tiles for a game.
+        Params: screen, game (Tetris being drawn; its height, width, x, y and zoom set the layout),
+            ghost (outline the cells the figure will land in), rows and cols (size of the viewport;
+            defaults to the whole board), clear (fill the whole screen with the background when redrawing
+            everything; False only redraws the board's own area, for a second board on the same screen)
+        """
+        self.screen = screen
+        self.ghost = ghost
+        self.clear = clear
+        self.height = min(rows or game.height, game.height)
+        self.width = min(cols or game.width, game.width)
+        self.top = 0
+        self.left = 0
+        self.x = game.x
+        self.y = game.y
+        self.zoom = zoom = game.zoom
+
+        self.background = pygame.Surface(screen.get_size())
+        self.background.fill(WHITE)
+        for i in range(self.height):
+            for j in range(self.width):
+                pygame.draw.rect(self.background, GRAY, self.cell_rect(i, j), 1)
+
+        self.tiles = []
+        self.figure_tiles = []
+        self.ghost_tiles = []
+        for color in colors:
+            tile = pygame.Surface((zoom - 2, zoom - 1))
+            tile.fill(color)
+            self.tiles.append(tile)
+            tile = pygame.Surface((zoom - 2, zoom - 2))
+            tile.fill(color)
+            self.figure_tiles.append(tile)
+            tile = pygame.Surface((zoom - 2, zoom - 2))
+            tile.fill(WHITE)
+            pygame.draw.rect(tile, color, tile.get_rect(), 2)
+            self.ghost_tiles.append(tile)
+
+        self.slots = {}
+        self.dirty = []
+        self.invalidate()
+
+    def cell_rect(self, i, j):
+        """
+        Returns the screen rect of the cell in row i, column j.
+        Params: i, j
+        """
+        return pygame.Rect(self.x + self.zoom * j, self.y + self.zoom * i, self.zoom, self.zoom)
+
+    def invalidate(self):
+        """
+        Makes the next frame redraw the whole screen.
+        """
+        self.shown = None
+
+    def scroll(self, game):
+        """
+        Moves the viewport as little as possible to keep the figure and the row it will land in (with MARGIN
+        cells around them) in view; when they are too far apart to both fit, it shows where the figure lands.
+        Params: game
+        """
+        figure = game.figure
+        if figure is None:
+            return
+        min_dx, min_dy, max_dx, max_dy = Figure.boxes[figure.type][figure.rotation]
+        margin = min(MARGIN, (self.height - 4) // 2)
+        y = landing = figure.y
+        if game.state == "start":
+            landing = game.drop_row()
+            if landing + max_dy - (y + min_dy) + 1 + 2 * margin > self.height:
+                y = landing
+        top = min(self.top, y + min_dy - margin)
+        top = max(top, landing + max_dy + 1 + margin - self.height)
+        self.top = max(0, min(game.height - self.height, top))
+        margin = min(MARGIN, (self.width - 4) // 2)
+        left = min(self.left, figure.x + min_dx - margin)
+        left = max(left, figure.x + max_dx + 1 + margin - self.width)
+        self.left = max(0, min(game.width - self.width, left))
+
+    def draw(self, game, texts):
+        """
+        Draws one frame onto the screen surface; call flip to show it.
+        Params: game, texts (dict of HUD slot name -> (text, position, font size, color), or None to clear
+            the slot; slots are drawn in order, so later slots go on top)
+        """
+        screen = self.screen
+        dirty = self.dirty
+
+        if self.shown is None:
+            if self.clear:
+                area = screen.get_rect()
+            else:
+                area = pygame.Rect(self.x, self.y, self.zoom * self.width, self.zoom * self.height)
+            screen.blit(self.background, area, area)
+            dirty.append(area)
+            self.shown = [[-1] * self.width for i in range(self.height)]
+            self.slots = {}
+
+        # erase text that changed or went away; blocks under it are redrawn below
+        forced = set()
+        for slot, (old, rect) in list(self.slots.items()):
+            if texts.get(slot) != old:
+                screen.blit(self.background, rect, rect)
+                dirty.append(rect)
+                forced.update(self.cells_under(rect))
+                del self.slots[slot]
+
+        # blocks that changed since last frame, in viewport rows and columns
+        self.scroll(game)
+        top = self.top
+        left = self.left
+        field = game.field
+        current = [list(field[top + i][left:left + self.width]) for i in range(self.height)]
+        if game.figure is not None:
+            figure = game.figure
+            x = figure.x - left
+            y = figure.y - top
+            for j, i in figure.cells():
+                if 0 <= i + y < self.height and 0 <= j + x < self.width:
+                    current[i + y][j + x] += FIGURE * figure.color
+            if self.ghost and game.state == "start":
+                # the column tops give the landing row without stepping the figure down
+                ghost_y = game.drop_row() - top
+                for j, i in figure.cells():
+                    if 0 <= i + ghost_y < self.height and 0 <= j + x < self.width and \
+                            current[i + ghost_y][j + x] == 0:
+                        current[i + ghost_y][j + x] = GHOST + figure.color
+        changed = []
+        for i in range(self.height):
+            if current[i] != self.shown[i]:
+                row = current[i]
+                shown = self.shown[i]
+                for j in range(self.width):
+                    if row[j] != shown[j]:
+                        changed.append((i, j))
+                self.shown[i] = row
+        changed.extend(forced.difference(changed))
+
+        for i, j in changed:
+            rect = self.cell_rect(i, j)
+            screen.blit(self.background, rect, rect)
+            if current[i][j] >= GHOST:
+                screen.blit(self.ghost_tiles[current[i][j] - GHOST], (rect.x + 1, rect.y + 1))
+                dirty.append(rect)
+                continue
+            figure_color, value = divmod(current[i][j], FIGURE)
+            if value > 0:
+                screen.blit(self.tiles[value], (rect.x + 1, rect.y + 1))
+            if figure_color > 0:
+                screen.blit(self.figure_tiles[figure_color], (rect.x + 1, rect.y + 1))
+            dirty.append(rect)
+
+        # draw new text, and text whose blocks were just redrawn over it
+        for slot, value in texts.items():
+            if value is None:
+                continue
+            text, position, size, color = value
+            if slot in self.slots and self.slots[slot][1].collidelist(dirty) == -1:
+                continue
+            surface = render_text(text, size, color)
+            rect = screen.blit(surface, position)
+            self.slots[slot] = (value, rect)
+            dirty.append(rect)
+
+    def flip(self):
+        """
+        Updates only the parts of the display that were drawn since the last flip.
+        """
+        pygame.display.update(self.dirty)
+        self.dirty = []
+
+    def cells_under(self, rect):
+        """
+        Returns the (i, j) of every cell that overlaps a screen rect.
+        Params: rect
+        """
+        first_i = max(0, (rect.top - self.y) // self.zoom)
+        last_i = min(self.height - 1, (rect.bottom - 1 - self.y) // self.zoom)
+        first_j = max(0, (rect.left - self.x) // self.zoom)
+        last_j = min(self.width - 1, (rect.right - 1 - self.x) // self.zoom)
+        return [(i, j) for i in range(first_i, last_i + 1) for j in range(first_j, last_j + 1)]
+
+
+class ScaledRenderer(Renderer):
+    """
+    This class draws a game like Renderer, scaled to fit any window (resizable or fullscreen) and centered.
+    The viewport's color indices are kept in a one-pixel-per-cell 8-bit surface, written with surfarray.
+    A frame where many cells changed scales it to the board's size on screen with one blit and lays the
+    grid over it; a frame where a few changed copies just those cells from a tile atlas pre-scaled to the
+    cell size. Either way a frame is a handful of calls whatever the window size.
+    Member Variables: the viewport ones of Renderer (height, width, top, left), screen, ghost, clear,
+        x, y, zoom (layout in SIZE coordinates), scale and offset (from layout to window pixels), cell
+        (cell size in pixels), board_rect (board on screen), cells (8-bit surface, one pixel per cell),
+        scaled (cells scaled to board_rect), grid (cell lines drawn over it), board (the board as shown),
+        atlas and areas (a tile of every color index with its lines, and where each one is), shown (color
+        indices last drawn), slots, dirty
+    Member Functions: __init__, resize (lays out for a new window size), to_screen, indices, draw, and
+        Renderer's scroll, invalidate, flip
+    """
+
+    def __init__(self, screen, game, ghost=True, rows=None, cols=None, clear=True):
+        """
+        Params: as for Renderer; the game's x, y and zoom are in SIZE coordinates
+        """
+        self.ghost = ghost
+        self.clear = clear
+        self.height = min(rows or game.height, game.height)
+        self.width = min(cols or game.width, game.width)
+        self.top = 0
+        self.left = 0
+        self.x = game.x
+        self.y = game.y
+        self.zoom = game.zoom
+        self.cells = pygame.Surface((self.width, self.height), depth=8)
+        self.cells.set_palette(PALETTE)
+        self.dirty = []
+        self.resize(screen)
+
+    def resize(self, screen):
+        """
+        Lays the game out for the screen's current size and redraws everything next frame.
+        Params: screen (display surface, after a resize or a switch to fullscreen)
+        """
+        self.screen = screen
+        width, height = screen.get_size()
+        self.scale = min(width / SIZE[0], height / SIZE[1])
+        self.offset = ((width - SIZE[0] * self.scale) / 2, (height - SIZE[1] * self.scale) / 2)
+        self.cell = cell = max(2, round(self.zoom * self.scale))
+        self.board_rect = pygame.Rect(self.to_screen((self.x, self.y)), (cell * self.width, cell * self.height))
+        self.scaled = pygame.Surface(self.board_rect.size, depth=8)
+        self.scaled.set_palette(PALETTE)
+        self.board = pygame.Surface(self.board_rect.size)
+
+        # the same outline around every cell as Renderer's grid
+        self.grid = pygame.Surface(self.board_rect.size)
+        self.grid.fill(WHITE)
+        self.grid.set_colorkey(WHITE)
+        for i in range(self.height):
+            for j in range(self.width):
+                pygame.draw.rect(self.grid, GRAY, (cell * j, cell * i, cell, cell), 1)
+
+        # one tile per color index, scaled up from a row of one-pixel cells the same way as the board
+        count = GHOST_INDEX + FIGURE
+        strip = pygame.Surface((count, 1), depth=8)
+        strip.set_palette(PALETTE)
+        pixels = pygame.surfarray.pixels2d(strip)
+        pixels[:, 0] = np.arange(count)
+        del pixels
+        self.atlas = pygame.Surface((count * cell, cell))
+        self.atlas.blit(pygame.transform.scale(strip, (count * cell, cell)), (0, 0))
+        self.areas = [pygame.Rect(cell * value, 0, cell, cell) for value in range(count)]
+        for area in self.areas:
+            pygame.draw.rect(self.atlas, GRAY, area, 1)
+        self.invalidate()
+
+    def to_screen(self, position):
+        """
+        Returns where a point of the SIZE layout is in the window.
+        Params: position
+        """
+        return (round(self.offset[0] + position[0] * self.scale), round(self.offset[1] + position[1] * self.scale))
+
+    def indices(self, game):
+        """
+        Returns the viewport's color indices (see PALETTE) as a (rows, columns) array, with the figure and
+        ghost piece drawn in.
+        Params: game
+        """
+        top = self.top
+        left = self.left
+        width = self.width
+        field = game.field
+        data = b"".join(bytes(field[top + i][left:left + width]) for i in range(self.height))
+        indices = np.frombuffer(data, dtype=np.uint8).reshape(self.height, width).copy()
+        figure = game.figure
+        if figure is None:
+            return indices
+        cells = [(i, j) for j, i in figure.cells()]
+        x = figure.x - left
+        if self.ghost and game.state == "start":
+            ghost_y = game.drop_row() - top
+            for i, j in cells:
+                if 0 <= i + ghost_y < self.height and 0 <= j + x < width and indices[i + ghost_y, j + x] == 0:
+                    indices[i + ghost_y, j + x] = GHOST_INDEX + figure.color
+        y = figure.y - top
+        for i, j in cells:
+            if 0 <= i + y < self.height and 0 <= j + x < width:
+                indices[i + y, j + x] = FIGURE + figure.color
+        return indices
+
+    def draw(self, game, texts):
+        """
+        Draws one frame onto the screen surface; call flip to show it.
+        Params: game, texts (as for Renderer.draw; positions and font sizes are in SIZE coordinates)
+        """
+        screen = self.screen
+        dirty = self.dirty
+        board_rect = self.board_rect
+        if self.shown is None:
+            area = screen.get_rect() if self.clear else board_rect
+            screen.fill(WHITE, area)
+            dirty.append(area)
+            self.slots = {}
+
+        # erase text that changed or went away, putting back the part of the board under it
+        for slot, (old, rect) in list(self.slots.items()):
+            if texts.get(slot) != old:
+                screen.fill(WHITE, rect)
+                if self.shown is not None and rect.colliderect(board_rect):
+                    clip = rect.clip(board_rect)
+                    screen.blit(self.board, clip, clip.move(-board_rect.x, -board_rect.y))
+                dirty.append(rect)
+                del self.slots[slot]
+
+        self.scroll(game)
+        indices = self.indices(game)
+        changed = None if self.shown is None else np.argwhere(indices != self.shown)
+        if changed is None or len(changed) > self.width * self.height // 8:
+            pixels = pygame.surfarray.pixels2d(self.cells)
+            pixels[...] = indices.T
+            del pixels
+            pygame.transform.scale(self.cells, board_rect.size, self.scaled)
+            self.board.blit(self.scaled, (0, 0))
+            self.board.blit(self.grid, (0, 0))
+            screen.blit(self.board, board_rect)
+            dirty.append(board_rect)
+        elif len(changed):
+            cell = self.cell
+            atlas = self.atlas
+            areas = self.areas
+            tiles = [(atlas, (cell * j, cell * i), areas[indices[i, j]]) for i, j in changed.tolist()]
+            self.board.blits(tiles, doreturn=False)
+            for source, (x, y), area in tiles:
+                rect = screen.blit(source, (board_rect.x + x, board_rect.y + y), area)
+                dirty.append(rect)
+        self.shown = indices
+
+        # draw new text, and text that was just drawn over
+        for slot, value in texts.items():
+            if value is None:
+                continue
+            text, position, size, color = value
+            if slot in self.slots and self.slots[slot][1].collidelist(dirty) == -1:
+                continue
+            surface = render_text(text, max(1, round(size * self.scale)), color)
+            rect = screen.blit(surface, self.to_screen(position))
+            self.slots[slot] = (value, rect)
+            dirty.append(rect)
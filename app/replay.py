@@ -0,0 +1,307 @@
+#
+# this is the app/replay.py file
+#
+# ... records games as compact append-only binary files: the seed of the piece stream, every input
+# ... with the tick it applies to, and a keyframe of the whole game every few pieces. A Replay
+# ... memory-maps a file and jumps to any tick by restoring the nearest keyframe before it and
+# ... re-simulating only the inputs after that keyframe.
+#
+# usage: python -m app.replay run.replay --tick 500
+#
+# layout (little-endian):
+#   header: magic "CSRP", version, gamemode, seed (8 bytes), keyframe every N pieces (2 bytes), height and
+#       width (4 bytes each)
+#   then records, each starting with its kind:
+#     "I" input: tick (4 bytes), action (1 byte, index into ACTIONS)
+#     "K" keyframe: tick, pieces, lines_left, counter (in half ticks), pressing_down, state, figure type,
+#         rotation, x and y (signed, 4 bytes each), then the piece stream's random state (625 x 4 bytes)
+#         and the field (height x width)
+#     "E" end: tick, final time (seconds, 8-byte float; NaN if the game was closed before it ended)
+#   inputs with tick t are applied after t ticks have run, before tick t + 1's gravity
+#
+
+
+import argparse
+import hashlib
+import mmap
+import random
+import struct
+from bisect import bisect_right
+
+from app.engine import gamemodes
+from app.headless import ACTIONS, FPS, HeadlessGame
+
+MAGIC = b"CSRP"
+VERSION = 2
+HEADER = struct.Struct("<4sBBQHII")
+INPUT = struct.Struct("<cIB")
+KEYFRAME = struct.Struct("<cIIiIBBBBii")
+RNG_STATE = struct.Struct("<625I")
+END = struct.Struct("<cId")
+
+# write a keyframe every this many pieces
+KEYFRAME_EVERY = 10
+
+STATES = ("start", "gameover")
+NO_FIGURE = 255
+
+
+class Recorder:
+    """
+    This class writes one game to a replay file as it is played.
+    Member Variables: file, every (pieces between keyframes), next_keyframe (piece count that triggers
+        the next keyframe), finished
+    Member Functions: __init__ (writes the header), input, tick (writes a keyframe when one is due),
+        keyframe, finish (writes the end record and closes the file), close
+    """
+
+    def __init__(self, path, gamemode, seed, height=20, width=10, every=KEYFRAME_EVERY):
+        """
+        Creates the replay file and writes its header.
+        Params: path, gamemode (1, 2 or 3), seed (of the game's random.Random piece stream),
+            height, width (of the field), every (pieces between keyframes)
+        """
+        self.file = open(path, "wb")
+        self.every = every
+        self.next_keyframe = every
+        self.finished = False
+        self.file.write(HEADER.pack(MAGIC, VERSION, gamemode, seed, every, height, width))
+
+    def input(self, tick, action):
+        """
+        Records one input; inputs after the end of the game are left out.
+        Params: tick (ticks run before the input), action (one of ACTIONS)
+        """
+        if self.finished:
+            return
+        self.file.write(INPUT.pack(b"I", tick, ACTIONS.index(action)))
+        if action == "reset":
+            self.next_keyframe = self.every
+
+    def tick(self, tick, game, counter, pressing_down):
+        """
+        Call after every tick; writes a keyframe once every few pieces.
+        Params: tick (ticks run so far), game (Tetris), counter (gravity counter), pressing_down
+        """
+        if game.pieces >= self.next_keyframe and not self.finished:
+            self.keyframe(tick, game, counter, pressing_down)
+            self.next_keyframe = game.pieces + self.every
+
+    def keyframe(self, tick, game, counter, pressing_down):
+        """
+        Records the whole state of the game after some number of ticks.
+        Params: tick, game, counter, pressing_down
+        """
+        figure = game.figure
+        if figure is None:
+            placement = (NO_FIGURE, 0, 0, 0)
+        else:
+            placement = (figure.type, figure.rotation, figure.x, figure.y)
+        self.file.write(KEYFRAME.pack(b"K", tick, game.pieces, game.lines_left, int(counter * 2), pressing_down,
+                                      STATES.index(game.state), *placement))
+        self.file.write(RNG_STATE.pack(*game.rng.getstate()[1]))
+        self.file.write(bytes(cell for row in game.field for cell in row))
+        self.file.flush()
+
+    def finish(self, tick, final_time):
+        """
+        Records the end of the game and closes the file.
+        Params: tick, final_time (seconds)
+        """
+        if not self.finished:
+            self.file.write(END.pack(b"E", tick, final_time))
+            self.finished = True
+        self.file.close()
+
+    def close(self, tick=None):
+        """
+        Closes the file; with a tick, a game that has not finished records that it was stopped there.
+        Params: tick
+        """
+        if tick is not None:
+            self.finish(tick, float("nan"))
+        self.file.close()
+
+
+class NoRecorder:
+    """
+    Stand-in for Recorder when recording is off; every method does nothing.
+    """
+
+    def input(self, tick, action):
+        pass
+
+    def tick(self, tick, game, counter, pressing_down):
+        pass
+
+    def finish(self, tick, final_time):
+        pass
+
+    def close(self, tick=None):
+        pass
+
+
+class ReplayPolicy:
+    """
+    Input policy that plays back the inputs of a replay.
+    Member Variable: inputs (dict of tick -> list of actions)
+    """
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+
+    def __call__(self, game, tick):
+        return self.inputs.get(tick, ())
+
+
+class Replay:
+    """
+    This class reads a replay file through a memory map.
+    Member Variables: gamemode, seed, every, height, width, inputs (dict of tick -> list of actions),
+        keyframes (list of (tick, offset)), ticks (ticks needed to play every recorded input),
+        final_time (None if the game was not finished)
+    Member Functions: __init__ (indexes the file), seek (returns the game at a tick), digest, close
+    """
+
+    def __init__(self, path):
+        """
+        Opens a replay file and indexes its inputs and keyframes. A file cut short (e.g. by a crash)
+        is read up to its last whole record.
+        Params: path
+        """
+        self.file = open(path, "rb")
+        try:
+            self.data = data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError("not a CStris replay: " + path)
+        if len(data) < HEADER.size or data[:4] != MAGIC or data[4] != VERSION:
+            self.close()
+            raise ValueError("not a CStris replay: " + path)
+        magic, version, self.gamemode, self.seed, self.every, self.height, self.width = HEADER.unpack_from(data)
+
+        self.inputs = {}
+        self.keyframes = []
+        self.ticks = 0
+        self.final_time = None
+        keyframe_size = KEYFRAME.size + RNG_STATE.size + self.height * self.width
+        offset = HEADER.size
+        while offset < len(data):
+            kind = data[offset:offset + 1]
+            if kind == b"I" and offset + INPUT.size <= len(data):
+                kind, tick, action = INPUT.unpack_from(data, offset)
+                self.inputs.setdefault(tick, []).append(ACTIONS[action])
+                offset += INPUT.size
+                tick += 1
+            elif kind == b"K" and offset + keyframe_size <= len(data):
+                tick = KEYFRAME.unpack_from(data, offset)[1]
+                self.keyframes.append((tick, offset))
+                offset += keyframe_size
+            elif kind == b"E" and offset + END.size <= len(data):
+                kind, tick, final_time = END.unpack_from(data, offset)
+                if final_time == final_time:
+                    self.final_time = final_time
+                offset += END.size
+            else:
+                break
+            self.ticks = max(self.ticks, tick)
+        self.keyframe_ticks = [tick for tick, offset in self.keyframes]
+
+    def seek(self, tick):
+        """
+        Returns a HeadlessGame as it was after the given number of ticks, before that tick's inputs;
+        stepping it plays the rest of the replay.
+        Params: tick
+        """
+        policy = ReplayPolicy(self.inputs)
+        game = HeadlessGame(self.gamemode, self.seed, policy, height=self.height, width=self.width)
+        k = bisect_right(self.keyframe_ticks, tick) - 1
+        if k >= 0:
+            self._restore(game, self.keyframes[k][1])
+        while game.tick < tick:
+            game.step()
+        return game
+
+    def digest(self):
+        """
+        Returns an 8-byte digest of the inputs in tick order, which a challenge code can carry to name this run.
+        """
+        inputs = b"".join(INPUT.pack(b"I", tick, ACTIONS.index(action))
+                          for tick in sorted(self.inputs) for action in self.inputs[tick])
+        return hashlib.blake2b(inputs, digest_size=8).digest()
+
+    def _restore(self, headless, offset):
+        (kind, headless.tick, pieces, lines_left, counter, pressing_down, state, figure_type, rotation, x,
+         y) = KEYFRAME.unpack_from(self.data, offset)
+        headless.counter = counter / 2
+        headless.pressing_down = bool(pressing_down)
+
+        game = headless.game
+        game.pieces = pieces
+        game.lines_left = lines_left
+        game.state = STATES[state]
+        if figure_type == NO_FIGURE:
+            game.figure = None
+        else:
+            figure = game.figure
+            figure.type = figure_type
+            figure.color = figure_type + 1
+            figure.rotation = rotation
+            figure.x = x
+            figure.y = y
+
+        offset += KEYFRAME.size
+        game.rng.setstate((3, RNG_STATE.unpack_from(self.data, offset), None))
+        offset += RNG_STATE.size
+        colors = self.data[offset:offset + self.height * self.width]
+        if hasattr(game.field, "load"):
+            game.field.load(colors)
+        else:
+            game.field = [list(colors[i * self.width:(i + 1) * self.width]) for i in range(self.height)]
+        game.tops = game.column_tops()
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def record(headless, path, max_ticks=FPS * 600, every=KEYFRAME_EVERY):
+    """
+    Plays a HeadlessGame to the end (or max_ticks), recording it to a replay file, and returns its result.
+    Params: headless (HeadlessGame with a seeded piece stream, as it is created), path, max_ticks, every
+    """
+    game = headless.game
+    recorder = Recorder(path, headless.gamemode, headless.seed, game.height, game.width, every)
+    policy = headless.policy
+
+    def recording(game, tick):
+        actions = policy(game, tick)
+        for action in actions:
+            recorder.input(tick, action)
+        return actions
+
+    headless.policy = recording
+    try:
+        while game.state == "start" and headless.tick < max_ticks:
+            headless.step()
+            recorder.tick(headless.tick, game, headless.counter, headless.pressing_down)
+    finally:
+        headless.policy = policy
+        recorder.finish(headless.tick, headless.tick / FPS)
+    return headless.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show a CStris replay at some tick.")
+    parser.add_argument("path")
+    parser.add_argument("--tick", type=int, default=None, help="defaults to the end of the replay")
+    args = parser.parse_args()
+    replay = Replay(args.path)
+    tick = replay.ticks if args.tick is None else args.tick
+    game = replay.seek(tick).game
+    print(f"{gamemodes[replay.gamemode - 1]} lines, seed {replay.seed}, {replay.ticks} ticks, "
+          f"{len(replay.keyframes)} keyframes, final time {replay.final_time}")
+    print(f"tick {tick}: {game.lines_left} lines left, {game.pieces} pieces, {game.state}")
+    for row in game.field:
+        print("".join("#" if cell else "." for cell in row))
+    replay.close()
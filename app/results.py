@@ -0,0 +1,257 @@
+#
+# this is the app/results.py file
+#
+# ... a local store of every run, for personal bests and leaderboards: runs go into a SQLite table
+# ... indexed by (gamemode, time) and (player, gamemode, time), and a per-gamemode histogram of cleared
+# ... times (updated once per batch of inserts) answers percentile queries without touching the runs themselves.
+# ... Runs and decoded challenge codes are inserted in batches, one transaction per batch.
+#
+# usage: python -m app.results --ingest codes.txt
+#        python -m app.results --top 10 --gamemode 3
+#
+
+
+import argparse
+import os
+import sqlite3
+import time
+from contextlib import closing
+from collections import Counter
+from itertools import islice
+
+from app.engine import gamemodes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# a run is 'local' (played here) or 'challenge' (a time from someone else's challenge code)
+LOCAL = "local"
+CHALLENGE = "challenge"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    gamemode INTEGER NOT NULL,
+    time REAL NOT NULL,
+    cleared INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    pieces INTEGER,
+    played REAL NOT NULL,
+    source TEXT NOT NULL DEFAULT 'local',
+    code TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS runs_leaderboard ON runs (gamemode, time) WHERE cleared = 1;
+CREATE INDEX IF NOT EXISTS runs_player ON runs (player, gamemode, time) WHERE cleared = 1;
+
+-- how many cleared runs of each gamemode took each number of centiseconds
+CREATE TABLE IF NOT EXISTS times (
+    gamemode INTEGER NOT NULL,
+    centiseconds INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (gamemode, centiseconds)
+) WITHOUT ROWID;
+"""
+
+COLUMNS = ("player", "gamemode", "time", "cleared", "lines", "pieces", "played", "source")
+INSERT = f"INSERT INTO runs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+# a challenge code is only recorded once, however many times it is accepted
+INSERT_CODE = (f"INSERT INTO runs ({', '.join(COLUMNS)}, code) VALUES ({', '.join('?' * (len(COLUMNS) + 1))}) "
+               "ON CONFLICT (code) DO NOTHING")
+COUNT_TIMES = ("INSERT INTO times VALUES (?, ?, ?) "
+               "ON CONFLICT (gamemode, centiseconds) DO UPDATE SET count = count + excluded.count")
+
+
+class Results:
+    """
+    This class keeps every run in a SQLite file and answers leaderboard queries.
+    Member Variables: path (SQLite file), db (open connection)
+    Member Functions: __init__, add_run, add_runs (one transaction for many runs), ingest_codes (adds the
+        valid codes from codes.decode_bulk), personal_best, top, percentile, time_at_percentile,
+        count, frame (runs as a pandas DataFrame), close
+    """
+
+    def __init__(self, path=None):
+        """
+        Opens (or creates) the store.
+        Params: path (defaults to the CSTRIS_RESULTS env var, then results.sqlite3 in the repository root)
+        """
+        self.path = path or os.getenv("CSTRIS_RESULTS", default=os.path.join(ROOT, "results.sqlite3"))
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def add_run(self, player, gamemode, final_time, lines, pieces=None, played=None, source=LOCAL, code=None):
+        """
+        Records one run and returns its id, or None if a run with the same challenge code is already recorded.
+        Params: player, gamemode (1, 2 or 3), final_time (seconds), lines (lines cleared), pieces,
+            played (unix time; defaults to now), source (LOCAL or CHALLENGE), code (the challenge code the
+            run came from)
+        """
+        row = (player, gamemode, final_time, lines >= gamemodes[gamemode - 1], lines, pieces,
+               time.time() if played is None else played, source)
+        with self.db:
+            if code is None:
+                cursor = self.db.execute(INSERT, row)
+            else:
+                cursor = self.db.execute(INSERT_CODE, row + (code,))
+                if not cursor.rowcount:
+                    return None
+            self._count_times([row])
+        return cursor.lastrowid
+
+    def add_runs(self, runs, batch=50000):
+        """
+        Records many runs, committing once per batch instead of once per run, and returns how many were added.
+        Params: runs (iterable of dicts with player, gamemode, time and lines, and optionally pieces,
+            played and source), batch (runs per transaction)
+        """
+        now = time.time()
+        rows = ((run["player"], run["gamemode"], run["time"], run["lines"] >= gamemodes[run["gamemode"] - 1],
+                 run["lines"], run.get("pieces"), run.get("played", now), run.get("source", LOCAL)) for run in runs)
+        return self._insert(rows, batch)
+
+    def _insert(self, rows, batch, insert=INSERT):
+        added = 0
+        while True:
+            chunk = list(islice(rows, batch))
+            if not chunk:
+                return added
+            with self.db:
+                if insert is INSERT:
+                    self.db.executemany(INSERT, chunk)
+                    inserted = chunk
+                else:
+                    # rows whose code is already recorded are skipped, so read back the ones that went in
+                    last = self.db.execute("SELECT IFNULL(MAX(id), 0) FROM runs").fetchone()[0]
+                    self.db.executemany(insert, chunk)
+                    inserted = self.db.execute("SELECT player, gamemode, time, cleared FROM runs WHERE id > ?",
+                                               (last,)).fetchall()
+                self._count_times(inserted)
+            added += len(inserted)
+
+    def _count_times(self, rows):
+        # add cleared runs to the histogram, one upsert per distinct time rather than per run
+        counts = Counter((row[1], round(row[2] * 100)) for row in rows if row[3])
+        self.db.executemany(COUNT_TIMES, [(gamemode, centiseconds, count)
+                                          for (gamemode, centiseconds), count in counts.items()])
+
+    def ingest_codes(self, decoded, played=None, batch=50000):
+        """
+        Records the valid codes decoded by codes.decode_bulk as challenge runs (a code is only made for a
+        cleared game), and returns how many were added. Codes that are already recorded are skipped.
+        Params: decoded (dict of arrays from codes.decode_bulk or codes.decode_file), played (unix time), batch
+        """
+        played = time.time() if played is None else played
+        valid = decoded["valid"]
+        rows = ((name, int(gamemode), float(final_time), True, gamemodes[gamemode - 1], None, played, CHALLENGE, code)
+                for name, gamemode, final_time, code in zip(decoded["name"][valid], decoded["gamemode"][valid],
+                                                            decoded["time"][valid], decoded["code"][valid]))
+        return self._insert(rows, batch, INSERT_CODE)
+
+    def personal_best(self, player, gamemode):
+        """
+        Returns a player's best cleared time in a gamemode, or None.
+        Params: player, gamemode
+        """
+        row = self.db.execute("SELECT MIN(time) FROM runs WHERE player = ? AND gamemode = ? AND cleared = 1",
+                              (player, gamemode)).fetchone()
+        return row[0]
+
+    def top(self, gamemode, n=10, best_per_player=False):
+        """
+        Returns the n fastest cleared runs of a gamemode as (player, time, played) tuples, fastest first.
+        Params: gamemode, n, best_per_player (only each player's best run)
+        """
+        if not best_per_player:
+            return self.db.execute("SELECT player, time, played FROM runs WHERE gamemode = ? AND cleared = 1 "
+                                   "ORDER BY time LIMIT ?", (gamemode, n)).fetchall()
+        # walk the leaderboard index in time order until n different players have been seen
+        top = []
+        seen = set()
+        cursor = self.db.execute("SELECT player, time, played FROM runs WHERE gamemode = ? AND cleared = 1 "
+                                 "ORDER BY time", (gamemode,))
+        for player, final_time, played in cursor:
+            if player not in seen:
+                seen.add(player)
+                top.append((player, final_time, played))
+                if len(top) == n:
+                    break
+        cursor.close()
+        return top
+
+    def count(self, gamemode):
+        """
+        Returns how many cleared runs a gamemode has.
+        Params: gamemode
+        """
+        row = self.db.execute("SELECT SUM(count) FROM times WHERE gamemode = ?", (gamemode,)).fetchone()
+        return row[0] or 0
+
+    def percentile(self, gamemode, final_time):
+        """
+        Returns the percentage of cleared runs of a gamemode that were faster than a time (0 is the best).
+        Params: gamemode, final_time (seconds)
+        """
+        total = self.count(gamemode)
+        if not total:
+            return 0.0
+        row = self.db.execute("SELECT SUM(count) FROM times WHERE gamemode = ? AND centiseconds < ?",
+                              (gamemode, round(final_time * 100))).fetchone()
+        return 100 * (row[0] or 0) / total
+
+    def time_at_percentile(self, gamemode, p):
+        """
+        Returns the time that p percent of the cleared runs of a gamemode beat (nearest rank), or None.
+        Params: gamemode, p (0-100)
+        """
+        total = self.count(gamemode)
+        if not total:
+            return None
+        rank = min(total, max(1, int(round(p / 100 * total))))
+        row = self.db.execute("SELECT centiseconds FROM (SELECT centiseconds, SUM(count) OVER (ORDER BY centiseconds) "
+                              "AS running FROM times WHERE gamemode = ?) WHERE running >= ? LIMIT 1",
+                              (gamemode, rank)).fetchone()
+        return row[0] / 100
+
+    def frame(self, gamemode=None):
+        """
+        Returns the runs (of one gamemode, or all of them) as a pandas DataFrame, for analysis.
+        Params: gamemode
+        """
+        import pandas as pd
+
+        query = f"SELECT {', '.join(COLUMNS)} FROM runs"
+        params = ()
+        if gamemode is not None:
+            query += " WHERE gamemode = ?"
+            params = (gamemode,)
+        return pd.read_sql_query(query, self.db, params=params)
+
+    def close(self):
+        self.db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load challenge codes into the results store and show leaderboards.")
+    parser.add_argument("--path", default=None)
+    parser.add_argument("--ingest", metavar="FILE", help="file with one challenge code per line")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--gamemode", type=int, choices=[1, 2, 3], default=None)
+    args = parser.parse_args()
+
+    with closing(Results(args.path)) as results:
+        if args.ingest:
+            from app import codes
+
+            start = time.perf_counter()
+            key = os.getenv("CSTRIS_CODE_KEY")
+            added = results.ingest_codes(codes.decode_file(args.ingest, key.encode("utf-8") if key else None))
+            print(f"added {added} runs in {time.perf_counter() - start:.2f}s")
+        for gamemode in [args.gamemode] if args.gamemode else [1, 2, 3]:
+            print("***********************************")
+            print(f"{gamemodes[gamemode - 1]} Lines: {results.count(gamemode)} runs, "
+                  f"median {results.time_at_percentile(gamemode, 50)}s")
+            for rank, (player, final_time, played) in enumerate(results.top(gamemode, args.top), 1):
+                print(f"{rank:>4}. {player:<20} {final_time:.2f}s")
+        print("***********************************")
@@ -0,0 +1,378 @@
+#
+# this is the app/server.py file
+#
+# ... hosts many games at once in one asyncio event loop, for live head-to-head challenges instead of
+# ... the email round trip. Clients connect over TCP, join a room (players in the same room get the same
+# ... piece seed and see each other's games) and send inputs; every tick the server steps every game and
+# ... sends each room only what changed: the field cells that changed, the figure and the lines left.
+#
+# usage: python -m app.server --port 7777
+#
+# messages (little-endian), each starting with its kind:
+#   client -> server
+#     "J" join: gamemode, room name length, room name (UTF-8); must come first
+#     "I" input: action (index into ACTIONS, not "reset"), applied on the next tick
+#     "S" stats request
+#   server -> client
+#     "W" welcome: session id (4 bytes), seed (8 bytes), gamemode, field height, field width
+#     "D" delta: session id, tick, lines left (2 bytes), state (0 playing, 1 game over), figure type,
+#         rotation, x, y, number of changed cells (2 bytes), then (cell index (2 bytes), color) per cell
+#     "S" stats: sessions, ticks, mean and p99 tick time (ms, 4-byte floats), late ticks, CPU seconds
+#   a joining player is first sent every other game in the room as a delta from an empty field
+#
+
+
+import argparse
+import asyncio
+import random
+import struct
+import time
+from collections import deque
+
+from app.headless import ACTIONS, FPS, HeadlessGame
+from app.loop import FixedTimestep
+from app.profiler import percentile
+
+PORT = 7777
+
+JOIN = struct.Struct("<cBB")
+INPUT = struct.Struct("<cB")
+WELCOME = struct.Struct("<cIQBBB")
+DELTA = struct.Struct("<cIIhBBBbbH")
+CELL = struct.Struct("<HB")
+STATS = struct.Struct("<cIIffIf")
+
+STATES = ("start", "gameover")
+
+# clients may send the gameplay keys only: a reset would restart their game with 1 line left to clear
+NETWORK_ACTIONS = ACTIONS[:ACTIONS.index("reset")]
+
+# per-session limits, so a flood of input or a client that stops reading cannot grow the server
+MAX_INPUTS = 32
+MAX_READ_BUFFER = 1024
+MAX_WRITE_BUFFER = 64 * 1024
+
+
+class Room:
+    """
+    Players who see each other's games; they all play the same piece seed.
+    Member Variables: name, seed, sessions
+    """
+
+    __slots__ = ("name", "seed", "sessions")
+
+    def __init__(self, name, seed):
+        self.name = name
+        self.seed = seed
+        self.sessions = []
+
+
+class Session:
+    """
+    This class is one player's game on the server.
+    Member Variables: id, connection, room, headless (HeadlessGame being played), inputs (queued actions),
+        shown (field colors as last sent), last (lines left, state and figure as last sent)
+    Member Functions: __init__, take_inputs (the HeadlessGame policy), tick (steps the game and returns
+        the delta to send, or None), full_delta (the whole game as a delta from an empty field)
+    """
+
+    __slots__ = ("id", "connection", "room", "headless", "inputs", "shown", "last")
+
+    def __init__(self, session_id, connection, room, gamemode):
+        self.id = session_id
+        self.connection = connection
+        self.room = room
+        self.headless = HeadlessGame(gamemode, room.seed, self.take_inputs)
+        self.inputs = deque(maxlen=MAX_INPUTS)
+        game = self.headless.game
+        self.shown = bytearray(game.height * game.width)
+        self.last = None
+
+    def take_inputs(self, game, tick):
+        if not self.inputs:
+            return ()
+        actions = list(self.inputs)
+        self.inputs.clear()
+        return actions
+
+    def _header(self):
+        game = self.headless.game
+        figure = game.figure
+        return (game.lines_left, STATES.index(game.state), figure.type, figure.rotation, figure.x, figure.y)
+
+    def tick(self):
+        """
+        Steps the game one tick (if it is still going) and returns the delta message, or None if nothing changed.
+        """
+        headless = self.headless
+        if headless.game.state == "start":
+            headless.step()
+        header = self._header()
+        colors = headless.game.field.colors
+        if header == self.last and colors == self.shown:
+            return None
+        self.last = header
+        cells = b""
+        count = 0
+        if colors != self.shown:
+            shown = self.shown
+            changed = [k for k in range(len(colors)) if colors[k] != shown[k]]
+            cells = b"".join(CELL.pack(k, colors[k]) for k in changed)
+            count = len(changed)
+            shown[:] = colors
+        return DELTA.pack(b"D", self.id, headless.tick, *header, count) + cells
+
+    def full_delta(self):
+        """
+        Returns the whole game as a delta from an empty field, for a player who joins the room later.
+        """
+        colors = self.shown
+        filled = [k for k in range(len(colors)) if colors[k]]
+        cells = b"".join(CELL.pack(k, colors[k]) for k in filled)
+        return DELTA.pack(b"D", self.id, self.headless.tick, *self._header(), len(filled)) + cells
+
+
+class Connection(asyncio.Protocol):
+    """
+    One client's TCP connection: parses its messages and writes what the server sends it.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+        self.session = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        if self.session is not None:
+            self.server.leave(self.session)
+            self.session = None
+
+    def send(self, data):
+        """
+        Writes a message; a client that has stopped reading (too much unsent data) is disconnected.
+        Params: data
+        """
+        if self.transport.is_closing():
+            return
+        if self.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.transport.abort()
+            return
+        self.transport.write(data)
+
+    def data_received(self, data):
+        buffer = self.buffer
+        buffer += data
+        if len(buffer) > MAX_READ_BUFFER:
+            self.transport.abort()
+            return
+        while buffer:
+            kind = buffer[:1]
+            if kind == b"I" and len(buffer) >= INPUT.size:
+                action = buffer[1]
+                del buffer[:INPUT.size]
+                if self.session is not None and action < len(NETWORK_ACTIONS):
+                    self.session.inputs.append(NETWORK_ACTIONS[action])
+            elif kind == b"J" and len(buffer) >= JOIN.size and len(buffer) >= JOIN.size + buffer[2]:
+                kind, gamemode, length = JOIN.unpack_from(buffer)
+                room = bytes(buffer[JOIN.size:JOIN.size + length]).decode("utf-8", "replace")
+                del buffer[:JOIN.size + length]
+                if self.session is None and gamemode in (1, 2, 3):
+                    self.session = self.server.join(self, gamemode, room)
+            elif kind == b"S":
+                del buffer[:1]
+                self.send(self.server.stats())
+            elif kind in (b"I", b"J"):
+                # wait for the rest of the message
+                return
+            else:
+                self.transport.abort()
+                return
+
+
+class GameServer:
+    """
+    This class runs every session on one fixed timestep in the event loop.
+    Member Variables: fps, sessions (session id -> Session), rooms (room name -> Room), ticks,
+        tick_times (ms of the last few ticks), late (ticks that ran behind schedule)
+    Member Functions: __init__, serve (starts listening and ticking), join, leave, tick, stats
+    """
+
+    def __init__(self, fps=FPS, seed=None):
+        """
+        Initializes an empty server.
+        Params: fps (ticks per second), seed (seeds the rooms' piece seeds, for tests)
+        """
+        self.fps = fps
+        self.rng = random.Random(seed)
+        self.sessions = {}
+        self.rooms = {}
+        self.next_id = 1
+        self.ticks = 0
+        self.tick_times = deque(maxlen=250)
+        self.late = 0
+        self.start_cpu = time.process_time()
+
+    async def serve(self, host="127.0.0.1", port=PORT):
+        """
+        Starts listening and ticking, and returns the asyncio server (its sockets give the port).
+        Params: host, port (0 picks a free port)
+        """
+        loop = asyncio.get_running_loop()
+        listener = await loop.create_server(lambda: Connection(self), host, port)
+        self.ticker = loop.create_task(self.run())
+        return listener
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stepper = FixedTimestep(1 / self.fps, loop.time())
+        while True:
+            await asyncio.sleep(max(0, stepper.next_time() - loop.time()))
+            due = stepper.advance(loop.time())
+            if due > 1:
+                self.late += due - 1
+            for tick in range(due):
+                self.tick()
+
+    def join(self, connection, gamemode, room_name):
+        """
+        Starts a session for a connection in a room (a new room, with a new seed, if there is no such room;
+        an empty name always makes a new one) and sends it the welcome and the other games in the room.
+        Params: connection, gamemode, room_name
+        """
+        room = self.rooms.get(room_name) if room_name else None
+        if room is None:
+            room = Room(room_name, self.rng.randrange(2 ** 63))
+            if room_name:
+                self.rooms[room_name] = room
+        session = Session(self.next_id, connection, room, gamemode)
+        self.next_id += 1
+        self.sessions[session.id] = session
+        game = session.headless.game
+        connection.send(WELCOME.pack(b"W", session.id, room.seed, gamemode, game.height, game.width))
+        for other in room.sessions:
+            connection.send(other.full_delta())
+        room.sessions.append(session)
+        return session
+
+    def leave(self, session):
+        """
+        Ends a session; its room is closed when the last player leaves.
+        Params: session
+        """
+        self.sessions.pop(session.id, None)
+        room = session.room
+        room.sessions.remove(session)
+        if not room.sessions and self.rooms.get(room.name) is room:
+            del self.rooms[room.name]
+
+    def tick(self):
+        """
+        Steps every session one tick and sends each room the deltas of its games.
+        """
+        start = time.perf_counter()
+        for session in list(self.sessions.values()):
+            delta = session.tick()
+            if delta is not None:
+                for player in session.room.sessions:
+                    player.connection.send(delta)
+        self.ticks += 1
+        self.tick_times.append((time.perf_counter() - start) * 1000)
+
+    def stats(self):
+        """
+        Returns the stats message: sessions, ticks, mean and p99 tick time, late ticks and CPU seconds used.
+        """
+        times = list(self.tick_times)
+        mean = sum(times) / len(times) if times else 0.0
+        return STATS.pack(b"S", len(self.sessions), self.ticks, mean, percentile(times, 99), self.late,
+                          time.process_time() - self.start_cpu)
+
+
+class RemoteGame:
+    """
+    A client's copy of one game in its room, kept up to date from deltas.
+    Member Variables: session_id, colors (field colors, row by row), width, lines_left, state, figure
+        ((type, rotation, x, y)), tick
+    Member Functions: __init__, apply (applies a delta), row (colors of a row)
+    """
+
+    def __init__(self, session_id, height, width):
+        self.session_id = session_id
+        self.width = width
+        self.colors = bytearray(height * width)
+        self.lines_left = 0
+        self.state = "start"
+        self.figure = None
+        self.tick = 0
+
+    def apply(self, delta):
+        """
+        Applies a decoded delta (see read_message).
+        Params: delta
+        """
+        kind, session_id, self.tick, self.lines_left, state, figure_type, rotation, x, y, cells = delta
+        self.state = STATES[state]
+        self.figure = (figure_type, rotation, x, y)
+        for index, color in cells:
+            self.colors[index] = color
+
+    def row(self, i):
+        return self.colors[i * self.width:(i + 1) * self.width]
+
+
+async def read_message(reader):
+    """
+    Reads one message from the server and returns it as a tuple starting with its kind ("W", "D" or "S");
+    a delta's last item is its list of (cell index, color).
+    Params: reader (asyncio.StreamReader)
+    """
+    kind = await reader.readexactly(1)
+    if kind == b"W":
+        return ("W",) + WELCOME.unpack(kind + await reader.readexactly(WELCOME.size - 1))[1:]
+    if kind == b"S":
+        return ("S",) + STATS.unpack(kind + await reader.readexactly(STATS.size - 1))[1:]
+    if kind == b"D":
+        header = DELTA.unpack(kind + await reader.readexactly(DELTA.size - 1))
+        data = await reader.readexactly(header[-1] * CELL.size)
+        return ("D",) + header[1:-1] + (list(CELL.iter_unpack(data)),)
+    raise ValueError("unknown message from server: " + repr(kind))
+
+
+def join_message(gamemode, room=""):
+    """
+    Returns the join message for a gamemode and room.
+    Params: gamemode, room
+    """
+    name = room.encode("utf-8")
+    return JOIN.pack(b"J", gamemode, len(name)) + name
+
+
+def input_message(action):
+    """
+    Returns the input message for one of ACTIONS.
+    Params: action
+    """
+    return INPUT.pack(b"I", ACTIONS.index(action))
+
+
+async def main(host, port):
+    server = GameServer()
+    listener = await server.serve(host, port)
+    print("listening on {}:{}".format(*listener.sockets[0].getsockname()[:2]), flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host live CStris games.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
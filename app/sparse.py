@@ -0,0 +1,180 @@
+#
+# this is the app/sparse.py file
+#
+# ... a playfield for very large boards (thousands of rows, hundreds of columns): only the occupied rows
+# ... are stored, as a stack from the floor up (a bitmask and a bytearray of colors per row), and every
+# ... empty row above the stack is the same shared row of zeros. Clearing a line deletes it from the stack,
+# ... so the rows above it move down without being copied. Memory and the cost of a move grow with the
+# ... height of the stack, not the size of the board.
+#
+
+
+class SparseField:
+    """
+    This class holds the playfield as a stack of occupied rows, floor first, with the same interface as
+    BitboardField (so BitboardTetris's collides/lock/clear_lines calls work on it).
+    Member Variables: height, width, full (bitmask of a complete row), bits (row bitmasks, floor first),
+        cells (row colors, floor first; bits[k] and cells[k] are row height - 1 - k), empty (the shared
+        row of zeros returned for every row above the stack), tops (row of the highest block in each
+        column, height if it is empty)
+    Member Functions: __init__ (initializes an empty field), __getitem__ (returns a row of colors so
+        field[i][j] works like the list field), collides, lock, clear_lines, load, find_tops, occupied
+    """
+
+    __slots__ = ("height", "width", "full", "bits", "cells", "empty", "tops")
+
+    def __init__(self, height, width):
+        """
+        Initializes an empty field.
+        Params: self, height, width
+        """
+        self.height = height
+        self.width = width
+        self.full = (1 << width) - 1
+        self.bits = []
+        self.cells = []
+        self.empty = bytes(width)
+        self.tops = [height] * width
+
+    def __getitem__(self, i):
+        k = self.height - 1 - i
+        if k < len(self.cells):
+            return self.cells[k]
+        return self.empty
+
+    def __len__(self):
+        return self.height
+
+    def __iter__(self):
+        for i in range(self.height):
+            yield self[i]
+
+    def occupied(self):
+        """
+        Returns how many rows are stored (the height of the stack, counting empty rows inside it).
+        """
+        return len(self.bits)
+
+    def collides(self, shape, x, y):
+        """
+        Returns whether a figure shape placed at (x, y) leaves the field or overlaps a filled block.
+        Params: shape (tuple of (dy, bits) pairs from shape_rows), x, y
+        """
+        stack = self.bits
+        for dy, bits in shape:
+            k = self.height - 1 - y - dy
+            if k < 0:
+                return True
+            if x >= 0:
+                bits <<= x
+                if bits > self.full:
+                    return True
+            else:
+                if bits & ((1 << -x) - 1):
+                    return True
+                bits >>= -x
+            if k < len(stack) and stack[k] & bits:
+                return True
+        return False
+
+    def lock(self, shape, x, y, color):
+        """
+        Writes a figure shape into the field at (x, y) with the given color, growing the stack if needed.
+        Params: shape (tuple of (dy, bits) pairs from shape_rows), x, y, color
+        """
+        stack = self.bits
+        cells = self.cells
+        tops = self.tops
+        for dy, bits in shape:
+            i = y + dy
+            k = self.height - 1 - i
+            while len(stack) <= k:
+                stack.append(0)
+                cells.append(bytearray(self.width))
+            bits = bits << x if x >= 0 else bits >> -x
+            stack[k] |= bits
+            row = cells[k]
+            while bits:
+                low = bits & -bits
+                j = low.bit_length() - 1
+                row[j] = color
+                if i < tops[j]:
+                    tops[j] = i
+                bits ^= low
+
+    def clear_lines(self):
+        """
+        Deletes completed lines and returns how many were deleted.
+        Follows the same rules as Tetris.break_lines: row 0 is never checked, and rows 1 through i - 1
+        move down one row when row i is cleared (so row 1 keeps its blocks, and a full row 1 is counted
+        but stays).
+        """
+        stack = self.bits
+        cells = self.cells
+        full = self.full
+        height = self.height
+
+        # full rows from the top down, the order break_lines clears them in; row 0 (k = height - 1) is skipped
+        found = []
+        k = -1
+        while True:
+            try:
+                k = stack.index(full, k + 1, height - 1)
+            except ValueError:
+                break
+            found.append(k)
+        if not found:
+            return 0
+
+        for k in reversed(found):
+            if k == height - 2:
+                continue
+            reaches_row_1 = len(stack) >= height - 1
+            del stack[k]
+            del cells[k]
+            if reaches_row_1:
+                # row 1 is copied down instead of moving, so it is still there above the copy
+                stack.insert(height - 2, stack[height - 3])
+                cells.insert(height - 2, bytearray(cells[height - 3]))
+
+        # drop empty rows left on top of the stack
+        while stack and not stack[-1]:
+            stack.pop()
+            cells.pop()
+        self.find_tops()
+        return len(found)
+
+    def load(self, colors):
+        """
+        Replaces the whole field with the given block colors, e.g. from a saved copy of colors.
+        Params: colors (height * width color indices, row by row)
+        """
+        width = self.width
+        self.bits = []
+        self.cells = []
+        for i in range(self.height - 1, -1, -1):
+            row = bytearray(colors[i * width:(i + 1) * width])
+            self.bits.append(sum(1 << j for j in range(width) if row[j]))
+            self.cells.append(row)
+        while self.bits and not self.bits[-1]:
+            self.bits.pop()
+            self.cells.pop()
+        self.find_tops()
+
+    def find_tops(self):
+        """
+        Recomputes tops from the top of the stack down, stopping once every column has a block.
+        """
+        tops = self.tops
+        tops[:] = [self.height] * self.width
+        seen = 0
+        for k in range(len(self.bits) - 1, -1, -1):
+            bits = self.bits[k]
+            new = bits & ~seen
+            while new:
+                low = new & -new
+                tops[low.bit_length() - 1] = self.height - 1 - k
+                new ^= low
+            seen |= bits
+            if seen == self.full:
+                break
@@ -0,0 +1,141 @@
+#
+# this is the app/vector.py file
+#
+# ... a batched environment that holds N boards as one (N, height, width) NumPy array of color indices
+# ... and places one figure on every board per step, using the same figures as Figure.figures and the
+# ... same rules as Tetris.go_space and Tetris.break_lines, with vectorized ops instead of Python loops
+#
+
+
+import numpy as np
+
+from app.engine import gamemodes, Figure
+
+
+def _tables():
+    """
+    Builds the figure tables used by VectorTetris, indexed [type, rotation] with rotation 0-3
+    (figures with fewer than 4 rotations repeat, like Figure.rotateLeft wrapping around).
+    Returns: dx and dy of the 4 blocks (each shape (7, 4, 4)), and the min and max dx (each shape (7, 4))
+    """
+    types = len(Figure.figures)
+    dx = np.zeros((types, 4, 4), dtype=np.int64)
+    dy = np.zeros((types, 4, 4), dtype=np.int64)
+    min_dx = np.zeros((types, 4), dtype=np.int64)
+    max_dx = np.zeros((types, 4), dtype=np.int64)
+    for t, rotations in enumerate(Figure.offsets):
+        for r in range(4):
+            cells = rotations[r % len(rotations)]
+            dx[t, r] = [cell[0] for cell in cells]
+            dy[t, r] = [cell[1] for cell in cells]
+            box = Figure.boxes[t][r % len(rotations)]
+            min_dx[t, r] = box[0]
+            max_dx[t, r] = box[2]
+    return dx, dy, min_dx, max_dx
+
+
+class VectorTetris:
+    """
+    This class holds N games of CStris and plays one figure on each of them per step.
+    An action is a (rotation, x) placement: the figure is rotated from its spawn rotation, moved to x
+    (clamped so it stays inside the field) and dropped like Tetris.go_space. Placements are assumed to be
+    reachable by sliding at spawn height; a placement that is blocked there tops the board out.
+    Member Variables: boards ((N, height, width) uint8 color indices), types (current figure type of each
+        board), lines_left, done (boards whose game is over), rng (numpy Generator for the piece stream),
+        spawn_x (column new figures appear at)
+    Member Functions: __init__, reset (starts new games on some or all boards), step (places one figure per board)
+    """
+
+    dx, dy, min_dx, max_dx = _tables()
+
+    def __init__(self, n, gamemode=1, seed=None, height=20, width=10):
+        """
+        Initializes n empty boards.
+        Params: n (number of boards), gamemode (1, 2 or 3), seed (seeds the piece stream), height, width
+        """
+        self.n = n
+        self.height = height
+        self.width = width
+        # Tetris.new_figure puts every new figure in the middle of the top row (x=3, y=0 on a 10 wide board)
+        self.spawn_x = width // 2 - 2
+        self.lines_target = gamemodes[gamemode - 1]
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros((n, height, width), dtype=np.uint8)
+        self.types = np.zeros(n, dtype=np.int64)
+        self.lines_left = np.zeros(n, dtype=np.int64)
+        self.done = np.zeros(n, dtype=bool)
+        self._rows = np.arange(n)
+        self.reset()
+
+    def reset(self, mask=None):
+        """
+        Starts new games on the boards selected by mask (all boards by default) and returns the boards.
+        Params: mask (boolean array of shape (N,), e.g. the done flags from step)
+        """
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        self.boards[mask] = 0
+        self.lines_left[mask] = self.lines_target
+        self.done[mask] = False
+        self.types[mask] = self.rng.integers(0, len(Figure.figures), int(mask.sum()))
+        return self.boards
+
+    def step(self, actions):
+        """
+        Places the current figure of every board that is still playing, clears completed lines and
+        spawns the next figures.
+        Params: actions (int array of shape (N, 2) holding the (rotation, x) placement for every board)
+        Returns: boards, lines (lines cleared on each board this step), done
+        """
+        actions = np.asarray(actions)
+        live = ~self.done
+        rows = self._rows
+        boards = self.boards
+        height = self.height
+
+        rotations = actions[:, 0] % 4
+        types = self.types
+        x = np.clip(actions[:, 1], -self.min_dx[types, rotations], self.width - 1 - self.max_dx[types, rotations])
+        dx = self.dx[types, rotations]
+        dy = self.dy[types, rotations]
+        columns = x[:, None] + dx
+
+        # Tetris.go_space: the figure falls from y=0, so each block stops just above the first filled cell
+        # at or below where it starts in its column (blocks left in row 0 can overhang empty rows)
+        below = boards[rows[:, None], :, columns] != 0
+        below &= np.arange(height)[None, None, :] >= dy[:, :, None]
+        stops = np.where(below.any(axis=2), below.argmax(axis=2), height)
+        y = (stops - dy - 1).min(axis=1)
+
+        # a placement that does not fit at spawn height could not have been reached
+        blocked = live & (y < 0)
+        self.done |= blocked
+        placed = live & ~blocked
+
+        # Tetris.freeze
+        colors = np.broadcast_to((types + 1).astype(np.uint8)[:, None], dx.shape)
+        boards[rows[placed, None], (y[:, None] + dy)[placed], columns[placed]] = colors[placed]
+
+        # Tetris.break_lines: row 0 is never cleared; each cleared row moves rows 1 to i - 1 down one row
+        # and leaves row 1 where it was, so after k clears rows 2 to k + 1 are copies of row 1
+        full = (boards != 0).all(axis=2)
+        full[~placed] = False
+        lines = full[:, 1:].sum(axis=1)
+        cleared = full[:, 2:].sum(axis=1)
+        if cleared.any():
+            order = np.argsort(~full[:, 2:], axis=1, kind="stable") + 2
+            shifted = boards[rows[:, None], order]
+            copies = np.arange(height - 2)[None, :] < cleared[:, None]
+            boards[:, 2:] = np.where(copies[:, :, None], boards[:, 1:2], shifted)
+
+        self.lines_left -= lines
+        self.done |= placed & (self.lines_left <= 0)
+
+        # Tetris.new_figure, then game over if the new figure intersects
+        self.types[placed] = self.rng.integers(0, len(Figure.figures), int(placed.sum()))
+        spawn_rows = self.dy[self.types, 0]
+        spawn_columns = self.dx[self.types, 0] + self.spawn_x
+        topped_out = (boards[rows[:, None], spawn_rows, spawn_columns] != 0).any(axis=1)
+        self.done |= placed & topped_out
+
+        return boards, lines, self.done
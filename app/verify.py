@@ -0,0 +1,144 @@
+#
+# this is the app/verify.py file
+#
+# ... checks submitted runs before they reach a leaderboard: each run is a replay file (the piece seed
+# ... and every input), optionally with the challenge code that claims its time. The run is played
+# ... again from its seed and inputs alone (keyframes in the file are not trusted), and it only passes
+# ... if it clears every line of its gamemode no later than the time claimed, on the standard board and
+# ... without a reset. verify_batch spreads the runs across a multiprocessing pool.
+#
+# usage: python -m app.verify replays/*.replay --processes 4
+#        python -m app.verify --submissions submissions.txt (one "replay-path [code]" per line)
+#
+
+
+import argparse
+import multiprocessing
+import os
+import time
+
+from app.codes import InvalidCodeError, decode_run
+from app.engine import HEIGHT, WIDTH
+from app.headless import FPS, HeadlessGame
+from app.replay import Replay, ReplayPolicy
+
+# a claimed time may be up to one tick faster than the replay, since wall-clock time and ticks can drift apart
+TOLERANCE = 1 / FPS
+
+
+def verify_run(path, code=None, key=None):
+    """
+    Plays a replay again and checks it against its claim: the challenge code's time if a code is given
+    (which must name this run, see codes.encode), otherwise the final time in the replay file.
+    Params: path (replay file), code (challenge code claiming the run's time), key (bytes; for signed codes)
+    Returns: dict with path, valid, reason (why it is not valid, None if it is), claimed (time claimed) and
+        the replayed result (gamemode, seed, cleared, lines, pieces, ticks, time; see HeadlessGame.result)
+    """
+    report = {"path": path, "valid": False, "reason": None, "claimed": None}
+    try:
+        replay = Replay(path)
+    except (OSError, ValueError) as err:
+        report["reason"] = str(err)
+        return report
+    try:
+        report["reason"] = _check(replay, code, key, report)
+    finally:
+        replay.close()
+    report["valid"] = report["reason"] is None
+    return report
+
+
+def _check(replay, code, key, report):
+    """
+    Fills in report and returns why the run is not valid, or None if it is.
+    """
+    if (replay.height, replay.width) != (HEIGHT, WIDTH):
+        return "not played on the standard board"
+    if any("reset" in actions for actions in replay.inputs.values()):
+        return "the run was reset"
+
+    claimed = replay.final_time
+    if code is not None:
+        try:
+            gamemode, name, claimed, run = decode_run(code, key)
+        except InvalidCodeError as err:
+            return "bad code: " + str(err)
+        if run is None:
+            return "the code does not name a run"
+        if gamemode != replay.gamemode or run != (replay.seed, replay.digest()):
+            return "the code is for another run"
+    report["claimed"] = claimed
+    if claimed is None:
+        return "the run was not finished"
+
+    # the recorded end tick is at or after the tick the last line was cleared, so the run must be over by then
+    headless = HeadlessGame(replay.gamemode, replay.seed, ReplayPolicy(replay.inputs))
+    report.update(headless.run(max_ticks=replay.ticks))
+    if not report["cleared"]:
+        return f"only {report['lines']} lines were cleared"
+    if claimed < report["time"] - TOLERANCE:
+        return f"claimed {claimed}s but the run takes {report['time']}s"
+    return None
+
+
+def _verify(job):
+    return verify_run(*job)
+
+
+def verify_batch(submissions, key=None, processes=None):
+    """
+    Verifies many runs across a multiprocessing pool and returns (reports, summary).
+    Params: submissions (list of (path, code) pairs; code may be None), key (bytes; for signed codes),
+        processes (pool size; defaults to the CPU count, 1 verifies in this process)
+    Returns: reports (one per submission, in order; see verify_run), summary (runs, valid, seconds, runs_per_sec)
+    """
+    jobs = [(path, code, key) for path, code in submissions]
+    start = time.perf_counter()
+    if processes == 1:
+        reports = [_verify(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            chunksize = max(1, len(jobs) // ((processes or multiprocessing.cpu_count()) * 8))
+            reports = list(pool.imap(_verify, jobs, chunksize))
+    elapsed = time.perf_counter() - start
+    summary = {
+        "runs": len(reports),
+        "valid": sum(report["valid"] for report in reports),
+        "seconds": round(elapsed, 3),
+        "runs_per_sec": round(len(reports) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    return reports, summary
+
+
+def read_submissions(path):
+    """
+    Reads a submissions file: one replay path per line, optionally followed by whitespace and a challenge code.
+    Params: path
+    Returns: list of (path, code) pairs (code is None when there is none)
+    """
+    submissions = []
+    with open(path) as file:
+        for line in file:
+            parts = line.split()
+            if parts:
+                submissions.append((parts[0], parts[1] if len(parts) > 1 else None))
+    return submissions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that CStris runs really cleared their lines in the time claimed.")
+    parser.add_argument("paths", nargs="*", help="replay files, checked against the final time they hold")
+    parser.add_argument("--submissions", metavar="FILE", help="file with one 'replay-path [code]' per line")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    submissions = [(path, None) for path in args.paths]
+    if args.submissions:
+        submissions += read_submissions(args.submissions)
+    key = os.getenv("CSTRIS_CODE_KEY")
+    reports, summary = verify_batch(submissions, key.encode("utf-8") if key else None, args.processes)
+    for report in reports:
+        if not report["valid"]:
+            print(f"REJECTED {report['path']}: {report['reason']}")
+    print(f"{summary['valid']} of {summary['runs']} runs verified in {summary['seconds']}s "
+          f"({summary['runs_per_sec']} runs/sec)")
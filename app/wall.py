@@ -0,0 +1,296 @@
+#
+# this is the app/wall.py file
+#
+# ... a spectator wall: one window showing a grid of many games at once (CPU bots, or replays of
+# ... human games), each with a small lines-left/time HUD. Every cell is one blit from a tile atlas
+# ... shared by all boards, each board is drawn onto its own offscreen surface that is only touched
+# ... when that board changes, and only those surfaces are copied to the screen. The games run on
+# ... a fixed timestep, and a frame stops drawing boards when the next tick is due (the rest are
+# ... drawn first next frame), so the games keep time however many boards there are.
+#
+# usage: python -m app.wall --boards 64 --difficulty medium --gamemode 3
+#        python -m app.wall --replays replays/*.replay
+#
+
+
+import argparse
+import math
+import time
+
+import pygame
+
+from app.engine import colors
+from app.headless import FPS, HeadlessGame
+from app.loop import RENDER_FPS, FixedTimestep
+from app.render import BLACK, WHITE, GRAY, render_text
+
+SIZE = (1280, 720)
+# pixels between boards
+PADDING = 4
+
+
+class TileAtlas:
+    """
+    This class holds one tile per color (the empty cell first) side by side on one surface, shared by every
+    board of the same zoom, so drawing a cell is a single blit from it.
+    Member Variables: zoom, surface, areas (rect of each color's tile on the surface)
+    Member Functions: __init__, cells (returns blits for Surface.blits)
+    """
+
+    def __init__(self, zoom):
+        """
+        Draws the tiles the way Renderer draws cells: a gray grid line around the white or colored block.
+        Params: zoom (pixels per cell)
+        """
+        self.zoom = zoom
+        self.surface = pygame.Surface((zoom * len(colors), zoom))
+        self.surface.fill(WHITE)
+        self.areas = []
+        for value, color in enumerate(colors):
+            area = pygame.Rect(zoom * value, 0, zoom, zoom)
+            pygame.draw.rect(self.surface, GRAY, area, 1)
+            if value > 0:
+                self.surface.fill(color, (area.x + 1, area.y + 1, zoom - 2, zoom - 1))
+            self.areas.append(area)
+
+    def cells(self, values, width):
+        """
+        Returns (source, position, area) blits for Surface.blits, one for each changed cell.
+        Params: values (list of (k, color value) where k is the cell's index in row-major order), width (columns)
+        """
+        zoom = self.zoom
+        surface = self.surface
+        areas = self.areas
+        return [(surface, (zoom * (k % width), zoom * (k // width)), areas[value]) for k, value in values]
+
+
+def hud_size(zoom):
+    """
+    Returns the font size and height in pixels of a board's HUD (two lines of text under the board).
+    Params: zoom
+    """
+    size = max(9, int(zoom * 1.5))
+    return size, 2 * size + 2
+
+
+class BoardView:
+    """
+    This class keeps one game drawn on its own offscreen surface: the board, then the HUD under it.
+    Member Variables: player (HeadlessGame, or anything with game and tick), label, atlas, surface, key (what the
+        board last showed, to skip boards that did not change), shown (color value of every cell last drawn),
+        hud (HUD text last drawn)
+    Member Functions: __init__, update (redraws what changed and returns whether anything did), cells
+    """
+
+    def __init__(self, player, atlas, label=""):
+        """
+        Params: player, atlas (TileAtlas the cells are drawn from), label (shown in the HUD)
+        """
+        game = player.game
+        self.player = player
+        self.label = label
+        self.atlas = atlas
+        self.font_size, hud = hud_size(atlas.zoom)
+        self.surface = pygame.Surface((atlas.zoom * game.width, atlas.zoom * game.height + hud))
+        self.surface.fill(WHITE)
+        self.key = None
+        self.shown = [-1] * (game.height * game.width)
+        self.hud = None
+
+    def cells(self):
+        """
+        Returns the color value of every cell, row by row, with the figure drawn in.
+        """
+        game = self.player.game
+        cells = []
+        for row in game.field:
+            cells.extend(row)
+        figure = game.figure
+        if figure is not None and game.state == "start":
+            width = game.width
+            for j, i in figure.cells():
+                if 0 <= i + figure.y < game.height and 0 <= j + figure.x < width:
+                    cells[(i + figure.y) * width + j + figure.x] = figure.color
+        return cells
+
+    def update(self):
+        """
+        Redraws the cells and HUD text that changed since the last update.
+        Returns: whether anything was drawn
+        """
+        player = self.player
+        game = player.game
+        figure = game.figure
+        drawn = False
+
+        # the field only changes when a figure locks, so a board is unchanged while these are
+        key = (game.pieces, game.lines_left, game.state, id(game.field),
+               figure and (figure.type, figure.rotation, figure.x, figure.y))
+        if key != self.key:
+            self.key = key
+            cells = self.cells()
+            shown = self.shown
+            changed = [(k, value) for k, value in enumerate(cells) if value != shown[k]]
+            if changed:
+                self.surface.blits(self.atlas.cells(changed, game.width), doreturn=False)
+                self.shown = cells
+                drawn = True
+
+        if game.state == "start":
+            status = f"{game.lines_left} left  {player.tick / FPS:.1f}s"
+        elif game.lines_left <= 0:
+            status = f"done  {player.tick / FPS:.2f}s"
+        else:
+            status = f"out  {game.lines_left} left"
+        if status != self.hud:
+            self.hud = status
+            zoom = self.atlas.zoom
+            top = zoom * game.height
+            self.surface.fill(WHITE, (0, top, self.surface.get_width(), self.surface.get_height() - top))
+            self.surface.blit(render_text(self.label, self.font_size, BLACK), (1, top + 1))
+            self.surface.blit(render_text(status, self.font_size, BLACK), (1, top + 1 + self.font_size))
+            drawn = True
+        return drawn
+
+
+def layout(size, count, height, width):
+    """
+    Returns the biggest zoom (pixels per cell) and number of columns that fit count boards on the screen.
+    Params: size (screen width and height), count, height and width (of each board, in cells)
+    """
+    best = (1, count)
+    for columns in range(1, count + 1):
+        rows = math.ceil(count / columns)
+        zoom = (size[0] - PADDING * (columns + 1)) // (columns * width)
+        while zoom > best[0] and rows * (zoom * height + hud_size(zoom)[1]) + PADDING * (rows + 1) > size[1]:
+            zoom -= 1
+        if zoom > best[0]:
+            best = (zoom, columns)
+    return best
+
+
+class Wall:
+    """
+    This class shows many games in a grid on one screen and runs them on one fixed timestep.
+    Member Variables: screen, players, views (one BoardView per player), positions (where each view goes on
+        the screen), next_view (view the next frame starts drawing from), ticks, frames
+    Member Functions: __init__, step (runs one tick of every game), draw (copies changed boards to the
+        screen until a deadline), run (the main loop)
+    """
+
+    def __init__(self, screen, players, labels=None):
+        """
+        Lays out the boards to fill the screen and draws the empty grid.
+        Params: screen, players (HeadlessGames, all with the same board size), labels (one per player;
+            defaults to their numbers)
+        """
+        self.screen = screen
+        self.players = players
+        labels = labels or [str(number) for number in range(1, len(players) + 1)]
+        game = players[0].game
+        zoom, columns = layout(screen.get_size(), len(players), game.height, game.width)
+        atlas = TileAtlas(zoom)
+        self.views = [BoardView(player, atlas, label) for player, label in zip(players, labels)]
+        view_width, view_height = self.views[0].surface.get_size()
+        self.positions = [(PADDING + (PADDING + view_width) * (k % columns),
+                           PADDING + (PADDING + view_height) * (k // columns)) for k in range(len(players))]
+        self.next_view = 0
+        self.ticks = 0
+        self.frames = 0
+        screen.fill(GRAY)
+        pygame.display.flip()
+
+    def step(self):
+        """
+        Runs one tick of every game that is still going.
+        """
+        for player in self.players:
+            if player.game.state == "start":
+                player.step()
+        self.ticks += 1
+
+    def draw(self, deadline=None):
+        """
+        Updates the boards that changed, starting where the last frame stopped, and shows them.
+        Params: deadline (time.perf_counter() time to stop drawing at; boards not reached by then are
+            drawn first next frame)
+        Returns: how many boards were drawn
+        """
+        views = self.views
+        count = len(views)
+        dirty = []
+        for k in range(count):
+            index = (self.next_view + k) % count
+            if deadline is not None and time.perf_counter() >= deadline:
+                self.next_view = index
+                break
+            view = views[index]
+            if view.update():
+                dirty.append(self.screen.blit(view.surface, self.positions[index]))
+        pygame.display.update(dirty)
+        self.frames += 1
+        return len(dirty)
+
+    def run(self, seconds=None, render_fps=RENDER_FPS):
+        """
+        Runs the games and draws them until the window is closed (or for some seconds).
+        Params: seconds, render_fps (frames drawn per second)
+        Returns: dict with the ticks run, frames drawn and seconds taken
+        """
+        start = time.perf_counter()
+        stepper = FixedTimestep(1 / FPS, start)
+        next_frame = start
+        done = False
+        while not done:
+            now = time.perf_counter()
+            if seconds is not None and now - start >= seconds:
+                break
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    done = True
+
+            for tick in range(stepper.advance(now)):
+                self.step()
+
+            if now >= next_frame:
+                next_frame = max(next_frame + 1 / render_fps, now)
+                self.draw(deadline=stepper.next_time())
+            else:
+                wait = min(next_frame, stepper.next_time()) - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+        return {"ticks": self.ticks, "frames": self.frames, "seconds": round(time.perf_counter() - start, 3)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch many games of CStris at once.")
+    parser.add_argument("--boards", type=int, default=64)
+    parser.add_argument("--difficulty", choices=["easy", "medium", "hard"], default="medium")
+    parser.add_argument("--gamemode", type=int, choices=[1, 2, 3], default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replays", nargs="+", default=None, help="replay files to watch instead of CPU games")
+    args = parser.parse_args()
+
+    if args.replays:
+        from app.replay import Replay
+
+        players = []
+        for path in args.replays:
+            replay = Replay(path)
+            players.append(replay.seek(0))
+            replay.close()
+        labels = [path.rsplit("/", 1)[-1].rsplit(".", 1)[0] for path in args.replays]
+    else:
+        from app.cpu import CpuPolicy
+
+        players = [HeadlessGame(args.gamemode, args.seed + k, CpuPolicy(args.difficulty)) for k in range(args.boards)]
+        labels = [f"CPU {args.seed + k}" for k in range(args.boards)]
+
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode(SIZE)
+    pygame.display.set_caption("Cstris")
+    wall = Wall(screen, players, labels)
+    stats = wall.run()
+    print(f"{stats['ticks']} ticks and {stats['frames']} frames in {stats['seconds']}s")
+    pygame.quit()
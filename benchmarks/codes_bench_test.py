@@ -0,0 +1,20 @@
+import random
+
+from app import codes
+
+def test_encode(benchmark):
+    assert benchmark(codes.encode, "challenger", 63.42, 3).startswith(codes.PREFIX)
+
+def test_decode(benchmark):
+    code = codes.encode("challenger", 63.42, 3)
+    assert benchmark(codes.decode, code) == (3, "challenger", 63.42)
+
+def test_decode_signed(benchmark):
+    code = codes.encode("challenger", 63.42, 3, b"key")
+    assert benchmark(codes.decode, code, b"key") == (3, "challenger", 63.42)
+
+def test_decode_bulk(benchmark):
+    rng = random.Random(0)
+    lines = [codes.encode("player" + str(rng.randrange(1000)), rng.uniform(20, 200), rng.randint(1, 3))
+             for k in range(10000)]
+    assert benchmark(codes.decode_bulk, lines)["valid"].all()
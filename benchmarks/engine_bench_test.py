@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from app.engine import Figure, Tetris, BitboardTetris
+
+def played_game(tetris, pieces=30, seed=0):
+    """
+    Returns a game part way through: some pieces dropped at random columns, none cleared.
+    """
+    game = tetris(20, 10, 10 ** 9)
+    game.rng = random.Random(seed)
+    game.new_figure()
+    rng = random.Random(seed)
+    for piece in range(pieces):
+        for move in range(rng.randrange(5)):
+            game.go_side(rng.choice((-1, 1)))
+        game.go_space()
+        if game.state == "gameover":
+            game.__init__(20, 10, 10 ** 9)
+    return game
+
+def game_with_full_rows(tetris, lines):
+    """
+    Returns a game whose bottom rows are full (lines of them) with some blocks above, and a figure on top.
+    """
+    game = tetris(20, 10, 10 ** 9)
+    game.rng = random.Random(1)
+    game.new_figure()
+    for i in range(20 - lines, 20):
+        for j in range(10):
+            game.field[i][j] = 1 + (i + j) % 7
+    for j in range(0, 10, 2):
+        game.field[19 - lines][j] = 3
+    if hasattr(game.field, "load"):
+        game.field.load(bytes(cell for row in game.field for cell in row))
+    game.tops = game.column_tops()
+    return game
+
+@pytest.mark.parametrize("tetris", [Tetris, BitboardTetris])
+def test_intersects(benchmark, tetris):
+    game = played_game(tetris)
+    game.figure.y = 5
+    benchmark(game.intersects)
+
+@pytest.mark.parametrize("tetris", [Tetris, BitboardTetris])
+def test_freeze(benchmark, tetris):
+    game = played_game(tetris)
+    game.figure.y = game.drop_row()
+    snapshot = game.snapshot()
+    benchmark.pedantic(game.freeze, setup=lambda: (game.restore(snapshot), ((), {}))[1])
+
+@pytest.mark.parametrize("lines", [1, 2, 3, 4])
+@pytest.mark.parametrize("tetris", [Tetris, BitboardTetris])
+def test_break_lines(benchmark, tetris, lines):
+    game = game_with_full_rows(tetris, lines)
+    snapshot = game.snapshot(rng=False)
+
+    def setup():
+        game.restore(snapshot)
+        return (), {}
+
+    benchmark.pedantic(game.break_lines, setup=setup)
+    assert game.lines_left == 10 ** 9 - lines
+
+@pytest.mark.parametrize("tetris", [Tetris, BitboardTetris])
+def test_go_space(benchmark, tetris):
+    game = played_game(tetris)
+    snapshot = game.snapshot()
+
+    def setup():
+        game.restore(snapshot)
+        return (), {}
+
+    benchmark.pedantic(game.go_space, setup=setup)
+
+@pytest.mark.parametrize("rotation", ["rotateLeft", "rotateRight", "rotate180"])
+def test_figure_rotation(benchmark, rotation):
+    figure = Figure(3, 0, random.Random(5))
+    benchmark(getattr(figure, rotation))
+
+def test_snapshot_restore(benchmark):
+    game = played_game(BitboardTetris)
+    snapshot = game.snapshot(rng=False)
+    benchmark(game.restore, snapshot)
@@ -0,0 +1,273 @@
+#
+# this is the benchmarks/harness.py file
+#
+# ... a small pytest-benchmark style harness: benchmark tests take a `benchmark` fixture and call
+# ... benchmark(function, *args) or benchmark.pedantic(function, setup=...). In a normal test run each
+# ... function just runs once; with --benchmark it is timed, the timings are compared with the stored
+# ... baselines, and a benchmark that got slower than its baseline by more than the threshold fails.
+# ... --benchmark-save stores the timings as the new baselines.
+# ... Every timed round is paired with a round of a fixed reference workload run right after it, and a
+# ... benchmark's time is the median over its rounds of its time per call divided by the reference's. A
+# ... faster or slower machine, or one that is busy for part of the run, changes both alike, so the same
+# ... baselines work on any machine. A benchmark over the threshold is timed again before it fails.
+#
+# usage: python -m pytest benchmarks --benchmark
+#        python -m pytest benchmarks --benchmark --benchmark-save
+#
+
+
+import gc
+import json
+import os
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# baselines are relative to the reference workload; CSTRIS_BENCH_BASELINES keeps a separate file
+BASELINES = os.getenv("CSTRIS_BENCH_BASELINES", default=os.path.join(ROOT, "benchmarks", "baselines.json"))
+
+# a benchmark fails when it is this much slower than its baseline (0.25 = 25% slower)
+THRESHOLD = 0.25
+
+# timed rounds per benchmark, and roughly how long all the rounds take together
+ROUNDS = 9
+MIN_TIME = 0.5
+
+# roughly how long each round of the reference workload takes
+REFERENCE_TIME = 0.01
+
+# how many more times a benchmark over the threshold is timed before it fails (the best timing counts)
+RETRIES = 2
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark")
+    group.addoption("--benchmark", action="store_true", help="time benchmarks and compare them with the baselines")
+    group.addoption("--benchmark-save", action="store_true", help="store the timings as the new baselines")
+    group.addoption("--benchmark-threshold", type=float, default=THRESHOLD,
+                    help="fail benchmarks that are slower than their baseline by more than this fraction")
+
+
+def load_baselines(path=BASELINES):
+    """
+    Returns the stored baselines (benchmark name -> time per call in calls of reference_workload, see
+    Benchmark.stats["relative"]), or an empty dict.
+    Params: path
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)["times"]
+
+
+# 1 MB (about a screenful of pixels) the reference workload copies and translates, like drawing copies pixels
+_REFERENCE_BUFFER = bytes(range(256)) * 4096
+_REFERENCE_TABLE = bytes(range(255, -1, -1))
+
+
+def reference_workload():
+    """
+    A fixed mix of the interpreter work the hot paths do (loops, integer and bit operations, list and dict
+    access, small allocations) and the memory work drawing does (copying a buffer); benchmark times are
+    measured in calls of it.
+    """
+    rows = [0] * 64
+    counts = {}
+    for i in range(200):
+        rows[i & 63] ^= (i * 2654435761) & 0xFFFF
+        counts[i & 15] = counts.get(i & 15, 0) + 1
+    pixels = bytearray(_REFERENCE_BUFFER.translate(_REFERENCE_TABLE))
+    return bytes(row & 255 for row in rows) + pixels[:64]
+
+
+_reference_calls = []
+
+
+def reference_round():
+    """
+    Runs one round of the reference workload and returns its seconds per call; the number of calls per
+    round is calibrated the first time, so a round takes about REFERENCE_TIME.
+    """
+    if not _reference_calls:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for call in range(number):
+                reference_workload()
+            elapsed = time.perf_counter() - start
+            if elapsed >= REFERENCE_TIME / 2:
+                break
+            number *= 2
+        _reference_calls.append(max(1, round(number * REFERENCE_TIME / elapsed)))
+    number = _reference_calls[0]
+    start = time.perf_counter()
+    for call in range(number):
+        reference_workload()
+    return (time.perf_counter() - start) / number
+
+
+class Benchmark:
+    """
+    This class times one benchmark, like pytest-benchmark's fixture.
+    Member Variables: name, enabled (whether to time at all), baseline (reference workload calls per call,
+        or None), threshold, stats (min, median and mean seconds per call, calls per round, and relative,
+        the median per round of the time per call over the reference workload's, once timed)
+    Member Functions: __init__, __call__ (times a function), pedantic (times a function with a setup
+        function run before every call), manual (records times measured by the benchmark itself),
+        regressed, check (fails if the timing regressed)
+    """
+
+    def __init__(self, name, enabled, baseline=None, threshold=THRESHOLD):
+        self.name = name
+        self.enabled = enabled
+        self.baseline = baseline
+        self.threshold = threshold
+        self.stats = None
+
+    def __call__(self, function, *args, **kwargs):
+        """
+        Times function(*args, **kwargs) and returns what it returns.
+        Params: function, args, kwargs
+        """
+        result = function(*args, **kwargs)
+        if self.enabled:
+            def run(number):
+                start = time.perf_counter()
+                for call in range(number):
+                    function(*args, **kwargs)
+                return time.perf_counter() - start
+            self._measure(run)
+        return result
+
+    def pedantic(self, function, setup, rounds=ROUNDS):
+        """
+        Times function(*args) where (args, kwargs) come from calling setup() before every call; only the
+        calls to function are timed. Returns what the first call returned.
+        Params: function, setup, rounds
+        """
+        args, kwargs = setup()
+        result = function(*args, **kwargs)
+        if self.enabled:
+            def run(number):
+                total = 0.0
+                for call in range(number):
+                    args, kwargs = setup()
+                    start = time.perf_counter()
+                    function(*args, **kwargs)
+                    total += time.perf_counter() - start
+                return total
+            self._measure(run, rounds)
+        return result
+
+    def manual(self, measure, rounds=ROUNDS):
+        """
+        Records times the benchmark measures itself, e.g. in another process: measure() runs it once and
+        returns the seconds it took. Returns the first measurement.
+        Params: measure, rounds
+        """
+        result = measure()
+        if self.enabled:
+            self._time(measure, 1, rounds)
+        return result
+
+    def _measure(self, run, rounds=ROUNDS):
+        # calibrate the number of calls so one round takes about MIN_TIME / rounds
+        number = 1
+        while True:
+            elapsed = run(number)
+            if elapsed >= MIN_TIME / rounds or number >= 10 ** 6:
+                break
+            number *= 10 if elapsed < MIN_TIME / rounds / 10 else 2
+        # a garbage collection in the middle of a round would be timed as part of it
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._time(lambda: run(number) / number, number, rounds)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def _time(self, round_time, number, rounds):
+        # round_time() runs one round and returns its seconds per call
+        for attempt in range(1 + RETRIES):
+            times = []
+            ratios = []
+            for round_num in range(rounds):
+                times.append(round_time())
+                ratios.append(times[-1] / reference_round())
+            times.sort()
+            ratios.sort()
+            stats = {"min": times[0], "median": times[len(times) // 2], "mean": sum(times) / len(times),
+                     "calls": number, "relative": ratios[len(ratios) // 2]}
+            if self.stats is None or stats["relative"] < self.stats["relative"]:
+                self.stats = stats
+            if not self.regressed():
+                break
+        self.check()
+
+    def regressed(self):
+        """
+        Returns whether the benchmark's relative time is more than the threshold over the baseline.
+        """
+        return self.baseline is not None and self.stats["relative"] > self.baseline * (1 + self.threshold)
+
+    def check(self):
+        """
+        Fails the benchmark if its relative time is more than the threshold over the baseline.
+        """
+        if self.regressed():
+            # the baseline and limit as times per call on this machine right now
+            scale = self.stats["median"] / self.stats["relative"]
+            baseline = self.baseline * scale
+            pytest.fail(f"{self.name} regressed: {format_time(self.stats['median'])} per call, baseline "
+                        f"{format_time(baseline)} (limit {format_time(baseline * (1 + self.threshold))})",
+                        pytrace=False)
+
+
+def format_time(seconds):
+    """
+    Returns a time per call as text in ns, us or ms.
+    Params: seconds
+    """
+    if seconds < 1e-6:
+        return f"{seconds * 1e9:.0f} ns"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.2f} us"
+    return f"{seconds * 1e3:.2f} ms"
+
+
+@pytest.fixture
+def benchmark(request):
+    config = request.config
+    enabled = config.getoption("--benchmark") or config.getoption("--benchmark-save")
+    if not hasattr(config, "_benchmarks"):
+        config._benchmarks = {}
+        config._baselines = load_baselines()
+    name = request.node.nodeid.split("::", 1)[-1]
+    bench = Benchmark(name, enabled, None if config.getoption("--benchmark-save") else config._baselines.get(name),
+                      config.getoption("--benchmark-threshold"))
+    yield bench
+    if bench.stats is not None:
+        config._benchmarks[name] = bench
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    benchmarks = getattr(config, "_benchmarks", {})
+    if not benchmarks:
+        return
+    terminalreporter.section("benchmarks (time per call)")
+    for name, bench in sorted(benchmarks.items()):
+        baseline = config._baselines.get(name)
+        change = f"{100 * (bench.stats['relative'] / baseline - 1):+.0f}%" if baseline else "new"
+        terminalreporter.write_line(f"{name:<60} min {format_time(bench.stats['min']):>10}   "
+                                    f"median {format_time(bench.stats['median']):>10}   {change}")
+    if config.getoption("--benchmark-save"):
+        baselines = dict(config._baselines)
+        baselines.update({name: bench.stats["relative"] for name, bench in benchmarks.items()})
+        with open(BASELINES, "w") as file:
+            json.dump({"unit": "calls of reference_workload", "times": dict(sorted(baselines.items()))}, file,
+                      indent=2)
+            file.write("\n")
+        terminalreporter.write_line(f"saved {len(benchmarks)} baselines to {BASELINES}")
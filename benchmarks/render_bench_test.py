@@ -0,0 +1,87 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+import pytest
+
+from app.engine import colors
+from app.headless import HeadlessGame, RandomPolicy
+from app.render import BLACK, Renderer, ScaledRenderer, get_font, render_text
+
+@pytest.fixture
+def screen():
+    pygame.display.init()
+    pygame.font.init()
+    yield pygame.display.set_mode((400, 500))
+    pygame.quit()
+    # fonts cached before pygame.quit() are no longer usable by the tests that come after
+    get_font.cache_clear()
+    render_text.cache_clear()
+
+def frame_texts(game, tick):
+    return {
+        "lines_left_cap": ("Lines Left: ", (130, 15), 25, BLACK),
+        "lines_left_num": (str(game.lines_left), (260, 15), 25, colors[2]),
+        "timer": ("Time: " + str(round(tick / 25, 2)) + "s", (130, 470), 25, BLACK),
+    }
+
+def test_render_frame(benchmark, screen):
+    # a frame of a game in progress: the figure has moved and the timer changed
+    headless = HeadlessGame(3, 1, RandomPolicy(1, rate=0.5))
+    renderer = Renderer(screen, headless.game)
+
+    def frame():
+        headless.step()
+        if headless.game.state != "start":
+            headless.__init__(3, 1, RandomPolicy(1, rate=0.5))
+        renderer.draw(headless.game, frame_texts(headless.game, headless.tick))
+        renderer.flip()
+
+    benchmark(frame)
+
+def test_render_full_frame(benchmark, screen):
+    # a frame that redraws the whole screen, like the first one
+    headless = HeadlessGame(3, 2, RandomPolicy(2))
+    headless.run(max_ticks=200)
+    renderer = Renderer(screen, headless.game)
+    texts = frame_texts(headless.game, headless.tick)
+
+    def frame():
+        renderer.invalidate()
+        renderer.draw(headless.game, texts)
+        renderer.flip()
+
+    benchmark(frame)
+
+@pytest.mark.parametrize("size", [(1280, 720), (3840, 2160)], ids=["720p", "4k"])
+def test_render_scaled_frame(benchmark, screen, size):
+    # the same frame as test_render_frame, scaled to fill a bigger window
+    screen = pygame.display.set_mode(size)
+    headless = HeadlessGame(3, 1, RandomPolicy(1, rate=0.5))
+    renderer = ScaledRenderer(screen, headless.game)
+
+    def frame():
+        headless.step()
+        if headless.game.state != "start":
+            headless.__init__(3, 1, RandomPolicy(1, rate=0.5))
+        renderer.draw(headless.game, frame_texts(headless.game, headless.tick))
+        renderer.flip()
+
+    benchmark(frame)
+
+def test_render_wall_frame(benchmark, screen):
+    # a tick and a frame of a spectator wall of 64 games
+    from app.wall import SIZE, Wall
+
+    players = [HeadlessGame(3, seed, RandomPolicy(seed, rate=0.5)) for seed in range(64)]
+    wall = Wall(pygame.display.set_mode(SIZE), players)
+
+    def frame():
+        wall.step()
+        for k, player in enumerate(players):
+            if player.game.state != "start":
+                player.__init__(3, k, RandomPolicy(k, rate=0.5))
+        wall.draw()
+
+    benchmark(frame)
@@ -0,0 +1,98 @@
+#
+# this is the benchmarks/server_load.py file
+#
+# ... load test for app/server.py: starts a server process, connects many clients that join rooms of two
+# ... and press random keys, then reports the server's tick times, CPU use and the bytes sent per session
+#
+# usage: python benchmarks/server_load.py --sessions 2000 --seconds 20
+#
+
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.headless import ACTIONS, FPS
+from app.server import join_message, input_message, read_message
+
+
+class Client(asyncio.Protocol):
+    """
+    A load-test client: counts what it receives without decoding it.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.received += len(data)
+
+
+async def run(sessions, seconds, rate, gamemode):
+    server = subprocess.Popen([sys.executable, "-m", "app.server", "--port", "0"], cwd=ROOT,
+                              stdout=subprocess.PIPE, text=True, env=dict(os.environ, PYTHONPATH=ROOT))
+    try:
+        host, port = server.stdout.readline().split()[-1].rsplit(":", 1)
+        loop = asyncio.get_running_loop()
+        clients = []
+        for k in range(sessions):
+            transport, client = await loop.create_connection(Client, host, int(port))
+            transport.write(join_message(gamemode, "room" + str(k // 2)))
+            clients.append(client)
+        print(f"{sessions} sessions connected")
+
+        # every tick, each client presses a key with probability rate
+        rng = random.Random(0)
+        presses = 0
+        start = time.perf_counter()
+        received_start = sum(client.received for client in clients)
+        while time.perf_counter() - start < seconds:
+            for client in clients:
+                if rng.random() < rate:
+                    client.transport.write(input_message(rng.choice(ACTIONS[:6])))
+                    presses += 1
+            await asyncio.sleep(1 / FPS)
+        elapsed = time.perf_counter() - start
+        received = sum(client.received for client in clients) - received_start
+
+        reader, writer = await asyncio.open_connection(host, int(port))
+        writer.write(b"S")
+        kind, connected, ticks, mean_ms, p99_ms, late, cpu = await read_message(reader)
+        writer.close()
+        for client in clients:
+            client.transport.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    budget = 1000 / FPS
+    print("***********************************")
+    print(f"sessions on server: {connected}, inputs sent: {presses} ({presses / elapsed:.0f}/s)")
+    print(f"tick time: mean {mean_ms:.2f} ms, p99 {p99_ms:.2f} ms (budget {budget:.0f} ms), late ticks: {late}")
+    print(f"server CPU: {cpu:.1f}s over {ticks} ticks")
+    print(f"received: {received / elapsed / 1024:.0f} KiB/s, {received / max(1, sessions) / (elapsed * FPS):.1f} "
+          f"bytes per session per tick")
+    if mean_ms > 0:
+        print(f"estimated sessions per core at {FPS} ticks/s: {int(sessions * budget / mean_ms)}")
+    print("***********************************")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the CStris game server.")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rate", type=float, default=0.1, help="chance of each client pressing a key each tick")
+    parser.add_argument("--gamemode", type=int, choices=[1, 2, 3], default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.sessions, args.seconds, args.rate, args.gamemode))
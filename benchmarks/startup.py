@@ -0,0 +1,86 @@
+#
+# this is the benchmarks/startup.py file
+#
+# ... measures how long a fresh CStris process takes to import app.cstris and to show its first frame
+# ... (startup_bench_test.py tracks both against the stored baselines)
+#
+# usage: python benchmarks/startup.py --runs 10
+#        python -m pytest benchmarks/startup_bench_test.py --benchmark
+#
+
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# each snippet prints the seconds from interpreter start-up to the moment being measured
+IMPORT = """
+import time
+start = time.perf_counter()
+import app.cstris
+print(time.perf_counter() - start)
+"""
+
+FIRST_FRAME = """
+import os, time
+start = time.perf_counter()
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import app.cstris
+import app.render
+
+def flip(self, flip=app.render.Renderer.flip):
+    flip(self)
+    print(time.perf_counter() - start, flush=True)
+    os._exit(0)
+
+app.render.Renderer.flip = flip
+app.cstris.start_game(1, "", 0, False)
+"""
+
+
+def measure(snippet, runs):
+    """
+    Runs a snippet in fresh interpreters and returns the seconds it printed, one per run.
+    Params: snippet, runs
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    results = []
+    for run in range(runs):
+        output = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        results.append(float(output.split()[-1]))
+    return results
+
+
+def process_startup(runs):
+    """
+    Returns the wall-clock seconds of starting an interpreter that does nothing, one per run.
+    Params: runs
+    """
+    results = []
+    for run in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        results.append(time.perf_counter() - start)
+    return results
+
+
+def report(name, results):
+    print(f"{name}: median {statistics.median(results) * 1000:.1f} ms, min {min(results) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure CStris import time and time to first frame.")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    print("***********************************")
+    report("interpreter start-up", process_startup(args.runs))
+    report("import app.cstris", measure(IMPORT, args.runs))
+    report("time to first frame", measure(FIRST_FRAME, args.runs))
+    print("***********************************")
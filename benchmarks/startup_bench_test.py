@@ -0,0 +1,9 @@
+from benchmarks.startup import FIRST_FRAME, IMPORT, measure
+
+def test_import_time(benchmark):
+    # seconds to import app.cstris in a fresh interpreter, as timed inside it
+    benchmark.manual(lambda: measure(IMPORT, 1)[0])
+
+def test_first_frame_time(benchmark):
+    # seconds from interpreter start-up to the first frame on the screen
+    benchmark.manual(lambda: measure(FIRST_FRAME, 1)[0])
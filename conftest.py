@@ -20,3 +20,11 @@
 #def parsed_googl_response():
 #    return "TODO: FETCH AND PARSE SOME REAL LIVE DATA"
 
+
+#
+# BENCHMARKS
+#
+# ... the benchmark fixture and the --benchmark options used by the benchmarks dir (see benchmarks/harness.py)
+#
+
+from benchmarks.harness import benchmark, pytest_addoption, pytest_terminal_summary
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from app.assets import Assets, asset_path
+
+@pytest.fixture(autouse=True)
+def mixer():
+    # stop the mixer's audio thread, or a later test that forks (run_batch) can hang in the child
+    yield
+    import pygame
+
+    pygame.mixer.quit()
+
+def test_paths_do_not_depend_on_current_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert os.path.isfile(asset_path("clear.wav"))
+    assert os.path.isfile(asset_path("music.mp3"))
+
+def test_loads_in_background_once():
+    assets = Assets().start()
+    assets.wait()
+    assert "clear.wav" in assets.sounds
+    assert assets.sound("clear.wav") is assets.sound("clear.wav")
+
+def test_errors_are_raised_by_wait():
+    assets = Assets(music="missing.mp3").start()
+    with pytest.raises(Exception):
+        assets.wait()
@@ -0,0 +1,34 @@
+from app.bitboard import BitboardField, shape_rows
+
+LINE_PIECE = [4, 5, 6, 7] # horizontal line piece
+SQUARE = [1, 2, 5, 6]
+
+def test_shape_rows():
+    assert shape_rows(LINE_PIECE) == ((1, 0b1111),)
+    assert shape_rows(SQUARE) == ((0, 0b110), (1, 0b110))
+
+def test_collides():
+    field = BitboardField(20, 10)
+    square = shape_rows(SQUARE)
+    assert not field.collides(square, 3, 0)
+    assert not field.collides(square, -1, 0)
+    assert field.collides(square, -2, 0)
+    assert field.collides(square, 8, 0)
+    assert field.collides(square, 3, 19)
+    field.lock(square, 3, 17, 7)
+    assert field.collides(square, 4, 16)
+    assert field[18][4] == 7 and field[18][5] == 7
+    assert field[18][3] == 0
+
+def test_clear_lines():
+    field = BitboardField(20, 10)
+    line = shape_rows(LINE_PIECE)
+    field.lock(shape_rows(SQUARE), 0, 16, 7)
+    for y in (18, 17):
+        field.lock(line, 0, y, 1)
+        field.lock(line, 4, y, 1)
+        field.lock(shape_rows([0, 1]), 8, y + 1, 2)
+    assert field.clear_lines() == 2
+    assert field.rows[19] == field.rows[18] == 0b110
+    assert field.rows[17] == 0
+    assert list(field[19][:3]) == [0, 7, 7]
@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import codes
+from app.broadcast import Broadcast, RateLimiter, entry_codes, read_entrants, write_report
+
+class StubSendGrid(BaseHTTPRequestHandler):
+    """
+    Answers mail/send requests with the next status code from the server's script (202 once it runs out).
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests.append(body)
+            status = self.server.script.pop(0) if self.server.script else 202
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSendGrid)
+    server.requests = []
+    server.script = []
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_broadcast(stub, **kwargs):
+    return Broadcast(f"http://127.0.0.1:{stub.server_port}", "key", "host@example.com", **kwargs)
+
+def test_sends_ten_thousand_invites_in_batches(stub):
+    entrants = [(f"player{i}@example.com", f"player{i}") for i in range(10000)]
+    entries = entry_codes(entrants, "Weekly", 95.5, 2)
+    broadcast = make_broadcast(stub, rate=1000)
+    report = broadcast.send(entrants, entries, "You're in!", "<p>-name-: -code-</p>")
+    broadcast.close()
+    assert len(stub.requests) == 10
+    assert sorted(len(body["personalizations"]) for body in stub.requests) == [1000] * 10
+    assert all(row["status"] == "sent" for row in report)
+    assert len({row["code"] for row in report}) == 10000
+    # every entrant's substitutions hold their own code
+    personalization = next(p for body in stub.requests for p in body["personalizations"]
+                           if p["to"][0]["email"] == "player1234@example.com")
+    assert personalization["substitutions"] == {"-name-": "player1234", "-code-": report[1234]["code"]}
+    assert codes.decode(report[1234]["code"]) == (2, "Weekly #1235", 95.5)
+
+def test_retries_and_reports_failed_batches(stub, tmp_path):
+    # the first batch posted is retried after a 500, the next is rejected for good
+    stub.script = [500, 202, 400]
+    entrants = [(f"player{i}@example.com", f"player{i}") for i in range(5)]
+    broadcast = make_broadcast(stub, batch_size=2, workers=1, backoff=0.01)
+    report = broadcast.send(entrants, entry_codes(entrants, "Weekly", 30, 1), "You're in!", "-code-")
+    broadcast.close()
+    assert [(row["batch"], row["status"], row["attempts"]) for row in report] == [
+        (0, "sent", 2), (0, "sent", 2), (1, "failed", 1), (1, "failed", 1), (2, "sent", 1)]
+    assert report[2]["error"].startswith("HTTP 400")
+    write_report(tmp_path / "report.csv", report)
+    assert (tmp_path / "report.csv").read_text().splitlines()[0] == "email,name,code,batch,status,attempts,error"
+
+def test_rate_limiter_spaces_out_calls():
+    limiter = RateLimiter(50, burst=2)
+    start = time.monotonic()
+    for call in range(7):
+        limiter.wait()
+    # two calls go at once, the other five wait a fiftieth of a second each
+    assert time.monotonic() - start >= 0.09
+
+def test_reads_entrants(tmp_path):
+    path = tmp_path / "entrants.csv"
+    path.write_text("email,name\nann@example.com,Ann\nbob@example.com,\n\nANN@example.com,Ann again\n,nobody\n")
+    assert read_entrants(path) == [("ann@example.com", "Ann"), ("bob@example.com", "bob")]
@@ -0,0 +1,63 @@
+import pytest
+
+from app.codes import encode, decode, decode_run, decode_bulk, decode_file, InvalidCodeError
+
+def test_round_trip():
+    assert decode(encode("R2D2 ✓", 83.456, 3)) == (3, "R2D2 ✓", 83.46)
+    assert decode(encode("", 0, 1)) == (1, "", 0.0)
+    assert decode(encode("test", 12.75, 2).lower()) == (2, "test", 12.75)
+
+def test_detects_corruption():
+    code = encode("test", 12.75, 2)
+    corrupted = code[:5] + ("A" if code[5] != "A" else "B") + code[6:]
+    with pytest.raises(InvalidCodeError):
+        decode(corrupted)
+    with pytest.raises(InvalidCodeError):
+        decode(code[:-2])
+
+def test_signed_codes():
+    code = encode("test", 12.75, 2, key=b"secret")
+    assert decode(code, key=b"secret") == (2, "test", 12.75)
+    with pytest.raises(InvalidCodeError):
+        decode(code, key=b"guess")
+    with pytest.raises(InvalidCodeError):
+        decode(encode("test", 1.0, 2, key=b"guess"), key=b"secret")
+
+def test_key_rejects_unsigned_codes():
+    legacy = "CTrain963982653189383087304106411.0369488367480975665396228721"
+    unsigned = [encode("test", 12.75, 2), encode("test", 12.75, 2, run=(1, b"12345678")), legacy]
+    for code in unsigned:
+        with pytest.raises(InvalidCodeError):
+            decode(code, key=b"secret")
+    with pytest.raises(InvalidCodeError):
+        decode_run(unsigned[1], key=b"secret")
+    signed = encode("test", 12.75, 2, key=b"secret")
+    assert list(decode_bulk(unsigned + [signed], key=b"secret")["valid"]) == [False, False, False, True]
+
+def test_legacy_codes():
+    assert decode("CTrain963982653189383087304106411.0369488367480975665396228721") == (1, "CTrain", 11.03)
+    with pytest.raises(InvalidCodeError):
+        decode("hello")
+
+def test_decode_bulk(tmp_path):
+    codes = [encode("player" + str(i), i * 1.5, i % 3 + 1) for i in range(50)]
+    codes += [encode("a much longer name", 99.99, 3), "CTrain963982653189383087304106411.0369488367480975665396228721"]
+    codes += [codes[0][:-1] + ("A" if codes[0][-1] != "A" else "B"), "garbage", "CS"]
+    result = decode_bulk(codes)
+    assert list(result["valid"]) == [True] * 52 + [False] * 3
+    for i in range(50):
+        assert (result["gamemode"][i], result["name"][i], result["time"][i]) == decode(codes[i])
+    assert result["name"][51] == "CTrain"
+    (tmp_path / "codes.txt").write_text("\n".join(codes) + "\n")
+    assert decode_file(str(tmp_path / "codes.txt"))["valid"].sum() == 52
+
+def test_run_codes():
+    code = encode("test", 12.75, 2, run=(2 ** 63 + 5, b"12345678"))
+    assert decode(code) == (2, "test", 12.75)
+    assert decode_run(code) == (2, "test", 12.75, (2 ** 63 + 5, b"12345678"))
+    assert decode_run(encode("test", 12.75, 2)) == (2, "test", 12.75, None)
+    signed = encode("test", 12.75, 2, key=b"secret", run=(1, b"12345678"))
+    assert decode_run(signed, key=b"secret")[3] == (1, b"12345678")
+    with pytest.raises(InvalidCodeError):
+        decode_run(signed, key=b"guess")
+    assert list(decode_bulk([code, signed], key=b"secret")["valid"]) == [False, True]
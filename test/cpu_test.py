@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from app.cpu import CpuPolicy, Evaluator, _lookahead, start_pool
+from app.engine import BitboardTetris
+from app.headless import HeadlessGame
+
+def empty_game():
+    game = BitboardTetris(20, 10, 10)
+    game.rng = random.Random(0)
+    game.new_figure()
+    return game
+
+def test_placements_cover_every_rotation_and_column():
+    game = empty_game()
+    evaluator = Evaluator(game)
+    snapshot = game.snapshot(False)
+    assert len(evaluator.placements(snapshot, 0)) == 10 + 7 # line piece: upright and flat
+    assert len(evaluator.placements(snapshot, 6)) == 9 # square
+    assert len(evaluator.placements(snapshot, 5)) == 8 + 9 + 8 + 9 # T piece
+
+def test_placements_on_a_wide_board():
+    game = BitboardTetris(20, 80, 10)
+    game.rng = random.Random(0)
+    game.new_figure()
+    evaluator = Evaluator(game)
+    # a flat line piece against the right wall fills bits past the 64th
+    evaluator.place(game.snapshot(False), 0, 1, 76)
+    assert evaluator.scratch.tops[76:] == [19] * 4
+    assert len(evaluator.placements(evaluator.scratch.snapshot(False), 0)) == 80 + 77
+
+def test_score_counts_holes_height_and_bumpiness():
+    game = empty_game()
+    evaluator = Evaluator(game)
+    flat = evaluator.candidates(game.snapshot(False), 0)
+    # the best place for a line piece on an empty field is flat on the floor against a wall
+    value, rotation, x, after = flat[0]
+    assert (rotation, x) in ((1, 0), (1, 6))
+    evaluator.place(game.snapshot(False), 0, rotation, x)
+    assert evaluator.score() == pytest.approx(-0.510066 * 4 - 0.184483 * 1)
+    # a flat line piece on top of a square leaves two holes under each end
+    evaluator.place(game.snapshot(False), 6, 0, 3)
+    evaluator.place(evaluator.scratch.snapshot(False), 0, 1, 3)
+    assert evaluator.scratch.tops[3:7] == [17, 17, 17, 17]
+    assert evaluator.score() == pytest.approx(-0.510066 * 12 - 0.35663 * 4 - 0.184483 * 6)
+
+def test_clears_lines():
+    policy = CpuPolicy("medium")
+    result = HeadlessGame(1, 3, policy).run(25 * 600)
+    assert result["cleared"]
+    assert result["pieces"] < 40
+
+def test_lookahead_uses_cache_and_pool():
+    game = empty_game()
+    evaluator = Evaluator(game)
+    snapshot = game.snapshot(False)
+    value, rotation, x = evaluator.search(snapshot, game.figure.type, 2)
+    assert evaluator.hits > 0
+    pool = start_pool(2)
+    try:
+        after = evaluator.candidates(snapshot, game.figure.type, keep=True)[0][3]
+        assert pool.submit(_lookahead, (BitboardTetris, 20, 10, after, 1)).result() == evaluator.lookahead(after, 1)
+
+        # out of time: the best placement without lookahead is played right away
+        policy = CpuPolicy("hard", pool)
+        policy.budget = 0
+        headless = HeadlessGame(1, 0, policy)
+        assert policy(headless.game, 0) != ()
+        assert policy.plan[-1] == "drop"
+    finally:
+        pool.shutdown()
@@ -3,12 +3,29 @@
 
 from app.cstris import generate_code
 from app.cstris import accept_challenge
+from app.cstris import window_mode
 
 def test_generate_code():
-    assert generate_code("test",12.75,2)[0] == 't'
-    assert generate_code("test",12.75,2)[25:29] == '12.75'
-    assert generate_code("test",12.75,2)[54] == '2'
+    assert generate_code("test",12.75,2).startswith("CS")
+    assert accept_challenge(generate_code("test",12.75,2)) == [2, "test", 12.75]
 
 def test_accept_challenge():
     assert accept_challenge("CTrain963982653189383087304106411.0369488367480975665396228721") == [1, "CTrain", 11.03]
 
+
+def test_window_mode(capsys):
+    assert window_mode("") is None
+    assert window_mode(" Fullscreen ") == "fullscreen"
+    assert window_mode("RESIZABLE") == "resizable"
+    assert window_mode("1920X1080") == (1920, 1080)
+    assert window_mode("1920 x 1080") == (1920, 1080)
+    assert capsys.readouterr().out == ""
+    for bad in ("1920×1080", "big", "0x600", "800x"):
+        assert window_mode(bad) is None
+        assert "standard window" in capsys.readouterr().out
+
+
+def test_import_is_lazy():
+    import subprocess, sys
+    check = "import sys, app.cstris; print(sorted(m for m in ('pygame', 'requests', 'numpy') if m in sys.modules))"
+    assert subprocess.run([sys.executable, "-c", check], capture_output=True, text=True).stdout.strip() == "[]"
@@ -0,0 +1,111 @@
+import random
+
+from app.engine import Figure, Tetris, BitboardTetris
+
+def test_figure_tables():
+    assert Figure.offsets[0][0] == ((1, 0), (1, 1), (1, 2), (1, 3))
+    assert Figure.boxes[0][1] == (0, 1, 3, 1)
+    assert Figure.extents[6][0] == ((1, 0, 1), (2, 0, 1))
+    for t, rotations in enumerate(Figure.figures):
+        for r, image in enumerate(rotations):
+            assert sorted(dy * 4 + dx for dx, dy in Figure.offsets[t][r]) == sorted(image)
+
+def test_figure_pool():
+    figure = Figure.spawn(3, 0, random.Random(0))
+    figure.release()
+    again = Figure.spawn(5, 1, random.Random(1))
+    assert again is figure
+    assert (again.x, again.y, again.rotation) == (5, 1, 0)
+
+def test_new_figure_counts_pieces():
+    game = Tetris(20, 10, 10)
+    game.rng = random.Random(0)
+    game.new_figure()
+    game.go_space()
+    assert game.pieces == 2
+    assert sum(1 for row in game.field for block in row if block) == 4
+
+def test_column_tops_and_drop_row():
+    for tetris in (Tetris, BitboardTetris):
+        game = tetris(20, 10, 10 ** 9)
+        game.rng = random.Random(4)
+        game.new_figure()
+        rng = random.Random(5)
+        for step in range(3000):
+            if game.state == "gameover":
+                game.__init__(20, 10, 10 ** 9)
+            action = rng.randrange(5)
+            if action == 0:
+                game.go_side(rng.choice((-1, 1)))
+            elif action == 1:
+                game.rotate(rng.choice(("left", "right", "180")))
+            elif action == 2:
+                # step down like go_space used to, and check the index gives the same row
+                figure = game.figure
+                y = figure.y
+                while not game.intersects():
+                    figure.y += 1
+                expected = figure.y - 1
+                figure.y = y
+                assert game.drop_row() == expected
+                game.go_space()
+            else:
+                game.go_down()
+            assert game.tops == Tetris.column_tops(game)
+
+def test_snapshot_restore_fork():
+    for tetris in (Tetris, BitboardTetris):
+        game = tetris(20, 10, 40)
+        game.rng = random.Random(2)
+        game.new_figure()
+        for piece in range(25):
+            game.go_side(piece % 5 - 2)
+            game.go_space()
+        snapshot = game.snapshot()
+        before = ([list(row) for row in game.field], list(game.tops), game.lines_left, game.pieces,
+                  (game.figure.type, game.figure.x, game.figure.y))
+
+        fork = game.fork()
+        for piece in range(10):
+            game.go_space()
+        assert [list(row) for row in fork.field] == before[0]
+
+        # the fork plays on exactly like the original did
+        for piece in range(10):
+            fork.go_space()
+        assert [list(row) for row in fork.field] == [list(row) for row in game.field]
+        assert fork.tops == game.tops and fork.pieces == game.pieces
+
+        game.restore(snapshot)
+        assert ([list(row) for row in game.field], list(game.tops), game.lines_left, game.pieces,
+                (game.figure.type, game.figure.x, game.figure.y)) == before
+        assert len(game.snapshot(rng=False)) < len(snapshot) < 3000
+
+def test_snapshot_mid_fall_on_big_boards():
+    # a figure far down a tall board or far across a wide one, and rows wider than 64 columns
+    for tetris in (Tetris, BitboardTetris):
+        for height, width in ((300, 10), (40, 200)):
+            game = tetris(height, width, 40)
+            game.rng = random.Random(3)
+            game.new_figure()
+            for piece in range(6):
+                game.go_side(piece * 30 % width - width // 2)
+                game.go_space()
+            for move in range(150):
+                game.go_side(1)
+            for move in range(min(200, height - 25)):
+                game.go_down()
+            figure = (game.figure.type, game.figure.rotation, game.figure.x, game.figure.y)
+            assert figure[2] > 127 or figure[3] > 127
+            snapshot = game.snapshot()
+
+            fork = game.fork()
+            assert (fork.figure.type, fork.figure.rotation, fork.figure.x, fork.figure.y) == figure
+            assert [list(row) for row in fork.field] == [list(row) for row in game.field]
+            assert fork.tops == game.tops
+
+            game.go_space()
+            game.restore(snapshot)
+            assert (game.figure.type, game.figure.rotation, game.figure.x, game.figure.y) == figure
+            assert [list(row) for row in game.field] == [list(row) for row in fork.field]
+            assert game.tops == fork.tops
@@ -0,0 +1,28 @@
+from app.engine import Tetris, BitboardTetris
+from app.headless import HeadlessGame, RandomPolicy, ScriptedPolicy, run_game, run_batch
+
+def test_same_seed_same_game():
+    assert run_game(1, 7) == run_game(1, 7)
+    assert run_game(1, 7)["pieces"] > 1
+
+def test_bitboard_plays_like_list_field():
+    for seed in range(10):
+        games = [HeadlessGame(3, seed, RandomPolicy(seed), tetris) for tetris in (Tetris, BitboardTetris)]
+        for tick in range(3000):
+            for game in games:
+                game.step()
+            assert [list(row) for row in games[0].game.field] == [list(row) for row in games[1].game.field]
+        assert games[0].result() == games[1].result()
+
+def test_scripted_drops():
+    game = HeadlessGame(1, 0, ScriptedPolicy([["drop"]] * 5))
+    game.run(max_ticks=5)
+    assert game.game.pieces == 6
+    assert game.tick == 5
+
+def test_run_batch():
+    results, report = run_batch(12, processes=2, max_ticks=500)
+    assert len(results) == 12
+    assert report["games"] == 12
+    assert sorted(report["gamemodes"]) == [10, 20, 40]
+    assert sum(stats["games"] for stats in report["gamemodes"].values()) == 12
@@ -0,0 +1,34 @@
+from app.loop import FixedTimestep, AutoShift
+
+def test_fixed_timestep():
+    stepper = FixedTimestep(0.04, 10.0, max_steps=25)
+    assert stepper.advance(10.03) == 0
+    assert stepper.advance(10.05) == 1
+    assert stepper.advance(10.05) == 0
+    assert stepper.advance(10.21) == 4
+    assert abs(stepper.next_time() - 10.24) < 1e-9
+
+def test_fixed_timestep_stall():
+    stepper = FixedTimestep(0.04, 0.0, max_steps=25)
+    assert stepper.advance(5.0) == 25
+    assert abs(stepper.next_time() - 5.04) < 1e-9
+
+def test_auto_shift():
+    shift = AutoShift(das=0.17, arr=0.05)
+    shift.press(1, 0.0)
+    assert shift.moves(0.1, 10) == (0, 0)
+    assert shift.moves(0.17, 10) == (1, 1)
+    assert shift.moves(0.2, 10) == (0, 0)
+    assert shift.moves(0.33, 10) == (1, 3)
+    shift.press(-1, 0.4)
+    assert shift.moves(0.5, 10) == (0, 0)
+    assert shift.moves(0.58, 10) == (-1, 1)
+    shift.release(-1, 0.6)
+    assert shift.moves(0.78, 10) == (1, 1)
+    shift.release(1, 0.8)
+    assert shift.moves(5.0, 10) == (0, 0)
+
+def test_auto_shift_instant():
+    shift = AutoShift(das=0.1, arr=0)
+    shift.press(-1, 0.0)
+    assert shift.moves(0.1, 10) == (-1, 10)
@@ -0,0 +1,106 @@
+import json
+import sqlite3
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from app.outbox import Outbox, mail_payload
+
+class StubSendGrid(BaseHTTPRequestHandler):
+    """
+    Answers mail/send requests with the next status code from the server's script (202 once it runs out).
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append((self.path, self.headers["Authorization"], json.loads(body)))
+        status = self.server.script.pop(0) if self.server.script else 202
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub():
+    server = HTTPServer(("127.0.0.1", 0), StubSendGrid)
+    server.requests = []
+    server.script = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_outbox(tmp_path, stub, **kwargs):
+    return Outbox(str(tmp_path / "outbox.sqlite3"), f"http://127.0.0.1:{stub.server_port}", "key", **kwargs)
+
+def test_sends_in_background(tmp_path, stub):
+    outbox = make_outbox(tmp_path, stub).start()
+    message_id = outbox.enqueue("friend@example.com", mail_payload("me@example.com", "friend@example.com", "Hi", "<p>hi</p>"))
+    assert outbox.flush(timeout=5) == {"pending": 0, "sent": 1, "failed": 0}
+    outbox.stop()
+    assert outbox.status(message_id)["status"] == "sent"
+    path, authorization, body = stub.requests[0]
+    assert path == "/v3/mail/send" and authorization == "Bearer key"
+    assert body["personalizations"] == [{"to": [{"email": "friend@example.com"}]}]
+
+def test_retries_with_backoff(tmp_path, stub):
+    stub.script = [500, 429]
+    outbox = make_outbox(tmp_path, stub, backoff=0.01).start()
+    message_id = outbox.enqueue("friend@example.com", {})
+    outbox.flush(timeout=5)
+    outbox.stop()
+    assert outbox.status(message_id) == {"status": "sent", "attempts": 3, "last_error": None}
+
+def test_gives_up(tmp_path, stub):
+    stub.script = [400, 500, 500, 500]
+    outbox = make_outbox(tmp_path, stub, backoff=0.01, max_attempts=3).start()
+    rejected = outbox.enqueue("bad", {})
+    outbox.flush(timeout=5)
+    failing = outbox.enqueue("flaky", {})
+    outbox.flush(timeout=5)
+    outbox.stop()
+    assert outbox.status(rejected)["attempts"] == 1
+    assert outbox.status(failing)["attempts"] == 3
+    assert outbox.counts() == {"pending": 0, "sent": 0, "failed": 2}
+
+def test_queue_survives_restart(tmp_path, stub):
+    outbox = make_outbox(tmp_path, stub)
+    message_id = outbox.enqueue("friend@example.com", {})
+    outbox.stop()
+    assert stub.requests == []
+    outbox = make_outbox(tmp_path, stub).start()
+    outbox.flush(timeout=5)
+    outbox.stop()
+    assert outbox.status(message_id)["status"] == "sent"
+
+def test_leased_messages_are_sent_once(tmp_path, stub):
+    path = str(tmp_path / "outbox.sqlite3")
+    first = make_outbox(tmp_path, stub)
+    message_id = first.enqueue("friend@example.com", {})
+    # another process has leased the message and is sending it
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE outbox SET status = 'sending', lease = ? WHERE id = ?", (time.time() + 60, message_id))
+    second = make_outbox(tmp_path, stub)
+    assert second.send_due() > time.time()
+    assert stub.requests == []
+    assert second.counts() == {"pending": 1, "sent": 0, "failed": 0}
+    assert second.status(message_id)["status"] == "pending"
+    # that process died, so once the lease runs out the message is sent here
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE outbox SET lease = ? WHERE id = ?", (time.time() - 1, message_id))
+    assert second.send_due() is None
+    assert len(stub.requests) == 1
+    assert second.status(message_id)["status"] == "sent"
+    first.stop()
+    second.stop()
+
+def test_starting_does_not_import_requests(tmp_path):
+    import subprocess, sys
+    check = ("import sys; from app.outbox import Outbox; "
+             f"Outbox({str(tmp_path / 'outbox.sqlite3')!r}).start().stop(); print('requests' in sys.modules)")
+    assert subprocess.run([sys.executable, "-c", check], capture_output=True, text=True).stdout.strip() == "False"
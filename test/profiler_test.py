@@ -0,0 +1,38 @@
+import csv
+import json
+
+from app.headless import HeadlessGame, RandomPolicy
+from app.profiler import FrameProfiler, percentile
+
+def test_percentile():
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(101)), 99) == 99
+
+def test_frames_and_dropped():
+    profiler = FrameProfiler(25)
+    headless = HeadlessGame(1, 0, RandomPolicy(0, rate=0.5))
+    profiler.instrument(headless.game)
+    for tick_ms in (40, 40, 120, 41):
+        with profiler.phase("gravity"):
+            headless.step()
+        profiler.end_frame(tick_ms, 5)
+    assert len(profiler.frames) == 4
+    assert profiler.dropped == 2
+    assert profiler.frames[2]["dropped"] == 2
+    assert sum(frame["intersects"] for frame in profiler.frames) > 0
+    assert set(profiler.stats()["gravity"]) == {50, 95, 99}
+    assert profiler.overlay()[-1] == "dropped 2"
+
+def test_export(tmp_path):
+    profiler = FrameProfiler(25)
+    for i in range(3):
+        profiler.end_frame(40, 5)
+    profiler.export(str(tmp_path / "frames.jsonl"))
+    lines = (tmp_path / "frames.jsonl").read_text().splitlines()
+    assert len(lines) == 4
+    assert json.loads(lines[-1])["summary"]["frames"] == 3
+    profiler.export(str(tmp_path / "frames.csv"))
+    with open(tmp_path / "frames.csv") as file:
+        rows = list(csv.DictReader(file))
+    assert len(rows) == 3 and rows[0]["tick"] == "40"
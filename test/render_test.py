@@ -0,0 +1,133 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from app.engine import colors, Figure
+from app.headless import HeadlessGame, RandomPolicy
+from app.render import BLACK, WHITE, GRAY, Renderer, ScaledRenderer, render_text
+
+def draw_everything(screen, game, texts):
+    """
+    Draws a frame the way start_game used to: every cell and every text, every frame.
+    """
+    screen.fill(WHITE)
+    for i in range(game.height):
+        for j in range(game.width):
+            pygame.draw.rect(screen, GRAY, [game.x + game.zoom * j, game.y + game.zoom * i, game.zoom, game.zoom], 1)
+            if game.field[i][j] > 0:
+                pygame.draw.rect(screen, colors[game.field[i][j]],
+                                [game.x + game.zoom * j + 1, game.y + game.zoom * i + 1, game.zoom - 2, game.zoom - 1])
+    if game.state == "start":
+        # ghost piece: drop a copy of the figure one row at a time
+        figure = game.figure
+        y = figure.y
+        while not game.intersects():
+            figure.y += 1
+        ghost_y = figure.y - 1
+        figure.y = y
+        covered = [(j + figure.x, i + figure.y) for j, i in figure.cells()]
+        for j, i in figure.cells():
+            if game.field[i + ghost_y][j + figure.x] == 0 and (j + figure.x, i + ghost_y) not in covered:
+                pygame.draw.rect(screen, colors[figure.color],
+                                [game.x + game.zoom * (j + figure.x) + 1, game.y + game.zoom * (i + ghost_y) + 1,
+                                game.zoom - 2, game.zoom - 2], 2)
+    for j, i in game.figure.cells():
+        pygame.draw.rect(screen, colors[game.figure.color],
+                        [game.x + game.zoom * (j + game.figure.x) + 1,
+                        game.y + game.zoom * (i + game.figure.y) + 1,
+                        game.zoom - 2, game.zoom - 2])
+    for value in texts.values():
+        if value is not None:
+            screen.blit(render_text(value[0], value[2], value[3]), value[1])
+
+def test_draws_same_pixels_as_full_redraw():
+    pygame.init()
+    screen = pygame.display.set_mode((400, 500))
+    reference = pygame.Surface((400, 500))
+    headless = HeadlessGame(1, 3, RandomPolicy(3, rate=0.5))
+    renderer = Renderer(screen, headless.game)
+    for tick in range(400):
+        headless.step()
+        game = headless.game
+        texts = {
+            "lines_left_num": (str(game.lines_left), (260, 15), 25, colors[2]),
+            "timer": ("Time: " + str(tick) + "s", (130, 470), 25, BLACK) if game.state == "start" else None,
+            "result": ("Game Over!", (20, 200), 65, BLACK) if game.state == "gameover" else None,
+        }
+        renderer.draw(game, texts)
+        renderer.flip()
+        draw_everything(reference, game, texts)
+        assert pygame.image.tobytes(screen, "RGB") == pygame.image.tobytes(reference, "RGB"), tick
+    pygame.quit()
+
+def test_viewport_draws_visible_cells_and_follows_figure():
+    pygame.init()
+    screen = pygame.display.set_mode((400, 500))
+    headless = HeadlessGame(1, 5, RandomPolicy(5, rate=0.5), height=300, width=40, lines=1000)
+    renderer = Renderer(screen, headless.game, ghost=False, rows=20, cols=10)
+    tops = set()
+    for tick in range(600):
+        headless.step()
+        game = headless.game
+        renderer.draw(game, {})
+        renderer.flip()
+        figure = game.figure
+        tops.add(renderer.top)
+        # the row the figure lands in is always in view
+        min_dx, min_dy, max_dx, max_dy = Figure.boxes[figure.type][figure.rotation]
+        landing = game.drop_row()
+        assert renderer.top <= landing + min_dy and landing + max_dy < renderer.top + 20
+        assert renderer.left <= figure.x + min_dx and figure.x + max_dx < renderer.left + 10
+        for i in range(20):
+            for j in range(10):
+                value = game.field[renderer.top + i][renderer.left + j]
+                if (j + renderer.left - figure.x, i + renderer.top - figure.y) in figure.cells():
+                    value = figure.color
+                expected = colors[value] if value else WHITE
+                assert screen.get_at((game.x + game.zoom * j + game.zoom // 2,
+                                      game.y + game.zoom * i + game.zoom // 2))[:3] == expected, (tick, i, j)
+    assert len(tops) > 1
+    pygame.quit()
+
+def test_scaled_frames_match_a_full_redraw():
+    pygame.init()
+    for size in ((400, 500), (1280, 720), (3840, 2160)):
+        screen = pygame.display.set_mode(size)
+        headless = HeadlessGame(1, 3, RandomPolicy(3, rate=0.5))
+        renderer = ScaledRenderer(screen, headless.game)
+        # the board fills the window's height (less the HUD) and is centered
+        assert renderer.board_rect.height >= size[1] * 0.75
+        assert abs(renderer.board_rect.centerx - size[0] / 2) <= renderer.cell
+        for tick in range(300):
+            headless.step()
+            game = headless.game
+            texts = {
+                "lines_left_num": (str(game.lines_left), (260, 15), 25, colors[2]),
+                "result": ("Game Over!", (20, 200), 65, BLACK) if tick % 60 < 10 else None,
+            }
+            renderer.draw(game, texts)
+            renderer.flip()
+            if tick % 50 == 0:
+                reference = screen.copy()
+                full = ScaledRenderer(reference, game)
+                full.draw(game, texts)
+                assert pygame.image.tobytes(screen, "RGB") == pygame.image.tobytes(reference, "RGB"), (size, tick)
+    pygame.quit()
+
+def test_scaled_renderer_follows_window_resizes():
+    pygame.init()
+    screen = pygame.display.set_mode((400, 500))
+    headless = HeadlessGame(1, 3, RandomPolicy(3, rate=0.5))
+    renderer = ScaledRenderer(screen, headless.game)
+    assert renderer.board_rect == pygame.Rect(100, 60, 200, 400)
+    renderer.draw(headless.game, {})
+    screen = pygame.display.set_mode((800, 1000))
+    renderer.resize(screen)
+    assert renderer.board_rect == pygame.Rect(200, 120, 400, 800) and renderer.shown is None
+    renderer.draw(headless.game, {})
+    figure = headless.game.figure
+    j, i = figure.cells()[0]
+    assert screen.get_at((220 + 40 * (figure.x + j), 140 + 40 * (figure.y + i)))[:3] == colors[figure.color]
+    pygame.quit()
@@ -0,0 +1,73 @@
+from app.headless import HeadlessGame, RandomPolicy
+from app.replay import Replay, Recorder, record
+
+def fields_equal(a, b):
+    return [list(row) for row in a.game.field] == [list(row) for row in b.game.field]
+
+def test_seek_matches_full_replay(tmp_path):
+    path = str(tmp_path / "run.replay")
+    result = record(HeadlessGame(3, 5, RandomPolicy(5, rate=0.5)), path, max_ticks=4000, every=3)
+    replay = Replay(path)
+    assert replay.gamemode == 3 and replay.seed == 5
+    assert replay.ticks == result["ticks"]
+    assert replay.final_time == result["time"]
+    assert len(replay.keyframes) >= 3
+
+    # the original game, stepped tick by tick, against seeking straight to the same tick
+    original = HeadlessGame(3, 5, RandomPolicy(5, rate=0.5))
+    for tick in range(0, replay.ticks + 1, 37):
+        while original.tick < tick:
+            original.step()
+        game = replay.seek(tick)
+        assert fields_equal(game, original)
+        assert game.game.pieces == original.game.pieces
+        assert game.game.lines_left == original.game.lines_left
+        assert (game.game.figure.type, game.game.figure.x, game.game.figure.y) == \
+            (original.game.figure.type, original.game.figure.x, original.game.figure.y)
+
+    # and playing on from a keyframe ends the same way
+    game = replay.seek(replay.keyframes[-1][0])
+    while game.tick < replay.ticks:
+        game.step()
+    assert game.result() == result
+    replay.close()
+
+def test_truncated_file(tmp_path):
+    path = str(tmp_path / "run.replay")
+    recorder = Recorder(path, 1, 9)
+    recorder.input(0, "left")
+    recorder.input(3, "drop")
+    recorder.close()
+    with open(path, "ab") as file:
+        file.write(b"I\x05")
+    replay = Replay(path)
+    assert replay.inputs == {0: ["left"], 3: ["drop"]}
+    assert replay.final_time is None
+    assert replay.seek(4).game.pieces == 2
+    replay.close()
+
+def test_big_boards(tmp_path):
+    # boards bigger than 255 cells a side, with the figure far down and across when the keyframe is taken
+    path = str(tmp_path / "big.replay")
+    headless = HeadlessGame(1, 7, lambda game, tick: (), height=400, width=300)
+    game = headless.game
+    for move in range(140):
+        game.go_side(1)
+    for move in range(300):
+        game.go_down()
+    recorder = Recorder(path, 1, 7, game.height, game.width)
+    recorder.keyframe(0, game, 0, False)
+    recorder.close(0)
+    replay = Replay(path)
+    assert (replay.height, replay.width) == (400, 300)
+    restored = replay.seek(0).game
+    assert (restored.figure.type, restored.figure.x, restored.figure.y) == (game.figure.type, 288, 300)
+    replay.close()
+
+    result = record(HeadlessGame(1, 7, RandomPolicy(7, rate=0.5), height=400, width=300), path, max_ticks=500, every=1)
+    replay = Replay(path)
+    game = replay.seek(replay.keyframes[-1][0])
+    while game.tick < replay.ticks:
+        game.step()
+    assert game.result() == result
+    replay.close()
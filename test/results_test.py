@@ -0,0 +1,66 @@
+import random
+
+from app import codes
+from app.results import Results, CHALLENGE
+
+def test_queries(tmp_path):
+    results = Results(str(tmp_path / "results.sqlite3"))
+    rng = random.Random(0)
+    runs = [{"player": "p" + str(k % 50), "gamemode": 1 + k % 3, "time": round(rng.uniform(20, 200), 2),
+             "lines": 40 if k % 7 else 3} for k in range(3000)]
+    for run in runs:
+        run["lines"] = min(run["lines"], [10, 20, 40][run["gamemode"] - 1])
+    assert results.add_runs(runs, batch=1000) == 3000
+    results.add_run("solo", 3, 15.5, 40, pieces=101)
+    results.add_run("solo", 3, 10.0, 12)
+
+    cleared = sorted(run["time"] for run in runs if run["gamemode"] == 3 and run["lines"] == 40) + [15.5]
+    cleared.sort()
+    assert results.count(3) == len(cleared)
+    assert results.personal_best("solo", 3) == 15.5
+    assert results.personal_best("nobody", 3) is None
+    assert [row[1] for row in results.top(3, 5)] == cleared[:5]
+    assert results.top(3, 1)[0][0] == "solo"
+
+    best = results.top(3, 10, best_per_player=True)
+    assert len(set(row[0] for row in best)) == 10
+    assert [row[1] for row in best] == sorted(row[1] for row in best)
+
+    faster = sum(1 for t in cleared if t < cleared[100])
+    assert results.percentile(3, cleared[100]) == 100 * faster / len(cleared)
+    assert results.time_at_percentile(3, 50) == cleared[round(len(cleared) / 2) - 1]
+    assert len(results.frame(3)) == 1002
+    results.close()
+
+def test_ingest_codes(tmp_path):
+    results = Results(str(tmp_path / "results.sqlite3"))
+    lines = [codes.encode("ann", 41.25, 3), "junk", codes.encode("bob", 12.5, 1)]
+    assert results.ingest_codes(codes.decode_bulk(lines)) == 2
+    assert results.personal_best("ann", 3) == 41.25
+    frame = results.frame()
+    assert list(frame["source"]) == [CHALLENGE, CHALLENGE]
+    results.close()
+
+def test_challenge_codes_recorded_once(tmp_path):
+    results = Results(str(tmp_path / "results.sqlite3"))
+    code = codes.encode("ann", 41.25, 3)
+    assert results.add_run("ann", 3, 41.25, 40, source=CHALLENGE, code=code) is not None
+    assert results.add_run("ann", 3, 41.25, 40, source=CHALLENGE, code=code) is None
+    results.add_run("ann", 3, 41.25, 40)
+    results.add_run("ann", 3, 41.25, 40)
+    assert results.count(3) == 3
+    assert len(results.frame(3)) == 3
+    results.close()
+
+def test_reingesting_codes_adds_nothing(tmp_path):
+    results = Results(str(tmp_path / "results.sqlite3"))
+    lines = [codes.encode("ann", 41.25, 3), codes.encode("bob", 12.5, 1), codes.encode("ann", 41.25, 3)]
+    decoded = codes.decode_bulk(lines)
+    assert list(decoded["code"]) == lines
+    # the same code twice in one file counts once
+    assert results.ingest_codes(decoded, batch=2) == 2
+    assert results.ingest_codes(decoded) == 0
+    assert results.add_run("bob", 1, 12.5, 10, source=CHALLENGE, code=lines[1]) is None
+    assert results.count(3) == 1 and results.count(1) == 1
+    assert len(results.frame()) == 2
+    results.close()
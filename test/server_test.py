@@ -0,0 +1,84 @@
+import asyncio
+
+from app.server import GameServer, RemoteGame, read_message, join_message, input_message
+
+async def play():
+    server = GameServer(fps=100, seed=1)
+    listener = await server.serve("127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(join_message(1, "duel"))
+    kind, first_id, seed, gamemode, height, width = await read_message(reader)
+    assert (kind, gamemode, height, width) == ("W", 1, 20, 10)
+    games = {first_id: RemoteGame(first_id, height, width)}
+
+    # the second player gets the same seed and is sent the first player's game so far
+    for tick in range(5):
+        games[first_id].apply(await read_message(reader))
+    other_reader, other_writer = await asyncio.open_connection("127.0.0.1", port)
+    other_writer.write(join_message(1, "duel"))
+    kind, second_id, other_seed, *rest = await read_message(other_reader)
+    assert other_seed == seed and second_id != first_id
+    catch_up = await read_message(other_reader)
+    assert catch_up[1] == first_id
+    assert len(server.rooms["duel"].sessions) == 2
+
+    for action in ("left", "drop", "rotate_right", "drop", "right", "right", "drop"):
+        writer.write(input_message(action))
+        await asyncio.sleep(0.03)
+    await asyncio.sleep(0.05)
+
+    # stop ticking, so the stats reply comes after the last delta
+    server.ticker.cancel()
+    writer.write(b"S")
+    while True:
+        message = await read_message(reader)
+        if message[0] == "S":
+            break
+        games.setdefault(message[1], RemoteGame(message[1], height, width)).apply(message)
+    assert message[1] == 2 and message[2] > 10
+
+    # the client's copy matches the game on the server without a full frame ever being sent
+    game = server.sessions[first_id].headless.game
+    figure = game.figure
+    assert game.pieces == 4
+    assert [list(games[first_id].row(i)) for i in range(height)] == [list(row) for row in game.field]
+    assert games[first_id].figure == (figure.type, figure.rotation, figure.x, figure.y)
+    assert games[first_id].lines_left == game.lines_left
+    assert second_id in games
+
+    writer.close()
+    other_writer.close()
+    await asyncio.sleep(0.05)
+    assert not server.sessions and not server.rooms
+    listener.close()
+
+def test_deltas_keep_clients_in_sync():
+    asyncio.run(play())
+
+async def reset_is_ignored():
+    server = GameServer(fps=100, seed=1)
+    listener = await server.serve("127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(join_message(1, "solo"))
+    kind, session_id, *rest = await read_message(reader)
+    for action in ("drop", "reset", "drop"):
+        writer.write(input_message(action))
+        await asyncio.sleep(0.03)
+    await asyncio.sleep(0.05)
+
+    # the reset never reached the game: it still has all 10 lines to clear and both pieces dropped
+    game = server.sessions[session_id].headless.game
+    assert game.lines_left == 10
+    assert game.pieces == 3
+
+    writer.close()
+    await asyncio.sleep(0.05)
+    server.ticker.cancel()
+    listener.close()
+
+def test_clients_cannot_reset():
+    asyncio.run(reset_is_ignored())
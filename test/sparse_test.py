@@ -0,0 +1,96 @@
+import random
+
+from app.bitboard import shape_rows
+from app.engine import Tetris, BitboardTetris, SparseTetris, new_game
+from app.sparse import SparseField
+
+LINE_PIECE = [4, 5, 6, 7] # horizontal line piece
+SQUARE = [1, 2, 5, 6]
+
+def test_only_occupied_rows_are_stored():
+    field = SparseField(5000, 200)
+    assert field.occupied() == 0
+    assert field[0] is field[4999]
+    field.lock(shape_rows(SQUARE), 10, 4998, 7)
+    assert field.occupied() == 2
+    assert field[4998][11] == field[4999][12] == 7
+    assert field.tops[11] == 4998 and field.tops[10] == 5000
+    assert field.collides(shape_rows(SQUARE), 11, 4997)
+    assert not field.collides(shape_rows(SQUARE), 11, 4996)
+    assert field.collides(shape_rows(SQUARE), 198, 0)
+
+def test_clear_line_in_the_middle_of_the_stack():
+    field = SparseField(1000, 8)
+    line = shape_rows(LINE_PIECE)
+    # rows 999 to 993 half full, row 995 full and one block on top in row 992 (the line piece is in row 1 of its grid)
+    for i in range(999, 992, -1):
+        field.lock(line, 0, i - 1, 1)
+    field.lock(line, 4, 994, 2)
+    field.lock(shape_rows([0]), 7, 992, 3)
+    above = field.cells[-1]
+    assert field.occupied() == 8
+    assert field.clear_lines() == 1
+    assert field.occupied() == 7
+    # the rows above the cleared line moved down without being copied
+    assert field.cells[-1] is above
+    assert field[993][7] == 3 and field.tops[7] == 993
+    assert list(field[995]) == [1, 1, 1, 1, 0, 0, 0, 0]
+
+def test_plays_like_bitboard_field():
+    # narrow boards, so lines get cleared and games reach the top
+    for seed in range(30):
+        height, width = random.Random(seed).choice([(20, 4), (12, 5), (20, 10)])
+        games = [tetris(height, width, 10 ** 6) for tetris in (Tetris, BitboardTetris, SparseTetris)]
+        for game in games:
+            game.rng = random.Random(seed)
+            game.new_figure()
+        rng = random.Random(seed)
+        while games[0].state == "start":
+            x = rng.randrange(-2, width)
+            rotations = rng.randrange(4)
+            for game in games:
+                for rotation in range(rotations):
+                    game.rotate("right")
+                for move in range(abs(x - game.figure.x)):
+                    game.go_side(1 if x > game.figure.x else -1)
+                game.go_space()
+            fields = [[bytes(row) for row in game.field] for game in games]
+            assert fields[0] == fields[1] == fields[2]
+            assert games[0].tops == games[1].tops == games[2].tops
+            assert games[0].lines_left == games[2].lines_left and games[0].state == games[2].state
+
+def test_snapshot_holds_only_occupied_rows():
+    game = new_game(5000, 100, 20000)
+    assert isinstance(game, SparseTetris)
+    dense = BitboardTetris(5000, 100, 20000)
+    for tetris in (game, dense):
+        tetris.rng = random.Random(0)
+        tetris.new_figure()
+        for piece in range(50):
+            tetris.go_side(piece * 7 % 100 - 50)
+            tetris.go_space()
+        # snapshot mid-fall, far down the board and past the 64th column
+        for move in range(40):
+            tetris.go_side(1)
+        for move in range(2500):
+            tetris.go_down()
+    assert game.figure.y == 2500 and game.figure.x > 64
+    snapshot = game.snapshot(False)
+    assert len(snapshot) < 5000 * 100 // 20
+
+    forks = []
+    for tetris in (game, dense):
+        figure = (tetris.figure.type, tetris.figure.rotation, tetris.figure.x, tetris.figure.y)
+        field = [bytes(row) for row in tetris.field]
+        tops = list(tetris.tops)
+        snapshot = tetris.snapshot()
+        fork = tetris.fork()
+        forks.append(fork)
+        assert (fork.figure.type, fork.figure.rotation, fork.figure.x, fork.figure.y) == figure
+        assert [bytes(row) for row in fork.field] == field and fork.tops == tops
+        tetris.go_space()
+        tetris.restore(snapshot)
+        assert (tetris.figure.type, tetris.figure.rotation, tetris.figure.x, tetris.figure.y) == figure
+        assert [bytes(row) for row in tetris.field] == field and tetris.tops == tops
+    assert forks[0].field.occupied() == game.field.occupied()
+    assert [bytes(row) for row in game.field] == [bytes(row) for row in dense.field]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from app.engine import Tetris
+from app.vector import VectorTetris
+
+def play_reference(game, figure_type, rotation, x):
+    """
+    Plays one placement on a list-field Tetris the way VectorTetris does:
+    rotate at spawn, move straight to x, then drop.
+    """
+    figure = game.figure
+    figure.type = figure_type
+    figure.color = figure_type + 1
+    for i in range(rotation):
+        figure.rotateLeft()
+    box = figure.boxes[figure.type][figure.rotation]
+    figure.x = min(max(x, -box[0]), game.width - 1 - box[2])
+    if game.intersects():
+        return False
+    game.go_space()
+    return True
+
+@pytest.mark.parametrize("height, width", [(20, 10), (12, 6), (16, 13)])
+def test_matches_tetris_rules(height, width):
+    env = VectorTetris(64, gamemode=3, seed=1, height=height, width=width)
+    games = [Tetris(height, width, 40) for i in range(64)]
+    for game in games:
+        game.new_figure()
+    rng = np.random.default_rng(2)
+    for step in range(200):
+        actions = np.stack([rng.integers(0, 4, 64), rng.integers(-3, width, 64)], axis=1)
+        live = ~env.done.copy()
+        types = env.types.copy()
+        boards, lines, done = env.step(actions)
+        for k in np.flatnonzero(live):
+            before = games[k].lines_left
+            if not play_reference(games[k], types[k], actions[k, 0], actions[k, 1]):
+                assert done[k]
+            assert [list(row) for row in boards[k]] == games[k].field
+            assert lines[k] == before - games[k].lines_left
+    assert env.done.all()
+
+def test_reset_done_boards():
+    env = VectorTetris(8, seed=0)
+    while not env.done.any():
+        env.step(np.zeros((8, 2), dtype=int))
+    env.reset(env.done)
+    assert not env.done.any()
+
+def test_clears_four_lines():
+    env = VectorTetris(2, gamemode=1, seed=0)
+    game = Tetris(20, 10, 10)
+    game.new_figure()
+    for i in range(15, 20):
+        for j in range(9):
+            env.boards[:, i, j] = game.field[i][j] = 5
+    env.boards[:, 1, 4] = game.field[1][4] = 2
+    env.types[:] = 0
+    boards, lines, done = env.step([[0, 8], [1, 0]])
+    play_reference(game, 0, 0, 8)
+    assert list(lines) == [4, 0]
+    assert [list(row) for row in boards[0]] == game.field
+    assert game.field[19][:9] == [5] * 9 and game.field[5][4] == 2
@@ -0,0 +1,69 @@
+import struct
+
+from app.codes import encode
+from app.cpu import CpuPolicy
+from app.headless import HeadlessGame, RandomPolicy
+from app.replay import Recorder, Replay, record
+from app.verify import verify_run, verify_batch
+
+def record_run(path, seed, policy=None):
+    policy = CpuPolicy("medium", realtime=False) if policy is None else policy
+    return record(HeadlessGame(1, seed, policy), str(path))
+
+def run_code(path, final_time, gamemode=1):
+    replay = Replay(str(path))
+    run = (replay.seed, replay.digest())
+    replay.close()
+    return encode("cpu", final_time, gamemode, run=run)
+
+def test_verifies_a_cleared_run(tmp_path):
+    path = tmp_path / "run.replay"
+    result = record_run(path, 3)
+    assert result["cleared"]
+    report = verify_run(str(path))
+    assert report["valid"] and report["reason"] is None
+    assert (report["claimed"], report["time"], report["pieces"]) == (result["time"], result["time"], result["pieces"])
+    assert verify_run(str(path), run_code(path, result["time"]))["valid"]
+
+def test_rejects_false_claims(tmp_path):
+    path = tmp_path / "run.replay"
+    other = tmp_path / "other.replay"
+    result = record_run(path, 3)
+    record_run(other, 4)
+
+    assert verify_run(str(path), run_code(path, result["time"] - 1))["reason"].startswith("claimed")
+    assert verify_run(str(path), run_code(other, result["time"]))["reason"] == "the code is for another run"
+    assert verify_run(str(path), encode("cpu", result["time"], 1))["reason"] == "the code does not name a run"
+    assert verify_run(str(path), run_code(path, result["time"], gamemode=2))["reason"] == "the code is for another run"
+
+    # a hand-edited final time in the replay file
+    data = bytearray(path.read_bytes())
+    struct.pack_into("<d", data, len(data) - 8, result["time"] / 2)
+    path.write_bytes(data)
+    assert verify_run(str(path))["reason"].startswith("claimed")
+
+def test_rejects_unfinished_and_reset_runs(tmp_path):
+    path = tmp_path / "random.replay"
+    result = record_run(path, 5, RandomPolicy(5))
+    assert not result["cleared"]
+    assert verify_run(str(path))["reason"] == f"only {result['lines']} lines were cleared"
+
+    path = tmp_path / "reset.replay"
+    recorder = Recorder(str(path), 1, 5)
+    recorder.input(0, "reset")
+    recorder.input(1, "drop")
+    recorder.finish(2, 0.08)
+    assert verify_run(str(path))["reason"] == "the run was reset"
+    assert not verify_run(str(tmp_path / "missing.replay"))["valid"]
+
+def test_batch_in_a_pool(tmp_path):
+    submissions = []
+    for seed in range(3):
+        path = tmp_path / f"{seed}.replay"
+        record_run(path, seed)
+        submissions.append((str(path), None))
+    submissions.append((str(tmp_path / "missing.replay"), None))
+    reports, summary = verify_batch(submissions, processes=2)
+    assert reports == verify_batch(submissions, processes=1)[0]
+    assert [report["valid"] for report in reports] == [True, True, True, False]
+    assert summary["runs"] == 4 and summary["valid"] == 3
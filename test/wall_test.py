@@ -0,0 +1,54 @@
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+import pytest
+
+from app.headless import HeadlessGame, RandomPolicy
+from app.wall import SIZE, BoardView, TileAtlas, Wall, layout
+
+@pytest.fixture
+def screen():
+    pygame.display.init()
+    pygame.font.init()
+    yield pygame.display.set_mode(SIZE)
+    pygame.quit()
+
+def pixels(surface):
+    return pygame.image.tostring(surface, "RGB")
+
+def test_board_redraws_only_what_changed(screen):
+    atlas = TileAtlas(8)
+    headless = HeadlessGame(1, 3, RandomPolicy(3, rate=0.5))
+    view = BoardView(headless, atlas, "bot")
+    assert view.update()
+    for tick in range(300):
+        headless.step()
+        view.update()
+        if tick % 50 == 0:
+            # a new view of the same game draws every cell from scratch
+            fresh = BoardView(headless, atlas, "bot")
+            fresh.update()
+            assert pixels(view.surface) == pixels(fresh.surface)
+    while headless.game.state == "start":
+        headless.step()
+    view.update()
+    assert not view.update()
+
+def test_layout_fits_the_screen():
+    for count in (16, 32, 64):
+        zoom, columns = layout(SIZE, count, 20, 10)
+        assert zoom >= 7 and columns * zoom * 10 <= SIZE[0]
+    assert layout(SIZE, 1, 20, 10)[1] == 1
+
+def test_wall_keeps_ticking_while_drawing(screen):
+    players = [HeadlessGame(3, seed, RandomPolicy(seed, rate=0.5)) for seed in range(64)]
+    wall = Wall(screen, players)
+    # a frame past its deadline draws nothing, and the next one starts where it stopped
+    assert wall.draw(deadline=time.perf_counter()) == 0 and wall.next_view == 0
+    assert wall.draw() == 64
+    stats = wall.run(seconds=1)
+    assert stats["ticks"] >= 20 and stats["frames"] > 10
+    assert all(player.tick == wall.ticks or player.game.state == "gameover" for player in players)